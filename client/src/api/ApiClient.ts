@@ -104,6 +104,44 @@ async function get(path: string) {
   return fetchWithAuth(path);
 }
 
+// Page of a list endpoint: the server sends the next page cursor in the X-Next-Cursor header
+export interface Page<T> {
+  items: T[];
+  nextCursor: string | null;
+}
+
+export const LIST_PAGE_SIZE = 50;
+
+function withPageParams(path: string, cursor?: string | null, limit: number = LIST_PAGE_SIZE) {
+  const params = new URLSearchParams({ limit: String(limit) });
+  if (cursor) {
+    params.set('cursor', cursor);
+  }
+  return `${path}${path.includes('?') ? '&' : '?'}${params.toString()}`;
+}
+
+// GET that also returns the X-Next-Cursor header
+async function getWithCursor(path: string): Promise<{ data: any; nextCursor: string | null }> {
+  const token = localStorage.getItem('token');
+  const response = await fetch(`${API_BASE_URL}${path}`, {
+    headers: {
+      'Content-Type': 'application/json',
+      ...(token && { 'Authorization': token }),
+    },
+  });
+  if (response.status === 401) {
+    localStorage.removeItem('token');
+    throw new ApiError(401, "Unauthorized");
+  }
+  const data = await handleResponse(response);
+  return { data, nextCursor: response.headers.get('X-Next-Cursor') };
+}
+
+async function getPage<T>(path: string, cursor?: string | null, limit?: number): Promise<Page<T>> {
+  const { data, nextCursor } = await getWithCursor(withPageParams(path, cursor, limit));
+  return { items: data, nextCursor };
+}
+
 async function post(path: string, data?: any) {
   return fetchWithAuth(path, {
     method: 'POST',
@@ -188,7 +226,7 @@ export const reports = {
   },
   
   getById: (reportId: number) => get(`/reports/${reportId}`),
-  getAll: () => get('/reports'),
+  getPage: (cursor?: string | null) => getPage<Report>('/reports', cursor),
   
   download: async (reportId: number, filename: string) => {
     const token = localStorage.getItem('token');
@@ -258,11 +296,17 @@ export const chat = {
   create: (data: { title?: string }) => 
     post('/chats', data),
   
-  getAll: () => 
-    get('/chats'),
+  getPage: (cursor?: string | null) =>
+    getPage<any>('/chats', cursor),
   
-  getById: (id: number) => 
-    get(`/chats/${id}`),
+  // Chat with its latest messages; nextCursor points to earlier messages (see getMessages)
+  getById: async (id: number) => {
+    const { data, nextCursor } = await getWithCursor(withPageParams(`/chats/${id}`));
+    return { ...data, nextCursor };
+  },
+
+  getMessages: (chatId: number, cursor?: string | null) =>
+    getPage<any>(`/chats/${chatId}/messages`, cursor),
   
   addMessage: (chatId: number, data: { content: string }) => 
     post(`/chats/${chatId}/messages`, data),
@@ -19,6 +19,7 @@ interface Chat {
   messages: Message[];
   created_at: string;
   updated_at: string;
+  nextCursor?: string | null;
 }
 
 const ChatWindow: React.FC = () => {
@@ -29,6 +30,9 @@ const ChatWindow: React.FC = () => {
   const [message, setMessage] = useState('');
   const [loading, setLoading] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  const [loadingEarlier, setLoadingEarlier] = useState(false);
+  // Подгрузка ранних сообщений добавляет их сверху - прокручивать вниз не нужно
+  const skipScrollRef = useRef(false);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
@@ -55,9 +59,39 @@ const ChatWindow: React.FC = () => {
   }, [chatId]);
 
   useEffect(() => {
+    if (skipScrollRef.current) {
+      skipScrollRef.current = false;
+      return;
+    }
     scrollToBottom();
   }, [chat?.messages]);
 
+  // Сервер отдает только последние сообщения чата; более ранние подгружаются по курсору
+  const loadEarlierMessages = async () => {
+    if (!chat?.nextCursor || !chatId) return;
+    try {
+      setLoadingEarlier(true);
+      const page = await chatApi.getMessages(parseInt(chatId), chat.nextCursor);
+      skipScrollRef.current = true;
+      setChat(prev => {
+        if (!prev) return null;
+        return {
+          ...prev,
+          messages: [...page.items, ...prev.messages],
+          nextCursor: page.nextCursor,
+        };
+      });
+    } catch (error) {
+      toast({
+        title: 'Ошибка',
+        description: 'Не удалось загрузить предыдущие сообщения',
+        variant: 'destructive',
+      });
+    } finally {
+      setLoadingEarlier(false);
+    }
+  };
+
   const handleSendMessage = async () => {
     if (!message.trim() || !chatId) return;
 
@@ -127,6 +161,14 @@ const ChatWindow: React.FC = () => {
       </div>
 
       <div className="flex-grow overflow-auto p-4 space-y-4">
+        {chat.nextCursor && (
+          <div className="flex justify-center">
+            <Button variant="ghost" size="sm" onClick={loadEarlierMessages} disabled={loadingEarlier}>
+              {loadingEarlier && <Loader2 className="animate-spin mr-2 h-4 w-4" />}
+              Показать более ранние сообщения
+            </Button>
+          </div>
+        )}
         {chat.messages.map((msg) => (
           <div
             key={msg.id}
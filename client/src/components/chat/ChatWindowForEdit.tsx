@@ -15,6 +15,7 @@ interface Chat {
   id: number;
   title: string;
   messages: ChatMessage[];
+  nextCursor?: string | null;
 }
 
 interface ChatWindowForEditProps {
@@ -34,6 +35,9 @@ const ChatWindowForEdit: React.FC<ChatWindowForEditProps> = ({
   const [message, setMessage] = useState(initialMessage);
   const [loading, setLoading] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  const [loadingEarlier, setLoadingEarlier] = useState(false);
+  // Подгрузка ранних сообщений добавляет их сверху - прокручивать вниз не нужно
+  const skipScrollRef = useRef(false);
   const { toast } = useToast();
 
   // Загрузка чата
@@ -52,6 +56,10 @@ const ChatWindowForEdit: React.FC<ChatWindowForEditProps> = ({
 
   // Прокрутка к последнему сообщению
   useEffect(() => {
+    if (skipScrollRef.current) {
+      skipScrollRef.current = false;
+      return;
+    }
     scrollToBottom();
   }, [chat?.messages]);
 
@@ -81,6 +89,32 @@ const ChatWindowForEdit: React.FC<ChatWindowForEditProps> = ({
     }
   };
 
+  // Сервер отдает только последние сообщения чата; более ранние подгружаются по курсору
+  const loadEarlierMessages = async () => {
+    if (!chat?.nextCursor) return;
+    try {
+      setLoadingEarlier(true);
+      const page = await chatApi.getMessages(chatId, chat.nextCursor);
+      skipScrollRef.current = true;
+      setChat(prev => {
+        if (!prev) return null;
+        return {
+          ...prev,
+          messages: [...page.items, ...prev.messages],
+          nextCursor: page.nextCursor,
+        };
+      });
+    } catch (error) {
+      toast({
+        title: 'Ошибка',
+        description: 'Не удалось загрузить предыдущие сообщения',
+        variant: 'destructive',
+      });
+    } finally {
+      setLoadingEarlier(false);
+    }
+  };
+
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   };
@@ -170,6 +204,14 @@ const ChatWindowForEdit: React.FC<ChatWindowForEditProps> = ({
       </div>
 
       <div className="flex-grow overflow-auto p-4 space-y-4">
+        {chat.nextCursor && (
+          <div className="flex justify-center">
+            <Button variant="ghost" size="sm" onClick={loadEarlierMessages} disabled={loadingEarlier}>
+              {loadingEarlier && <Loader2 className="animate-spin mr-2 h-4 w-4" />}
+              Показать более ранние сообщения
+            </Button>
+          </div>
+        )}
         {chat.messages.map((msg) => (
           <div
             key={msg.id}
@@ -28,12 +28,15 @@ const ChatsPage: React.FC = () => {
   const [chats, setChats] = useState<Chat[]>([]);
   const [loading, setLoading] = useState(true);
   const [creating, setCreating] = useState(false);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const loadChats = async () => {
     try {
       setLoading(true);
-      const response = await chatApi.getAll();
-      setChats(response);
+      const page = await chatApi.getPage();
+      setChats(page.items);
+      setNextCursor(page.nextCursor);
     } catch (error) {
       toast({
         title: 'Ошибка',
@@ -49,6 +52,25 @@ const ChatsPage: React.FC = () => {
     loadChats();
   }, []);
 
+  // Следующая страница списка по курсору из заголовка X-Next-Cursor
+  const loadMoreChats = async () => {
+    if (!nextCursor) return;
+    try {
+      setLoadingMore(true);
+      const page = await chatApi.getPage(nextCursor);
+      setChats((prev) => [...prev, ...page.items]);
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      toast({
+        title: 'Ошибка',
+        description: 'Не удалось загрузить список чатов',
+        variant: 'destructive',
+      });
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleCreateChat = async () => {
     try {
       setCreating(true);
@@ -151,6 +173,15 @@ const ChatsPage: React.FC = () => {
           ))}
         </div>
       )}
+
+      {!loading && nextCursor && (
+        <div className="flex justify-center mt-6">
+          <Button variant="outline" onClick={loadMoreChats} disabled={loadingMore}>
+            {loadingMore && <Loader2 className="animate-spin mr-2 h-4 w-4" />}
+            Загрузить еще
+          </Button>
+        </div>
+      )}
     </div>
   );
 };
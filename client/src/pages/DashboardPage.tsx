@@ -1,7 +1,7 @@
 import React from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useQuery } from '@tanstack/react-query';
-import { templates, reports, Template, Report } from '../api/ApiClient';
+import { templates, reports, Template, Page, Report } from '../api/ApiClient';
 import { Button, Card, CardHeader, CardContent, CardTitle, CardDescription, CardFooter } from '../components/ui';
 import { FileText, File, Plus, ChevronRight } from 'lucide-react';
 
@@ -13,10 +13,12 @@ const DashboardPage = () => {
     queryFn: templates.getAll,
   });
 
-  const { data: userReports = [], isLoading: isLoadingReports } = useQuery<Report[]>({
-    queryKey: ['reports'],
-    queryFn: reports.getAll,
+  // Only the first page of reports is needed here; the full list is on the Reports page
+  const { data: reportsPage, isLoading: isLoadingReports } = useQuery<Page<Report>>({
+    queryKey: ['reports', 'first-page'],
+    queryFn: () => reports.getPage(),
   });
+  const userReports = reportsPage?.items ?? [];
 
   return (
     <div className="space-y-6">
@@ -36,7 +38,9 @@ const DashboardPage = () => {
             <FileText className="h-4 w-4 text-muted-foreground" />
           </CardHeader>
           <CardContent>
-            <div className="text-2xl font-bold">{userReports.length}</div>
+            <div className="text-2xl font-bold">
+              {userReports.length}{reportsPage?.nextCursor ? '+' : ''}
+            </div>
             <p className="text-xs text-muted-foreground">
               {userReports.length > 0 
                 ? `Last created ${new Date(userReports[0].created_at).toLocaleDateString()}`
@@ -1,6 +1,6 @@
 import React, { useState } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
+import { useInfiniteQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { reports, Report } from '../api/ApiClient';
 import { useToast } from '../utils/toast';
 import {
@@ -89,10 +89,20 @@ const ReportsPage = () => {
   const { toast } = useToast();
   const queryClient = useQueryClient();
 
-  const { data: userReports = [], isLoading } = useQuery<Report[]>({
-    queryKey: ['reports'],
-    queryFn: reports.getAll,
+  // The list is paged on the server: the next page is requested by the X-Next-Cursor cursor
+  const {
+    data,
+    isLoading,
+    fetchNextPage,
+    hasNextPage,
+    isFetchingNextPage,
+  } = useInfiniteQuery({
+    queryKey: ['reports', 'list'],
+    queryFn: ({ pageParam }) => reports.getPage(pageParam),
+    initialPageParam: null as string | null,
+    getNextPageParam: (lastPage) => lastPage.nextCursor,
   });
+  const userReports: Report[] = data?.pages.flatMap((page) => page.items) ?? [];
 
   const deleteMutation = useMutation({
     mutationFn: reports.delete,
@@ -192,6 +202,18 @@ const ReportsPage = () => {
                 </tbody>
               </table>
             </div>
+            {hasNextPage && (
+              <div className="flex justify-center pt-4">
+                <Button
+                  variant="outline"
+                  onClick={() => fetchNextPage()}
+                  disabled={isFetchingNextPage}
+                >
+                  {isFetchingNextPage && <Loader2 className="mr-2 h-4 w-4 animate-spin" />}
+                  Load more
+                </Button>
+              </div>
+            )}
           </CardContent>
         </Card>
       ) : (
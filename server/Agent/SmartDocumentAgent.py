@@ -1,8 +1,9 @@
 import json
 from typing import Dict, Any, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
+from database import load_deferred
 from models.models import Report
-from generation.generate_text_langchain import generate_text_with_params
+from generation.generate_text_langchain import agenerate_text_with_params
 from services.document_editor_service import DocumentEditorService
 import re
 
@@ -31,7 +32,7 @@ class SmartDocumentAgent:
                 return {"success": False, "message": "Отчет не найден или нет доступа"}
             
             # Получаем превью документа
-            document_text = await self._get_document_text(report)
+            document_text = await self._get_document_text(db, report)
             print(f"📄 Получен текст документа: {len(document_text)} символов")
             
             # Этап 1: Умный анализ команды через LLM
@@ -135,7 +136,7 @@ class SmartDocumentAgent:
 """
         
         try:
-            response = generate_text_with_params(
+            response = await agenerate_text_with_params(
                 analysis_prompt, 
                 temperature=0.1, 
                 max_tokens=400
@@ -263,7 +264,7 @@ class SmartDocumentAgent:
         
         # Получаем текст документа
         report = await db.get(Report, report_id)
-        document_text = await self._get_document_text(report)
+        document_text = await self._get_document_text(db, report)
         
         if len(document_text) < 50:
             return {"success": False, "message": "Документ слишком короткий для перефразирования"}
@@ -285,10 +286,12 @@ class SmartDocumentAgent:
 """
         
         try:
-            new_text = generate_text_with_params(
+            new_text = await agenerate_text_with_params(
                 rewrite_prompt,
                 temperature=0.7,
-                max_tokens=2000
+                max_tokens=2000,
+                # Повторная просьба переписать должна дать новый вариант, а не ответ из кеша
+                use_cache=False
             )
             
             # Заменяем весь документ
@@ -310,7 +313,7 @@ class SmartDocumentAgent:
         if not target_text or len(target_text) < 10:
             # Если целевой текст не указан, берем первый абзац
             report = await db.get(Report, report_id)
-            document_text = await self._get_document_text(report)
+            document_text = await self._get_document_text(db, report)
             paragraphs = document_text.split('\n\n')
             target_text = paragraphs[0] if paragraphs else document_text[:200]
         
@@ -323,10 +326,12 @@ class SmartDocumentAgent:
 """
         
         try:
-            new_text = generate_text_with_params(
+            new_text = await agenerate_text_with_params(
                 rewrite_prompt,
                 temperature=0.7,
-                max_tokens=500
+                max_tokens=500,
+                # Повторная просьба переписать должна дать новый вариант, а не ответ из кеша
+                use_cache=False
             )
             
             # Заменяем текст в документе
@@ -449,9 +454,11 @@ class SmartDocumentAgent:
 
 
 
-    async def _get_document_text(self, report: Report) -> str:
+    async def _get_document_text(self, db: AsyncSession, report: Report) -> str:
         """Получает текст документа"""
         
+        # HTML - отложенная колонка, загружаем ее только здесь
+        await load_deferred(db, report, "html_content")
         if hasattr(report, 'html_content') and report.html_content:
             try:
                 from bs4 import BeautifulSoup
@@ -466,13 +473,8 @@ class SmartDocumentAgent:
         # Fallback: читаем из docx файла
         try:
             if hasattr(report, 'file_path') and report.file_path:
-                from docx import Document
-                doc = Document(report.file_path)
-                paragraphs = []
-                for para in doc.paragraphs:
-                    if para.text.strip():
-                        paragraphs.append(para.text.strip())
-                return '\n\n'.join(paragraphs)
+                from services.docx_pool import docx_pool, extract_docx_text
+                return await docx_pool.run(extract_docx_text, report.file_path)
         except Exception as e:
             print(f"Ошибка чтения docx файла: {str(e)}")
         
@@ -0,0 +1,78 @@
+"""
+Бенчмарк параллельных запросов к LLM.
+
+Сравнивает N одновременных ответов чата через синхронный generate_text_with_params
+(блокирует цикл событий, запросы выполняются по очереди) и через
+agenerate_text_with_params (запросы идут параллельно).
+
+Запуск из каталога server:
+    python -m benchmarks.bench_concurrent_chat --requests 10 --latency 1.0
+"""
+import argparse
+import asyncio
+import base64
+import threading
+import time
+
+import uvicorn
+
+from generation.stub_server import app as stub_app
+from generation.langChainGiga import client_manager
+from generation.generate_text_langchain import generate_text_with_params, agenerate_text_with_params
+
+
+def start_stub(port, latency):
+    stub_app.state.latency = latency
+    server = uvicorn.Server(uvicorn.Config(stub_app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+async def blocking_reply(i):
+    # Так вызывался LLM из async-кода до появления асинхронного API
+    return generate_text_with_params(f"Вопрос {i}", temperature=0.7, max_tokens=2000)
+
+
+async def async_reply(i):
+    return await agenerate_text_with_params(f"Вопрос {i}", temperature=0.7, max_tokens=2000)
+
+
+async def measure(reply, requests):
+    started = time.perf_counter()
+    await asyncio.gather(*(reply(i) for i in range(requests)))
+    return time.perf_counter() - started
+
+
+async def main(requests, latency, port):
+    server = start_stub(port, latency)
+    client_manager.credentials = base64.b64encode(b"bench:bench").decode()
+    client_manager.base_url = f"http://127.0.0.1:{port}/api/v1"
+    client_manager.auth_url = f"http://127.0.0.1:{port}/api/v2/oauth"
+
+    # Прогрев: токен и соединения
+    await async_reply(0)
+    await blocking_reply(0)
+
+    single = await measure(async_reply, 1)
+    blocking = await measure(blocking_reply, requests)
+    parallel = await measure(async_reply, requests)
+
+    print(f"Задержка заглушки:             {latency:.2f} c")
+    print(f"Один запрос:                   {single:.2f} c")
+    print(f"{requests} запросов, синхронный вызов:  {blocking:.2f} c")
+    print(f"{requests} запросов, асинхронный вызов: {parallel:.2f} c")
+
+    await client_manager.aclose()
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--port", type=int, default=9191)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.latency, args.port))
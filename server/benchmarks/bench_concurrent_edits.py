@@ -0,0 +1,122 @@
+"""
+Бенчмарк задержки запросов во время параллельных правок DOCX.
+
+Пока идут N одновременных правок большого документа, другой клиент раз в 20 мс
+шлет легкий запрос /ping. Сравниваются правки прямо в цикле событий (так было
+раньше: разбор, сохранение и конвертация блокируют все остальные запросы) и
+через пул процессов docx_pool.
+
+Запуск из каталога server:
+    python -m benchmarks.bench_concurrent_edits --edits 8 --paragraphs 3000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from docx import Document
+from fastapi import FastAPI
+
+from services.docx_pool import docx_pool
+from services.document_editor_service import DocumentEditorService, convert_docx_to_html, edit_docx
+
+
+def make_document(path, paragraphs):
+    doc = Document()
+    for i in range(paragraphs):
+        if i % 50 == 0:
+            doc.add_heading(f"Раздел {i // 50 + 1}", level=1)
+        doc.add_paragraph(f"Абзац {i}. " + "Текст отчета для проверки производительности. " * 5)
+    doc.save(path)
+
+
+async def inline_edit(source, command, target):
+    # Так правка выполнялась до появления пула: целиком в цикле событий
+    doc = Document(source)
+    result = (await DocumentEditorService()._apply_command(doc, command))[0]
+    if result["success"]:
+        doc.save(target)
+        convert_docx_to_html(target)
+    return {"result": result}
+
+
+def build_app(source, workdir):
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.post("/edit/{mode}/{n}")
+    async def edit(mode: str, n: int):
+        command = {"command": "replace_text", "oldText": f"Абзац {n}.", "newText": f"Правка {n}."}
+        target = os.path.join(workdir, f"{mode}_{n}.docx")
+        if mode == "inline":
+            outcome = await inline_edit(source, command, target)
+        else:
+            outcome = await docx_pool.run(edit_docx, source, command, target)
+        return {"success": outcome["result"]["success"]}
+
+    return app
+
+
+async def measure(client, mode, edits):
+    latencies = []
+    stop = asyncio.Event()
+
+    async def pinger():
+        # Задержка считается от запланированного момента отправки: если цикл событий
+        # занят правкой, запрос ждет вместе со всеми остальными
+        scheduled = time.perf_counter()
+        while not stop.is_set():
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            await client.get("/ping")
+            now = time.perf_counter()
+            latencies.append(now - scheduled)
+            scheduled = max(scheduled + 0.02, now)
+
+    ping_task = asyncio.create_task(pinger())
+    await asyncio.sleep(0.1)
+    started = time.perf_counter()
+    responses = await asyncio.gather(*(client.post(f"/edit/{mode}/{i}") for i in range(edits)))
+    total = time.perf_counter() - started
+    stop.set()
+    await ping_task
+
+    assert all(r.json()["success"] for r in responses)
+    latencies.sort()
+    return {
+        "total": total,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "max": latencies[-1] * 1000,
+    }
+
+
+async def main(edits, paragraphs):
+    with tempfile.TemporaryDirectory() as workdir:
+        source = os.path.join(workdir, "source.docx")
+        make_document(source, paragraphs)
+        print(f"Документ: {paragraphs} абзацев, {os.path.getsize(source) // 1024} КБ")
+
+        await docx_pool.warmup()
+        transport = httpx.ASGITransport(app=build_app(source, workdir))
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            results = {mode: await measure(client, mode, edits) for mode in ("inline", "pool")}
+        docx_pool.shutdown()
+
+    print(f"{edits} правок, процессов в пуле: {docx_pool.max_workers}")
+    for mode, r in results.items():
+        print(f"{mode:>6}: всего {r['total']:.2f} c, /ping p50 {r['p50']:.1f} мс, "
+              f"p95 {r['p95']:.1f} мс, max {r['max']:.1f} мс")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--edits", type=int, default=8)
+    parser.add_argument("--paragraphs", type=int, default=3000)
+    args = parser.parse_args()
+    asyncio.run(main(args.edits, args.paragraphs))
@@ -0,0 +1,87 @@
+"""
+Бенчмарк обновления HTML после правки документа.
+
+На большом отчете (по умолчанию ~300 страниц) сравнивает полную конвертацию
+новой версии DOCX в HTML и перерисовку только измененных параграфов в
+прежнем html_content.
+
+Запуск из каталога server:
+    python -m benchmarks.bench_incremental_html --pages 300 --repeat 3
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from docx import Document
+
+from services.document_editor_service import (
+    _snapshot_paragraphs, convert_docx_to_html, edit_docx, render_edited_html,
+)
+
+# Примерно столько абзацев по ~60 слов помещается на страницу
+PARAGRAPHS_PER_PAGE = 6
+
+
+def make_report(path, pages):
+    doc = Document()
+    for page in range(pages):
+        if page % 5 == 0:
+            doc.add_heading(f"Раздел {page // 5 + 1}", level=1)
+        for i in range(PARAGRAPHS_PER_PAGE):
+            doc.add_paragraph(f"Абзац {page}.{i}. " + "Текст отчета для проверки производительности. " * 10)
+    doc.save(path)
+    return len(doc.paragraphs)
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times), result
+
+
+def main(pages, repeat):
+    with tempfile.TemporaryDirectory() as workdir:
+        source = os.path.join(workdir, "report.docx")
+        target = os.path.join(workdir, "report_v2.docx")
+        paragraphs = make_report(source, pages)
+        html = convert_docx_to_html(source)
+        print(f"Отчет: {pages} страниц, {paragraphs} абзацев, DOCX {os.path.getsize(source) // 1024} КБ, "
+              f"HTML {len(html) // 1024} КБ")
+
+        # Правка одного слова в середине документа
+        command = {"command": "replace_text", "oldText": f"Абзац {pages // 2}.1.", "newText": "Исправленный абзац."}
+        outcome = edit_docx(source, command, target, html)
+        assert outcome["result"]["success"] and outcome["html_mode"] == "patch"
+        assert outcome["html_content"] == convert_docx_to_html(target)
+
+        # Только шаг получения HTML: документ уже изменен и сохранен
+        doc = Document(source)
+        before = _snapshot_paragraphs(doc)
+        doc.paragraphs[-1].runs[0].text += " правка"
+        doc.save(target)
+
+        full, _ = timed(lambda: convert_docx_to_html(target), repeat)
+        patch, (_, mode) = timed(lambda: render_edited_html(doc, target, before, html), repeat)
+        assert mode == "patch"
+
+        # Правка целиком: загрузка, изменение, сохранение и HTML
+        edit_full, _ = timed(lambda: edit_docx(source, command, target), repeat)
+        edit_patch, _ = timed(lambda: edit_docx(source, command, target, html), repeat)
+
+    print(f"HTML: полная конвертация {full:.2f} c, обновление параграфов {patch:.2f} c "
+          f"(x{full / patch:.1f})")
+    print(f"Правка целиком: с полной конвертацией {edit_full:.2f} c, с обновлением {edit_patch:.2f} c "
+          f"(x{edit_full / edit_patch:.1f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    main(args.pages, args.repeat)
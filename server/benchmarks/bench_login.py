@@ -0,0 +1,97 @@
+"""
+Бенчмарк входа пользователей: пропускная способность и задержка остальных запросов.
+
+N одновременных проверок пароля bcrypt; другой клиент раз в 20 мс шлет легкий
+запрос /ping. Сравниваются проверка прямо в цикле событий (так было раньше)
+и через пул потоков password_hasher.
+
+Запуск из каталога server:
+    python -m benchmarks.bench_login --logins 32 --rounds 12
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from fastapi import FastAPI
+from passlib.context import CryptContext
+
+from services.password_hasher import PasswordHasher
+
+PASSWORD = "correct horse battery staple"
+
+
+def build_app(context, hasher, password_hash):
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.post("/login/{mode}")
+    async def login(mode: str):
+        if mode == "inline":
+            valid = context.verify(PASSWORD, password_hash)
+        else:
+            valid, _ = await hasher.verify_and_update(PASSWORD, password_hash)
+        return {"success": valid}
+
+    return app
+
+
+async def measure(client, mode, logins):
+    latencies = []
+    stop = asyncio.Event()
+
+    async def pinger():
+        # Задержка считается от запланированного момента отправки
+        scheduled = time.perf_counter()
+        while not stop.is_set():
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            await client.get("/ping")
+            now = time.perf_counter()
+            latencies.append(now - scheduled)
+            scheduled = max(scheduled + 0.02, now)
+
+    ping_task = asyncio.create_task(pinger())
+    await asyncio.sleep(0.1)
+    started = time.perf_counter()
+    responses = await asyncio.gather(*(client.post(f"/login/{mode}") for _ in range(logins)))
+    total = time.perf_counter() - started
+    stop.set()
+    await ping_task
+
+    assert all(r.json()["success"] for r in responses)
+    latencies.sort()
+    return {
+        "total": total,
+        "throughput": logins / total,
+        "p50": statistics.median(latencies) * 1000,
+        "max": latencies[-1] * 1000,
+    }
+
+
+async def main(logins, rounds, workers):
+    context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+    hasher = PasswordHasher(max_workers=workers, context=context)
+    password_hash = context.hash(PASSWORD)
+
+    transport = httpx.ASGITransport(app=build_app(context, hasher, password_hash))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        results = {mode: await measure(client, mode, logins) for mode in ("inline", "pool")}
+    hasher.shutdown()
+
+    print(f"{logins} входов, bcrypt rounds={rounds}, потоков в пуле: {hasher.max_workers}")
+    for mode, r in results.items():
+        print(f"{mode:>6}: всего {r['total']:.2f} c, {r['throughput']:.1f} входов/с, "
+              f"/ping p50 {r['p50']:.1f} мс, max {r['max']:.1f} мс")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.rounds, args.workers))
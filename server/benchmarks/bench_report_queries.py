@@ -0,0 +1,121 @@
+"""
+Бенчмарк объема данных, читаемых запросами отчетов.
+
+Заполняет SQLite отчетами с большим html_content, разделами и устаревшей
+историей версий и для каждого сценария (список, карточка отчета, скачивание,
+HTML редактора) сравнивает, сколько байт колонок загружается при полной
+загрузке строки (как было до отложенных колонок) и текущими запросами.
+
+Запуск из каталога server:
+    python -m benchmarks.bench_report_queries --reports 50 --html-kb 300
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker, undefer, undefer_group
+
+from models.models import Base, Report, User
+from routes.report_editor import WITH_HTML
+
+FULL_ROW = [undefer_group("content"), undefer_group("history")]
+
+
+def value_size(value):
+    if value is None:
+        return 0
+    if isinstance(value, (dict, list)):
+        return len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+    return len(str(value).encode("utf-8"))
+
+
+def loaded_bytes(result):
+    """Сколько байт колонок загружено: для объектов - по загруженным атрибутам"""
+    total = 0
+    for item in result:
+        if isinstance(item, Report):
+            state = inspect(item)
+            total += sum(value_size(state.dict[attr.key]) for attr in state.mapper.column_attrs
+                         if attr.key in state.dict)
+        else:
+            total += sum(value_size(value) for value in item)
+    return total
+
+
+async def populate(sessionmaker_, reports, html_kb):
+    html = "<html><body>" + "<p>Текст отчета для проверки производительности.</p>" * (html_kb * 20) + "</body></html>"
+    sections = [{"title": f"Раздел {i}", "content": "Содержание раздела. " * 50} for i in range(20)]
+    history = [{"version": v, "html_content": html, "file_path": f"reports/r_v{v}.docx"} for v in (1, 2)]
+    async with sessionmaker_() as db:
+        db.add(User(id=1, username="bench", email="bench@example.com", password="x"))
+        for i in range(reports):
+            db.add(Report(
+                user_id=1, title=f"Отчет {i}", format="docx", file_path=f"reports/report_{i}.docx",
+                status="completed", sections=sections, html_content=html, document_version=3,
+                version_history=history,
+            ))
+        await db.commit()
+
+
+async def measure(sessionmaker_, run):
+    async with sessionmaker_() as db:
+        started = time.perf_counter()
+        result = await run(db)
+        elapsed = time.perf_counter() - started
+        return loaded_bytes(result), elapsed
+
+
+async def main(reports, html_kb):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    sessionmaker_ = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    await populate(sessionmaker_, reports, html_kb)
+
+    async def rows(db, stmt):
+        return (await db.execute(stmt)).all()
+
+    async def objects(db, stmt):
+        return (await db.execute(stmt)).scalars().all()
+
+    async def one(db, options):
+        return [await db.get(Report, 1, options=options)]
+
+    scenarios = [
+        ("Список отчетов",
+         lambda db: objects(db, select(Report).where(Report.user_id == 1).options(*FULL_ROW)),
+         lambda db: rows(db, select(
+             Report.id, Report.title, Report.template_id, Report.format,
+             Report.status, Report.file_path, Report.created_at,
+         ).where(Report.user_id == 1))),
+        ("Карточка отчета",
+         lambda db: one(db, FULL_ROW),
+         lambda db: one(db, [undefer(Report.sections)])),
+        ("Скачивание",
+         lambda db: objects(db, select(Report).where(Report.file_path.endswith("report_1.docx")).options(*FULL_ROW)),
+         lambda db: rows(db, select(Report.file_path).where(Report.file_path.endswith("report_1.docx")))),
+        ("HTML редактора",
+         lambda db: one(db, FULL_ROW),
+         lambda db: one(db, WITH_HTML)),
+    ]
+
+    print(f"Отчетов: {reports}, HTML ~{html_kb} КБ")
+    print(f"{'сценарий':<18}{'было, КБ':>12}{'стало, КБ':>12}{'было, мс':>10}{'стало, мс':>11}")
+    for name, before, after in scenarios:
+        before_bytes, before_time = await measure(sessionmaker_, before)
+        after_bytes, after_time = await measure(sessionmaker_, after)
+        print(f"{name:<18}{before_bytes / 1024:>12.1f}{after_bytes / 1024:>12.1f}"
+              f"{before_time * 1000:>10.1f}{after_time * 1000:>11.1f}")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reports", type=int, default=50)
+    parser.add_argument("--html-kb", type=int, default=300)
+    args = parser.parse_args()
+    asyncio.run(main(args.reports, args.html_kb))
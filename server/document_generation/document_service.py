@@ -1,11 +1,21 @@
 from datetime import datetime
+import asyncio
 import os
+import time
 from pathlib import Path
 from .word_generator import WordDocumentGenerator
+from generation.generate_text_langchain import generate_text_with_params, agenerate_text_with_params
+from services.docx_pool import docx_pool
+from generation.context_compactor import ContextCompactor, ReportContextStats, estimate_tokens
+
+# Сколько разделов отчета может генерироваться одновременно
+REPORT_MAX_CONCURRENCY = int(os.getenv("REPORT_MAX_CONCURRENCY", "4"))
 
 class DocumentService:
-    def __init__(self, output_dir="reports"):
+    def __init__(self, output_dir="reports", max_concurrency=None, compactor=None):
         self.output_dir = output_dir
+        self.max_concurrency = max_concurrency or REPORT_MAX_CONCURRENCY
+        self.compactor = compactor or ContextCompactor()
         Path(output_dir).mkdir(parents=True, exist_ok=True)
 
     def generate_report(self, title, sections, format='docx', formatting_styles=None):
@@ -18,159 +28,314 @@ class DocumentService:
             format (str): Output format (pdf, doc, docx)
             formatting_styles (dict): Formatting styles from preset
         """
-        # Create a document generator with proper configuration
-        if formatting_styles:
-            custom_style = self._create_custom_style(formatting_styles)
-            doc_generator = WordDocumentGenerator(gost_style=custom_style)
-        else:
-            gost_type = "7.32" if format == "docx" else None
-            doc_generator = WordDocumentGenerator(gost_type=gost_type)
-        
-        doc_generator.add_title(title)
-        
-        previous_content = []
+        dependencies = self._resolve_dependencies(sections)
+        contents = [None] * len(sections)
+        digests = [None] * len(sections)
+        stats = ReportContextStats()
+
+        # Разделы генерируются последовательно, но в порядке зависимостей
+        for i in self._generation_order(dependencies):
+            prompt = self._build_section_prompt(i, sections, dependencies[i], contents, digests, stats)
+            contents[i] = self._generate_section_content(prompt)
+            digests[i] = self.compactor.make_digest(contents[i])
+
+        stats.record(title)
+        return assemble_report(self.output_dir, title, sections, contents, format, formatting_styles)
+
+    async def generate_report_async(self, title, sections, format='docx', formatting_styles=None,
+                                    max_concurrency=None, on_event=None):
+        """
+        Асинхронная генерация отчета.
+
+        Независимые разделы генерируются параллельно (не больше max_concurrency
+        запросов к LLM одновременно), зависимые ждут свои зависимости.
+        Документ собирается в объявленном порядке разделов.
+
+        on_event - необязательная корутина on_event(event), получает события
+        section_started и section_finished (индекс и заголовок раздела, число
+        токенов, время генерации, доля готовых разделов).
+        """
+        dependencies = self._resolve_dependencies(sections)
+        limit = max_concurrency or self.max_concurrency
+        semaphore = asyncio.Semaphore(max(1, limit))
+        contents = [None] * len(sections)
+        digests = [None] * len(sections)
+        stats = ReportContextStats()
+        tasks = {}
+        done = 0
+        started = time.perf_counter()
+
+        async def emit(event, i, **fields):
+            if on_event:
+                await on_event({
+                    "event": event,
+                    "section_index": i,
+                    "section_title": sections[i]['title'],
+                    "progress": done / len(sections),
+                    "elapsed": time.perf_counter() - started,
+                    **fields,
+                })
+
+        async def generate_section(i):
+            nonlocal done
+            if dependencies[i]:
+                await asyncio.gather(*(tasks[j] for j in dependencies[i]))
+            prompt = self._build_section_prompt(i, sections, dependencies[i], contents, digests, stats)
+            async with semaphore:
+                await emit("section_started", i)
+                section_started = time.perf_counter()
+                contents[i] = await self._agenerate_section_content(prompt)
+            digests[i] = self.compactor.make_digest(contents[i])
+            done += 1
+            await emit(
+                "section_finished", i,
+                tokens=estimate_tokens(contents[i]),
+                duration=time.perf_counter() - section_started,
+            )
+
+        # Задачи создаются в порядке зависимостей, чтобы зависимости уже были в tasks
+        for i in self._generation_order(dependencies):
+            tasks[i] = asyncio.ensure_future(generate_section(i))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+        stats.record(title)
+
+        # Сборка и сохранение DOCX нагружают CPU - выполняем в пуле процессов
+        return await docx_pool.run(
+            assemble_report,
+            self.output_dir, title, sections, contents, format, formatting_styles
+        )
+
+    def _resolve_dependencies(self, sections):
+        """
+        Возвращает для каждого раздела множество индексов разделов, от которых он зависит.
+
+        Поле depends_on раздела:
+            None / "all" - все предыдущие разделы (поведение по умолчанию)
+            "previous"   - только предыдущий раздел
+            "none" / []  - независимый раздел
+            список       - индексы (с 0) или заголовки разделов
+        """
+        titles = {section['title']: i for i, section in enumerate(sections)}
+        dependencies = []
 
         for i, section in enumerate(sections):
-            heading_level = section.get('heading_level', 1)
-            
-            context_prompt = section['prompt']
-            
-            if i > 0 and previous_content:
-                context = "\n\n".join(previous_content)
-                context_prompt = f"""
-                Предыдущие разделы содержали следующее содержание:
+            depends_on = section.get('depends_on')
+
+            if depends_on is None or depends_on == 'all':
+                deps = set(range(i))
+            elif depends_on == 'previous':
+                deps = {i - 1} if i > 0 else set()
+            elif depends_on == 'none':
+                deps = set()
+            elif isinstance(depends_on, (list, tuple)):
+                deps = set()
+                for ref in depends_on:
+                    if isinstance(ref, int) and 0 <= ref < len(sections):
+                        deps.add(ref)
+                    elif isinstance(ref, str) and ref in titles:
+                        deps.add(titles[ref])
+                    else:
+                        raise ValueError(f"Раздел '{section['title']}' зависит от неизвестного раздела: {ref}")
+            else:
+                raise ValueError(f"Некорректное значение depends_on у раздела '{section['title']}': {depends_on}")
+
+            if i in deps:
+                raise ValueError(f"Раздел '{section['title']}' не может зависеть от самого себя")
+            dependencies.append(deps)
+
+        return dependencies
+
+    def _generation_order(self, dependencies):
+        """Топологический порядок генерации; при равенстве сохраняется объявленный порядок"""
+        order = []
+        done = set()
+        remaining = list(range(len(dependencies)))
+
+        while remaining:
+            ready = [i for i in remaining if dependencies[i] <= done]
+            if not ready:
+                raise ValueError("Циклическая зависимость между разделами отчета")
+            order.extend(ready)
+            done.update(ready)
+            remaining = [i for i in remaining if i not in done]
+
+        return order
+
+    def _build_section_prompt(self, index, sections, deps, contents, digests, stats):
+        """
+        Добавляет к промпту раздела сжатое содержание разделов, от которых он зависит.
+
+        Вместо полного текста используются выжимки в пределах бюджета токенов,
+        поэтому размер промпта не растет вместе с отчетом.
+        """
+        section = sections[index]
+        if not deps:
+            return section['prompt']
+
+        ordered = sorted(deps)
+        context = self.compactor.build_context(
+            [(sections[j]['title'], digests[j]) for j in ordered]
+        )
+        full_context = "\n\n".join(
+            f"Раздел {sections[j]['title']}: {contents[j]}" for j in ordered
+        )
+        stats.add(full_context, context)
+
+        return f"""
+                Краткое содержание предыдущих разделов:
                 ---
                 {context}
                 ---
 
                 Основываясь на этом содержании, {section['prompt']}
                 """
-            
-            content = doc_generator.add_generated_section(
-                prompt=context_prompt,
-                section_title=section['title'],
-                heading_level=heading_level
-            )
-            
-            # content_summary = content[:300] + "..." if len(content) > 300 else content
-            previous_content.append(f"Раздел {section['title']}: {content}")
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{title.replace(' ', '_')}_{timestamp}"
-        file_path = os.path.join(self.output_dir, f"{filename}.{format}")
-        
-        doc_generator.save(file_path)
-        
-        if format == 'pdf' and os.path.exists(file_path.replace('.pdf', '.docx')):
-            self._convert_to_pdf(file_path.replace('.pdf', '.docx'), file_path)
-        
-        return file_path
+
+    # Разделы семплируются (temperature 0.75) без кеша: повторная генерация
+    # или перегенерация раздела должна давать новый текст, а не прежний ответ
+    def _generate_section_content(self, prompt):
+        try:
+            return generate_text_with_params(prompt, use_cache=False)
+        except Exception as e:
+            print(f"Ошибка генерации контента: {str(e)}")
+            return f"[Ошибка генерации контента: {str(e)}]"
+
+    async def _agenerate_section_content(self, prompt):
+        try:
+            return await agenerate_text_with_params(prompt, use_cache=False)
+        except Exception as e:
+            print(f"Ошибка генерации контента: {str(e)}")
+            return f"[Ошибка генерации контента: {str(e)}]"
 
     def get_report_list(self):
         """Get list of generated reports"""
         path = Path(self.output_dir)
         return [str(f.relative_to(self.output_dir)) for f in path.glob("*.docx")]
-    
-    def _create_custom_style(self, formatting_styles):
-        """
-        Create custom document style from formatting preset
-        
-        Args:
-            formatting_styles (dict): Styles from formatting preset
-        """
-        from document_generation.word_generator import GostStyle
-        from docx.shared import Pt, Cm
 
-        custom_style = GostStyle(gost_type=None)  # Создаем пустой стиль
-        
-        try:
-            # Margins (поля страницы)
-            if 'pageSetup' in formatting_styles and 'margins' in formatting_styles['pageSetup']:
-                margins = formatting_styles['pageSetup']['margins']
-                custom_style.margins = {
-                    "top": Cm(float(margins.get('top', 20)) / 10),     # перевод из мм в см
-                    "bottom": Cm(float(margins.get('bottom', 20)) / 10),
-                    "left": Cm(float(margins.get('left', 30)) / 10),
-                    "right": Cm(float(margins.get('right', 15)) / 10)
-                }
-            
-            # Font (шрифт)
-            if 'font' in formatting_styles:
-                font_settings = formatting_styles['font']
-                if 'family' in font_settings:
-                    custom_style.font_name = font_settings['family']
-            
-            # Paragraph settings (настройки абзаца)
-            if 'paragraphs' in formatting_styles:
-                p_settings = formatting_styles['paragraphs']
-                
-                # Font family for paragraphs - имеет приоритет над общим шрифтом
-                if 'fontFamily' in p_settings:
-                    custom_style.font_name = p_settings['fontFamily']
-                
-                # Font size for regular text
-                if 'fontSize' in p_settings:
-                    custom_style.main_font_size = Pt(float(p_settings['fontSize']))
-                
-                # Line spacing
-                if 'lineHeight' in p_settings or 'lineSpacing' in p_settings:
-                    custom_style.line_spacing = float(p_settings.get('lineHeight', p_settings.get('lineSpacing', 1.5)))
-                
-                # First line indent
-                if 'firstLineIndent' in p_settings:
-                    custom_style.first_line_indent = Cm(float(p_settings['firstLineIndent']) / 10)
-            
-            # Heading styles (стили заголовков)
-            if 'headings' in formatting_styles:
-                headings = formatting_styles['headings']
-                
-                # H1 settings
-                if 'h1' in headings:
-                    h1 = headings['h1']
-                    if 'fontSize' in h1:
-                        custom_style.heading_font_size = Pt(float(h1['fontSize']))
-                
-                # Store all heading styles for later use
-                custom_style.heading_styles = headings
-            
-            # Lists (списки)
-            if 'lists' in formatting_styles:
-                custom_style.list_styles = formatting_styles['lists']
-            
-            # Page setup (настройки страницы)
-            if 'pageSetup' in formatting_styles:
-                page_setup = formatting_styles['pageSetup']
-                
-                # Page orientation
-                if 'orientation' in page_setup:
-                    custom_style.orientation = page_setup['orientation']
-                
-                # Page size
-                if 'pageSize' in page_setup:
-                    custom_style.page_size = page_setup['pageSize']
-            
-            # Для отладки - вывод данных стиля
-            print(f"Custom style configuration: Font={custom_style.font_name}, Size={custom_style.main_font_size}")
-            if hasattr(custom_style, 'heading_styles'):
-                for h_key, h_style in custom_style.heading_styles.items():
-                    print(f"Heading {h_key}: {h_style}")
-            
-        except Exception as e:
-            print(f"Error creating custom style: {str(e)}")
-            # В случае ошибки возвращаем стандартный стиль
-            return GostStyle()
-            
-        return custom_style
-
-    # Добавляем асинхронный метод для генерации отчета
-
-    async def generate_report_async(self, title, sections, format='docx', formatting_styles=None):
-        """Асинхронная версия generate_report для использования с await"""
-        import asyncio
-        # Используем run_in_executor для выполнения синхронной функции в отдельном потоке
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(
-            None, 
-            self.generate_report,
-            title, sections, format, formatting_styles
-        )
\ No newline at end of file
+
+def assemble_report(output_dir, title, sections, contents, format, formatting_styles):
+    """
+    Собирает документ из готовых разделов в объявленном порядке и сохраняет его
+    в output_dir. Функция уровня модуля с простыми аргументами - выполняется в
+    процессе docx_pool, поэтому DocumentService не сериализуется.
+    """
+    # Create a document generator with proper configuration
+    if formatting_styles:
+        custom_style = create_custom_style(formatting_styles)
+        doc_generator = WordDocumentGenerator(gost_style=custom_style)
+    else:
+        gost_type = "7.32" if format == "docx" else None
+        doc_generator = WordDocumentGenerator(gost_type=gost_type)
+
+    doc_generator.add_title(title)
+
+    for section, content in zip(sections, contents):
+        doc_generator.add_section(
+            section['title'],
+            content,
+            heading_level=section.get('heading_level', 1)
+        )
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"{title.replace(' ', '_')}_{timestamp}"
+    file_path = os.path.join(output_dir, f"{filename}.{format}")
+
+    doc_generator.save(file_path)
+
+
+    return file_path
+
+
+def create_custom_style(formatting_styles):
+    """
+    Create custom document style from formatting preset
+
+    Args:
+        formatting_styles (dict): Styles from formatting preset
+    """
+    from document_generation.word_generator import GostStyle
+    from docx.shared import Pt, Cm
+
+    custom_style = GostStyle(gost_type=None)  # Создаем пустой стиль
+
+    try:
+        # Margins (поля страницы)
+        if 'pageSetup' in formatting_styles and 'margins' in formatting_styles['pageSetup']:
+            margins = formatting_styles['pageSetup']['margins']
+            custom_style.margins = {
+                "top": Cm(float(margins.get('top', 20)) / 10),     # перевод из мм в см
+                "bottom": Cm(float(margins.get('bottom', 20)) / 10),
+                "left": Cm(float(margins.get('left', 30)) / 10),
+                "right": Cm(float(margins.get('right', 15)) / 10)
+            }
+
+        # Font (шрифт)
+        if 'font' in formatting_styles:
+            font_settings = formatting_styles['font']
+            if 'family' in font_settings:
+                custom_style.font_name = font_settings['family']
+
+        # Paragraph settings (настройки абзаца)
+        if 'paragraphs' in formatting_styles:
+            p_settings = formatting_styles['paragraphs']
+
+            # Font family for paragraphs - имеет приоритет над общим шрифтом
+            if 'fontFamily' in p_settings:
+                custom_style.font_name = p_settings['fontFamily']
+
+            # Font size for regular text
+            if 'fontSize' in p_settings:
+                custom_style.main_font_size = Pt(float(p_settings['fontSize']))
+
+            # Line spacing
+            if 'lineHeight' in p_settings or 'lineSpacing' in p_settings:
+                custom_style.line_spacing = float(p_settings.get('lineHeight', p_settings.get('lineSpacing', 1.5)))
+
+            # First line indent
+            if 'firstLineIndent' in p_settings:
+                custom_style.first_line_indent = Cm(float(p_settings['firstLineIndent']) / 10)
+
+        # Heading styles (стили заголовков)
+        if 'headings' in formatting_styles:
+            headings = formatting_styles['headings']
+
+            # H1 settings
+            if 'h1' in headings:
+                h1 = headings['h1']
+                if 'fontSize' in h1:
+                    custom_style.heading_font_size = Pt(float(h1['fontSize']))
+
+            # Store all heading styles for later use
+            custom_style.heading_styles = headings
+
+        # Lists (списки)
+        if 'lists' in formatting_styles:
+            custom_style.list_styles = formatting_styles['lists']
+
+        # Page setup (настройки страницы)
+        if 'pageSetup' in formatting_styles:
+            page_setup = formatting_styles['pageSetup']
+
+            # Page orientation
+            if 'orientation' in page_setup:
+                custom_style.orientation = page_setup['orientation']
+
+            # Page size
+            if 'pageSize' in page_setup:
+                custom_style.page_size = page_setup['pageSize']
+
+        # Для отладки - вывод данных стиля
+        print(f"Custom style configuration: Font={custom_style.font_name}, Size={custom_style.main_font_size}")
+        if hasattr(custom_style, 'heading_styles'):
+            for h_key, h_style in custom_style.heading_styles.items():
+                print(f"Heading {h_key}: {h_style}")
+
+    except Exception as e:
+        print(f"Error creating custom style: {str(e)}")
+        # В случае ошибки возвращаем стандартный стиль
+        return GostStyle()
+
+    return custom_style
@@ -476,6 +476,8 @@ class WordDocumentGenerator:
         """Добавить раздел с автоматически сгенерированным содержимым"""
         # Генерация контента с использованием ИИ сервиса
         try:
+            # Без кеша: перегенерация раздела должна давать новый текст
+            generation_params.setdefault("use_cache", False)
             content = generate_text_with_params(prompt, **generation_params)
         except Exception as e:
             print(f"Ошибка генерации контента: {str(e)}")
@@ -0,0 +1,156 @@
+"""
+Сжатие контекста предыдущих разделов для промптов генерации отчета.
+
+Вместо полного текста уже сгенерированных разделов в промпт попадают их
+краткие выжимки (заголовки и первые предложения абзацев). Общий объем
+контекста ограничен бюджетом токенов: если выжимки не помещаются,
+более ранние разделы сокращаются до одного предложения, а затем
+упоминаются только по названию.
+"""
+import os
+import re
+
+from services.metrics import metrics
+
+# Бюджет токенов на весь контекст предыдущих разделов
+CONTEXT_TOKEN_BUDGET = int(os.getenv("REPORT_CONTEXT_TOKEN_BUDGET", "1500"))
+# Максимальный размер выжимки одного раздела
+DIGEST_TOKEN_LIMIT = int(os.getenv("REPORT_DIGEST_TOKEN_LIMIT", "200"))
+
+_SENTENCE_END = re.compile(r'(?<=[.!?…])\s+')
+_MARKDOWN_PREFIX = re.compile(r'^\s*(#{1,6}\s+|[-*+•]\s+|\d+[.)]\s+|>\s*)')
+
+
+def estimate_tokens(text):
+    """Грубая оценка числа токенов: около четырех символов на токен"""
+    if not text:
+        return 0
+    return (len(text) + 3) // 4
+
+
+def _clean_line(line):
+    line = _MARKDOWN_PREFIX.sub('', line)
+    return line.replace('**', '').replace('__', '').replace('`', '').strip()
+
+
+def _first_sentence(text):
+    return _SENTENCE_END.split(text.strip(), maxsplit=1)[0]
+
+
+def _truncate(text, token_limit):
+    max_chars = token_limit * 4
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    space = cut.rfind(' ')
+    return (cut[:space] if space > 0 else cut) + '…'
+
+
+def _omitted_header(omitted):
+    """omitted - заголовки пропущенных разделов от последнего к первому"""
+    return "Ранее также были разделы: " + ", ".join(reversed(omitted))
+
+
+class ContextCompactor:
+    """Строит выжимки разделов и собирает из них контекст в пределах бюджета"""
+
+    def __init__(self, token_budget=None, digest_tokens=None):
+        self.token_budget = token_budget or CONTEXT_TOKEN_BUDGET
+        self.digest_tokens = digest_tokens or DIGEST_TOKEN_LIMIT
+
+    def make_digest(self, content):
+        """Выжимка раздела: подзаголовки и первые предложения абзацев"""
+        if not content:
+            return ''
+
+        parts = []
+        used = 0
+        for block in re.split(r'\n\s*\n|\n(?=\s*#)', content):
+            lines = [_clean_line(line) for line in block.splitlines()]
+            lines = [line for line in lines if line]
+            if not lines:
+                continue
+            # Подзаголовок берем целиком, у абзаца - только первое предложение
+            piece = lines[0] if block.lstrip().startswith('#') else _first_sentence(' '.join(lines))
+            cost = estimate_tokens(piece)
+            if used + cost > self.digest_tokens:
+                if not parts:
+                    parts.append(_truncate(piece, self.digest_tokens))
+                break
+            parts.append(piece)
+            used += cost
+
+        return ' '.join(parts)
+
+    def build_context(self, entries):
+        """
+        Собирает контекст из списка (заголовок, выжимка) в порядке разделов.
+
+        Более поздние разделы важнее для продолжения текста, поэтому бюджет
+        расходуется начиная с последнего раздела.
+        """
+        parts = []  # (заголовок, текст, стоимость), начиная с последнего раздела
+        omitted = []
+        used = 0
+
+        for title, digest in reversed(entries):
+            if omitted:
+                omitted.append(title)
+                continue
+            text = f"Раздел {title}: {digest}"
+            # Учитываем и разделитель между разделами
+            cost = estimate_tokens(text + "\n\n")
+            if used + cost > self.token_budget:
+                text = f"Раздел {title}: {_first_sentence(digest)}"
+                cost = estimate_tokens(text + "\n\n")
+                if used + cost > self.token_budget:
+                    omitted.append(title)
+                    continue
+            parts.append((title, text, cost))
+            used += cost
+
+        header = None
+        if omitted:
+            # Строка с пропущенными разделами тоже входит в бюджет: освобождаем
+            # место, убирая самые ранние из включенных разделов (последний остается)
+            header = _omitted_header(omitted)
+            while len(parts) > 1 and used + estimate_tokens(header + "\n\n") > self.token_budget:
+                title, _, cost = parts.pop()
+                used -= cost
+                omitted.insert(0, title)
+                header = _omitted_header(omitted)
+            # Если места все равно мало, список обрезается, а совсем без места - не выводится
+            room = self.token_budget - used - estimate_tokens("\n\n")
+            # _truncate добавляет многоточие - оставляем под него запас
+            header = _truncate(header, room - 1) if room >= estimate_tokens(_omitted_header([])) + 2 else None
+
+        texts = [text for _, text, _ in reversed(parts)]
+        if header:
+            texts.insert(0, header)
+        return "\n\n".join(texts)
+
+
+class ReportContextStats:
+    """Учет токенов контекста для одного отчета: сколько ушло бы без сжатия и сколько отправлено"""
+
+    def __init__(self):
+        self.full_tokens = 0
+        self.compact_tokens = 0
+
+    def add(self, full_context, compact_context):
+        self.full_tokens += estimate_tokens(full_context)
+        self.compact_tokens += estimate_tokens(compact_context)
+
+    @property
+    def saved_tokens(self):
+        return max(0, self.full_tokens - self.compact_tokens)
+
+    def record(self, title):
+        """Публикует статистику отчета в общие метрики"""
+        metrics.increment("report_context.reports")
+        metrics.increment("report_context.full_prompt_tokens", self.full_tokens)
+        metrics.increment("report_context.sent_prompt_tokens", self.compact_tokens)
+        metrics.increment("report_context.saved_prompt_tokens", self.saved_tokens)
+        metrics.observe("report_context.saved_prompt_tokens_per_report", self.saved_tokens)
+        print(f"Контекст отчета '{title}': {self.compact_tokens} токенов вместо "
+              f"{self.full_tokens}, сэкономлено {self.saved_tokens}")
@@ -1,53 +1,30 @@
+import asyncio
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.messages import HumanMessage, SystemMessage
-from .langChainGiga import get_gigachat_client  
+from .langChainGiga import get_gigachat_client, client_manager
+from .response_cache import response_cache, make_cache_key
+from services.metrics import metrics
 
+# Параметры generate_long_text: число одновременных запросов, повторы и базовая задержка между ними
+LONG_TEXT_CONCURRENCY = int(os.getenv("LLM_LONG_TEXT_CONCURRENCY", "4"))
+LONG_TEXT_RETRIES = int(os.getenv("LLM_LONG_TEXT_RETRIES", "2"))
+LONG_TEXT_RETRY_DELAY = float(os.getenv("LLM_LONG_TEXT_RETRY_DELAY", "1.0"))
 
-def generate_text(prompt):
-    """
-    Генерирует текст по промпту с использованием GigaChat API.
-
-    Аргументы:
-        prompt (str): Текстовый запрос (промпт).
-
-    Возвращает:
-        str: Сгенерированный текст.
-    """
-    # Получаем клиент GigaChat
-    giga = get_gigachat_client()
-
-    # Создаем сообщение
-    messages = [SystemMessage(content=
-            "Ты профессиональный аналитик, который составляет подробные отчеты о продажах. "
-            "Отчет должен быть структурированным и содержать следующие разделы: "
-            "1. Общий объем продаж. "
-            "2. Основные тренды (рост или снижение продаж). "
-            "3. Причины изменений. "
-            "4. Рекомендации по улучшению продаж. "
-            "Используй только факты и данные, избегай субъективных оценок."),
-              HumanMessage(content=prompt)]
-
-
-    # Генерируем текст
-    response = giga.invoke(messages)
-    return response.content
-
-def generate_text_with_params(prompt, temperature=0.75, max_tokens=8000, top_p=0.9, n=1):
-    """
-    Генерирует текст по промпту с настраиваемыми параметрами.
+SALES_SYSTEM_PROMPT = (
+    "Ты профессиональный аналитик, который составляет подробные отчеты о продажах. "
+    "Отчет должен быть структурированным и содержать следующие разделы: "
+    "1. Общий объем продаж. "
+    "2. Основные тренды (рост или снижение продаж). "
+    "3. Причины изменений. "
+    "4. Рекомендации по улучшению продаж. "
+    "Используй только факты и данные, избегай субъективных оценок."
+)
 
-    Аргументы:
-        prompt (str): Текстовый запрос (промпт).
-        temperature (float): Параметр "творчества" (по умолчанию 0.75).
-        max_tokens (int): Максимальное количество токенов в ответе (по умолчанию 25000).
-        top_p (float): Параметр разнообразия (по умолчанию 0.9).
-        n (int): Количество вариантов ответа (по умолчанию 1).
-
-    Возвращает:
-        str: Сгенерированный текст.
-    """
-    giga = get_gigachat_client()
-
-    messages = [SystemMessage(content="""
+REPORT_SYSTEM_PROMPT = """
         Ты - эксперт по написанию профессиональных отчетов и документов любого типа. Твоя задача - создавать четкие, структурированные и информативные отчеты, адаптированные под конкретную область знаний и цель документа.
 
         При написании руководствуйся следующими принципами:
@@ -86,44 +63,288 @@ def generate_text_with_params(prompt, temperature=0.75, max_tokens=8000, top_p=0
         * При отсутствии точных данных четко обозначай предположения и ограничения
 
         Создавай отчеты, которые точно соответствуют запросу, имеют академический или профессиональный уровень и могут быть использованы в соответствующем контексте.
-        """),
+        """
+
+
+def generate_text(prompt, use_cache=True):
+    """
+    Генерирует текст по промпту с использованием GigaChat API.
+
+    Аргументы:
+        prompt (str): Текстовый запрос (промпт).
+        use_cache (bool): Брать ответ из кеша, если такой запрос уже был (по умолчанию True).
+
+    Возвращает:
+        str: Сгенерированный текст.
+    """
+    key = make_cache_key(client_manager.model, SALES_SYSTEM_PROMPT, prompt)
+    if use_cache:
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+
+    # Создаем сообщение
+    messages = [SystemMessage(content=SALES_SYSTEM_PROMPT),
               HumanMessage(content=prompt)]
 
-    response = giga.invoke(
+
+    # Генерируем текст через общий клиент GigaChat
+    response = client_manager.invoke(messages)
+    response_cache.set(key, response.content)
+    return response.content
+
+def generate_text_with_params(prompt, temperature=0.75, max_tokens=8000, top_p=0.9, n=1, use_cache=True):
+    """
+    Генерирует текст по промпту с настраиваемыми параметрами.
+
+    Аргументы:
+        prompt (str): Текстовый запрос (промпт).
+        temperature (float): Параметр "творчества" (по умолчанию 0.75).
+        max_tokens (int): Максимальное количество токенов в ответе (по умолчанию 25000).
+        top_p (float): Параметр разнообразия (по умолчанию 0.9).
+        n (int): Количество вариантов ответа (по умолчанию 1).
+        use_cache (bool): Брать ответ из кеша, если такой запрос уже был (по умолчанию True).
+            Для семплированных ответов (ответы чата, разделы отчета) передавайте False,
+            иначе повторный запрос вернет прежний текст.
+
+    Возвращает:
+        str: Сгенерированный текст.
+    """
+    key = make_cache_key(client_manager.model, REPORT_SYSTEM_PROMPT, prompt, temperature, top_p, max_tokens, n)
+    if use_cache:
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+
+    messages = [SystemMessage(content=REPORT_SYSTEM_PROMPT),
+              HumanMessage(content=prompt)]
+
+    response = client_manager.invoke(
         messages,
         temperature=temperature,
         max_tokens=max_tokens,
         top_p=top_p,
         n=n,
     )
+    response_cache.set(key, response.content)
     return response.content
 
-def generate_long_text(prompt, chunk_size=1000):
+def split_prompt(prompt, chunk_size=1000):
+    """
+    Делит промпт на части не длиннее chunk_size символов по границам
+    абзацев и предложений; слова режутся только в крайнем случае.
+    """
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=0,
+        separators=["\n\n", "\n", ". ", "! ", "? ", "… ", "; ", " ", ""],
+        keep_separator="end",
+    )
+    return [chunk for chunk in splitter.split_text(prompt) if chunk.strip()]
+
+def _retry_delay(attempt):
+    """Экспоненциальная задержка перед повтором со случайным разбросом"""
+    return LONG_TEXT_RETRY_DELAY * (2 ** attempt) * (0.5 + random.random())
+
+def _join_chunks(results):
+    return "".join(text + "\n\n" for text in results if text is not None)
+
+def _generate_chunk(chunk, retries):
+    for attempt in range(retries + 1):
+        try:
+            return generate_text(chunk)
+        except Exception as e:
+            if attempt == retries:
+                print(f"Ошибка при генерации части текста: {e}")
+                return None
+            delay = _retry_delay(attempt)
+            print(f"Ошибка при генерации части текста, повтор через {delay:.1f} c: {e}")
+            time.sleep(delay)
+
+def generate_long_text(prompt, chunk_size=1000, max_concurrency=None, retries=None):
     """
     Генерирует длинный текст, разбивая промпт на части.
 
+    Части обрабатываются параллельно (не больше max_concurrency одновременно),
+    результаты склеиваются в исходном порядке. Неудачные запросы повторяются
+    с экспоненциальной задержкой; часть, которую так и не удалось сгенерировать,
+    пропускается.
+
     Аргументы:
         prompt (str): Текстовый запрос (промпт).
         chunk_size (int): Максимальная длина части промпта (по умолчанию 1000 символов).
+        max_concurrency (int): Число одновременных запросов (по умолчанию LONG_TEXT_CONCURRENCY).
+        retries (int): Число повторов для каждой части (по умолчанию LONG_TEXT_RETRIES).
 
     Возвращает:
         str: Сгенерированный текст.
     """
-    # Разделение промпта на части
-    chunks = [prompt[i:i + chunk_size] for i in range(0, len(prompt), chunk_size)]
+    chunks = split_prompt(prompt, chunk_size)
+    if not chunks:
+        return ""
+    retries = LONG_TEXT_RETRIES if retries is None else retries
+    workers = min(max_concurrency or LONG_TEXT_CONCURRENCY, len(chunks))
 
-    generated_text = ""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda chunk: _generate_chunk(chunk, retries), chunks))
 
-    # Генерация текста для каждой части
-    for chunk in chunks:
+    return _join_chunks(results)
+
+async def agenerate_text(prompt, use_cache=True):
+    """
+    Асинхронная версия generate_text: не блокирует цикл событий на время запроса к GigaChat.
+
+    Аргументы:
+        prompt (str): Текстовый запрос (промпт).
+        use_cache (bool): Брать ответ из кеша, если такой запрос уже был (по умолчанию True).
+
+    Возвращает:
+        str: Сгенерированный текст.
+    """
+    key = make_cache_key(client_manager.model, SALES_SYSTEM_PROMPT, prompt)
+    if use_cache:
+        cached = await response_cache.aget(key)
+        if cached is not None:
+            return cached
+
+    messages = [SystemMessage(content=SALES_SYSTEM_PROMPT),
+              HumanMessage(content=prompt)]
+
+    response = await client_manager.ainvoke(messages)
+    await response_cache.aset(key, response.content)
+    return response.content
+
+async def agenerate_text_with_params(prompt, temperature=0.75, max_tokens=8000, top_p=0.9, n=1, use_cache=True):
+    """
+    Асинхронная версия generate_text_with_params для вызова из async-кода.
+
+    Аргументы:
+        prompt (str): Текстовый запрос (промпт).
+        temperature (float): Параметр "творчества" (по умолчанию 0.75).
+        max_tokens (int): Максимальное количество токенов в ответе.
+        top_p (float): Параметр разнообразия (по умолчанию 0.9).
+        n (int): Количество вариантов ответа (по умолчанию 1).
+        use_cache (bool): Брать ответ из кеша, если такой запрос уже был (по умолчанию True).
+            Для семплированных ответов (ответы чата, разделы отчета) передавайте False,
+            иначе повторный запрос вернет прежний текст.
+
+    Возвращает:
+        str: Сгенерированный текст.
+    """
+    key = make_cache_key(client_manager.model, REPORT_SYSTEM_PROMPT, prompt, temperature, top_p, max_tokens, n)
+    if use_cache:
+        cached = await response_cache.aget(key)
+        if cached is not None:
+            return cached
+
+    messages = [SystemMessage(content=REPORT_SYSTEM_PROMPT),
+              HumanMessage(content=prompt)]
+
+    response = await client_manager.ainvoke(
+        messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        top_p=top_p,
+        n=n,
+    )
+    await response_cache.aset(key, response.content)
+    return response.content
+
+async def _astream(messages, key, use_cache, **params):
+    """Потоковая генерация с учетом кеша и замером времени до первого токена"""
+    if use_cache:
+        cached = await response_cache.aget(key)
+        if cached is not None:
+            yield cached
+            return
+
+    started = time.perf_counter()
+    first_token_at = None
+    parts = []
+
+    async for chunk in client_manager.astream(messages, **params):
+        if not chunk.content:
+            continue
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+            metrics.observe("llm.time_to_first_token", first_token_at - started)
+        parts.append(chunk.content)
+        yield chunk.content
+
+    metrics.observe("llm.stream_duration", time.perf_counter() - started)
+    await response_cache.aset(key, "".join(parts))
+
+async def astream_text(prompt, use_cache=True):
+    """
+    Потоковая версия agenerate_text: отдает текст по частям по мере генерации.
+
+    Аргументы:
+        prompt (str): Текстовый запрос (промпт).
+        use_cache (bool): Брать ответ из кеша, если такой запрос уже был (по умолчанию True).
+    """
+    messages = [SystemMessage(content=SALES_SYSTEM_PROMPT),
+              HumanMessage(content=prompt)]
+    key = make_cache_key(client_manager.model, SALES_SYSTEM_PROMPT, prompt)
+
+    async for chunk in _astream(messages, key, use_cache):
+        yield chunk
+
+async def astream_text_with_params(prompt, temperature=0.75, max_tokens=8000, top_p=0.9, use_cache=True):
+    """
+    Потоковая версия agenerate_text_with_params: отдает текст по частям по мере генерации.
+
+    Аргументы:
+        prompt (str): Текстовый запрос (промпт).
+        temperature (float): Параметр "творчества" (по умолчанию 0.75).
+        max_tokens (int): Максимальное количество токенов в ответе.
+        top_p (float): Параметр разнообразия (по умолчанию 0.9).
+        use_cache (bool): Брать ответ из кеша, если такой запрос уже был (по умолчанию True).
+            Для семплированных ответов (ответы чата, разделы отчета) передавайте False,
+            иначе повторный запрос вернет прежний текст.
+    """
+    messages = [SystemMessage(content=REPORT_SYSTEM_PROMPT),
+              HumanMessage(content=prompt)]
+    # Ключ совпадает с agenerate_text_with_params при n=1, поэтому кеш общий
+    key = make_cache_key(client_manager.model, REPORT_SYSTEM_PROMPT, prompt, temperature, top_p, max_tokens, 1)
+
+    async for chunk in _astream(messages, key, use_cache,
+                                temperature=temperature, max_tokens=max_tokens, top_p=top_p):
+        yield chunk
+
+async def _agenerate_chunk(chunk, semaphore, retries):
+    for attempt in range(retries + 1):
         try:
-            chunk_text = generate_text(chunk)
-            generated_text += chunk_text + "\n\n"
+            async with semaphore:
+                return await agenerate_text(chunk)
         except Exception as e:
-            print(f"Ошибка при генерации части текста: {e}")
-            continue
+            if attempt == retries:
+                print(f"Ошибка при генерации части текста: {e}")
+                return None
+            delay = _retry_delay(attempt)
+            print(f"Ошибка при генерации части текста, повтор через {delay:.1f} c: {e}")
+            # Ждем вне семафора, чтобы не занимать слот
+            await asyncio.sleep(delay)
+
+async def agenerate_long_text(prompt, chunk_size=1000, max_concurrency=None, retries=None):
+    """
+    Асинхронная версия generate_long_text.
+
+    Аргументы:
+        prompt (str): Текстовый запрос (промпт).
+        chunk_size (int): Максимальная длина части промпта (по умолчанию 1000 символов).
+        max_concurrency (int): Число одновременных запросов (по умолчанию LONG_TEXT_CONCURRENCY).
+        retries (int): Число повторов для каждой части (по умолчанию LONG_TEXT_RETRIES).
+
+    Возвращает:
+        str: Сгенерированный текст.
+    """
+    chunks = split_prompt(prompt, chunk_size)
+    retries = LONG_TEXT_RETRIES if retries is None else retries
+    semaphore = asyncio.Semaphore(max(1, max_concurrency or LONG_TEXT_CONCURRENCY))
 
-    return generated_text
+    # gather сохраняет порядок результатов независимо от порядка завершения
+    results = await asyncio.gather(*(_agenerate_chunk(chunk, semaphore, retries) for chunk in chunks))
+    return _join_chunks(results)
 
 # Пример использования
 if __name__ == "__main__":
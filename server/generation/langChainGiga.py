@@ -1,24 +1,144 @@
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_gigachat.chat_models import GigaChat
+import asyncio
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 AUTHORIZATION_KEY = os.getenv("GIGACHAT_API_KEY")
 
+# Адреса API можно переопределить, например, чтобы направить запросы в локальную заглушку
+# (см. generation/stub_server.py)
+GIGACHAT_BASE_URL = os.getenv("GIGACHAT_BASE_URL")
+GIGACHAT_AUTH_URL = os.getenv("GIGACHAT_AUTH_URL")
+GIGACHAT_MODEL = os.getenv("GIGACHAT_MODEL", "GigaChat-2-Max")
+GIGACHAT_SCOPE = os.getenv("GIGACHAT_SCOPE", "GIGACHAT_API_PERS")
+GIGACHAT_TIMEOUT = float(os.getenv("GIGACHAT_TIMEOUT", "600"))
+# За сколько секунд до истечения токена запрашивать новый
+TOKEN_REFRESH_MARGIN = float(os.getenv("GIGACHAT_TOKEN_REFRESH_MARGIN", "60"))
+
+
+class GigaChatClientManager:
+    """
+    Хранит один клиент GigaChat на процесс.
+
+    Клиент держит пул HTTP-соединений, поэтому TLS-рукопожатие и обмен
+    OAuth-токена не повторяются для каждого запроса. Токен кешируется
+    и обновляется заранее, до истечения срока действия.
+    """
+
+    def __init__(
+        self,
+        credentials=None,
+        base_url=None,
+        auth_url=None,
+        model=None,
+        scope=None,
+        timeout=None,
+        refresh_margin=None,
+    ):
+        self.credentials = credentials if credentials is not None else AUTHORIZATION_KEY
+        self.base_url = base_url or GIGACHAT_BASE_URL
+        self.auth_url = auth_url or GIGACHAT_AUTH_URL
+        self.model = model or GIGACHAT_MODEL
+        self.scope = scope or GIGACHAT_SCOPE
+        self.timeout = timeout or GIGACHAT_TIMEOUT
+        self.refresh_margin = TOKEN_REFRESH_MARGIN if refresh_margin is None else refresh_margin
+
+        self._client = None
+        self._token_expires_at = 0.0  # Unix-время в секундах
+        self._lock = threading.RLock()
+        self._async_lock = None
+
+    def _create_client(self):
+        params = {
+            "credentials": self.credentials,
+            "verify_ssl_certs": False,
+            "scope": self.scope,
+            "model": self.model,
+            "timeout": self.timeout,
+        }
+        if self.base_url:
+            params["base_url"] = self.base_url
+        if self.auth_url:
+            params["auth_url"] = self.auth_url
+        return GigaChat(**params)
+
+    def get_client(self) -> GigaChat:
+        """Возвращает общий клиент, создавая его при первом обращении"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._create_client()
+        return self._client
+
+    def _token_is_fresh(self) -> bool:
+        return time.time() < self._token_expires_at - self.refresh_margin
+
+    def _store_token(self, access_token):
+        # GigaChat возвращает время истечения в миллисекундах
+        self._token_expires_at = access_token.expires_at / 1000
+
+    def ensure_token(self):
+        """Синхронно обновляет токен, если он отсутствует или скоро истечет"""
+        if not self.credentials or self._token_is_fresh():
+            return
+        with self._lock:
+            if not self._token_is_fresh():
+                self._store_token(self.get_client()._client.get_token())
+
+    async def aensure_token(self):
+        """Асинхронно обновляет токен, если он отсутствует или скоро истечет"""
+        if not self.credentials or self._token_is_fresh():
+            return
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        async with self._async_lock:
+            if not self._token_is_fresh():
+                access_token = await self.get_client()._client.aget_token()
+                self._store_token(access_token)
+
+    def invoke(self, messages, **params):
+        """Синхронный вызов модели через общий клиент"""
+        self.ensure_token()
+        return self.get_client().invoke(messages, **params)
+
+    async def ainvoke(self, messages, **params):
+        """Асинхронный вызов модели через общий клиент"""
+        await self.aensure_token()
+        return await self.get_client().ainvoke(messages, **params)
+
+    async def astream(self, messages, **params):
+        """Потоковый вызов модели: отдает фрагменты ответа по мере генерации"""
+        await self.aensure_token()
+        async for chunk in self.get_client().astream(messages, **params):
+            yield chunk
+
+    async def awarmup(self):
+        """Заранее получает токен, чтобы первый запрос не ждал авторизации"""
+        try:
+            await self.aensure_token()
+        except Exception as e:
+            print(f"Не удалось заранее получить токен GigaChat: {str(e)}")
+
+    async def aclose(self):
+        """Закрывает HTTP-соединения клиента"""
+        client = self._client
+        self._client = None
+        self._token_expires_at = 0.0
+        self._async_lock = None
+        if client is not None:
+            client._client.close()
+            await client._client.aclose()
+
+
+client_manager = GigaChatClientManager()
+
+
 def get_gigachat_client():
     """
     Возвращает клиент GigaChat для работы с API.
     """
-    credentials = AUTHORIZATION_KEY
-
-    giga = GigaChat(
-        credentials=credentials,
-        verify_ssl_certs=False,  
-        scope="GIGACHAT_API_PERS",  
-        model="GigaChat-2-Max",  
-        #model="GigaChat",  
-        #model="GigaChat-pro",
-    )
-
-    return giga
\ No newline at end of file
+    return client_manager.get_client()
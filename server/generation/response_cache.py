@@ -0,0 +1,185 @@
+"""
+Кеш ответов LLM.
+
+Ключ - хеш от (модель, системный промпт, промпт пользователя, temperature,
+top_p, max_tokens, n). Первый уровень - LRU в памяти процесса, второй
+(необязательный) - SQLite-файл, общий для перезапусков и нескольких воркеров.
+
+Настройки:
+    LLM_CACHE_ENABLED - включить кеш (по умолчанию 1)
+    LLM_CACHE_TTL - время жизни записи в секундах (по умолчанию 3600)
+    LLM_CACHE_MAX_ENTRIES - размер LRU в памяти (по умолчанию 1000)
+    LLM_CACHE_PATH - путь к SQLite-файлу второго уровня (по умолчанию не используется)
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from services.metrics import metrics
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") not in ("0", "false", "False", "")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH")
+
+
+def make_cache_key(model, system_prompt, prompt, temperature=None, top_p=None, max_tokens=None, n=None):
+    """Хеш параметров запроса, от которых зависит ответ модели"""
+    payload = json.dumps(
+        [model, system_prompt, prompt, temperature, top_p, max_tokens, n],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU-кеш ответов с TTL и необязательным хранилищем в SQLite"""
+
+    def __init__(self, max_entries=None, ttl=None, path=None, enabled=None):
+        self.max_entries = max_entries or LLM_CACHE_MAX_ENTRIES
+        self.ttl = LLM_CACHE_TTL if ttl is None else ttl
+        self.path = path if path is not None else LLM_CACHE_PATH
+        self.enabled = LLM_CACHE_ENABLED if enabled is None else enabled
+
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db = None
+
+    # --- второй уровень (SQLite) ---
+
+    def _get_db(self):
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        return self._db
+
+    def _disk_get(self, key):
+        with self._db_lock:
+            row = self._get_db().execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0], row[1]
+
+    def _disk_set(self, key, value, expires_at):
+        with self._db_lock:
+            db = self._get_db()
+            db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            db.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+            db.commit()
+
+    # --- первый уровень (память) ---
+
+    def _memory_get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def _memory_set(self, key, value, expires_at):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.increment("llm_cache.evictions")
+
+    # --- публичный интерфейс ---
+
+    def get(self, key):
+        """Возвращает ответ из кеша или None"""
+        if not self.enabled:
+            return None
+
+        value = self._memory_get(key)
+        if value is not None:
+            metrics.increment("llm_cache.hits")
+            return value
+
+        if self.path:
+            try:
+                found = self._disk_get(key)
+            except sqlite3.Error as e:
+                print(f"Ошибка чтения кеша LLM: {str(e)}")
+                found = None
+            if found is not None:
+                value, expires_at = found
+                self._memory_set(key, value, expires_at)
+                metrics.increment("llm_cache.hits")
+                metrics.increment("llm_cache.disk_hits")
+                return value
+
+        metrics.increment("llm_cache.misses")
+        return None
+
+    def set(self, key, value):
+        """Сохраняет ответ; пустые ответы не кешируются"""
+        if not self.enabled or not value:
+            return
+        expires_at = time.time() + self.ttl
+        self._memory_set(key, value, expires_at)
+        if self.path:
+            try:
+                self._disk_set(key, value, expires_at)
+            except sqlite3.Error as e:
+                print(f"Ошибка записи кеша LLM: {str(e)}")
+
+    async def aget(self, key):
+        """Как get, но обращение к SQLite выполняется вне цикла событий"""
+        if self.path:
+            return await asyncio.to_thread(self.get, key)
+        return self.get(key)
+
+    async def aset(self, key, value):
+        if self.path:
+            await asyncio.to_thread(self.set, key, value)
+        else:
+            self.set(key, value)
+
+    def clear(self):
+        """Очищает оба уровня кеша"""
+        with self._lock:
+            self._entries.clear()
+        if self.path:
+            with self._db_lock:
+                db = self._get_db()
+                db.execute("DELETE FROM llm_cache")
+                db.commit()
+
+    def stats(self):
+        hits = metrics.get("llm_cache.hits")
+        misses = metrics.get("llm_cache.misses")
+        with self._lock:
+            size = len(self._entries)
+        return {
+            "enabled": self.enabled,
+            "entries": size,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,129 @@
+"""
+Локальная заглушка GigaChat API для тестов и бенчмарков.
+
+Запуск:
+    uvicorn generation.stub_server:app --port 9090
+
+Переменные окружения для сервера приложения:
+    GIGACHAT_BASE_URL=http://localhost:9090/api/v1
+    GIGACHAT_AUTH_URL=http://localhost:9090/api/v2/oauth
+    GIGACHAT_API_KEY=<любая base64-строка>
+
+Настройки заглушки:
+    GIGACHAT_STUB_LATENCY - задержка ответа в секундах (по умолчанию 0)
+    GIGACHAT_STUB_TOKEN_TTL - время жизни токена в секундах (по умолчанию 1800)
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+app = FastAPI(title="GigaChat stub")
+
+app.state.latency = float(os.getenv("GIGACHAT_STUB_LATENCY", "0"))
+app.state.token_ttl = float(os.getenv("GIGACHAT_STUB_TOKEN_TTL", "1800"))
+app.state.tokens = {}
+app.state.stats = {"auth_requests": 0, "chat_requests": 0, "stream_requests": 0}
+# Сколько следующих запросов к модели завершить ошибкой 500 (для проверки повторов)
+app.state.failures = 0
+
+
+def _check_token(authorization):
+    token = (authorization or "").replace("Bearer ", "", 1)
+    expires_at = app.state.tokens.get(token)
+    if expires_at is None or expires_at < time.time():
+        raise HTTPException(status_code=401, detail="Token expired or invalid")
+
+
+def _make_answer(payload):
+    messages = payload.get("messages") or []
+    last = messages[-1]["content"] if messages else ""
+    return f"Ответ заглушки GigaChat на запрос: {last.strip()[:100]}"
+
+
+def _usage(payload, answer):
+    prompt_tokens = sum(len(m.get("content", "")) for m in payload.get("messages", [])) // 4
+    completion_tokens = max(1, len(answer) // 4)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+@app.post("/api/v2/oauth")
+async def oauth():
+    app.state.stats["auth_requests"] += 1
+    token = uuid.uuid4().hex
+    expires_at = time.time() + app.state.token_ttl
+    app.state.tokens[token] = expires_at
+    return {"access_token": token, "expires_at": int(expires_at * 1000)}
+
+
+@app.get("/api/v1/models")
+async def models(authorization: str = Header(None)):
+    _check_token(authorization)
+    return {"object": "list", "data": [{"id": "GigaChat-2-Max", "object": "model", "owned_by": "stub"}]}
+
+
+@app.post("/api/v1/chat/completions")
+async def chat_completions(request: Request, authorization: str = Header(None)):
+    _check_token(authorization)
+    if app.state.failures > 0:
+        app.state.failures -= 1
+        raise HTTPException(status_code=500, detail="Stub failure")
+    payload = await request.json()
+    answer = _make_answer(payload)
+    model = payload.get("model", "GigaChat-2-Max")
+
+    if payload.get("stream"):
+        app.state.stats["stream_requests"] += 1
+
+        async def event_stream():
+            words = answer.split(" ")
+            for i, word in enumerate(words):
+                await asyncio.sleep(app.state.latency / max(len(words), 1))
+                chunk = {
+                    "choices": [{
+                        "delta": {"role": "assistant", "content": word if i == 0 else " " + word},
+                        "index": 0,
+                    }],
+                    "created": int(time.time()),
+                    "model": model,
+                    "object": "chat.completion",
+                }
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            final = {
+                "choices": [{"delta": {"content": ""}, "index": 0, "finish_reason": "stop"}],
+                "created": int(time.time()),
+                "model": model,
+                "object": "chat.completion",
+                "usage": _usage(payload, answer),
+            }
+            yield f"data: {json.dumps(final, ensure_ascii=False)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+    app.state.stats["chat_requests"] += 1
+    await asyncio.sleep(app.state.latency)
+    return {
+        "choices": [{
+            "message": {"role": "assistant", "content": answer},
+            "index": 0,
+            "finish_reason": "stop",
+        }],
+        "created": int(time.time()),
+        "model": model,
+        "usage": _usage(payload, answer),
+        "object": "chat.completion",
+    }
+
+
+@app.get("/stats")
+async def stats():
+    """Счетчики запросов для проверок в тестах и бенчмарках"""
+    return app.state.stats
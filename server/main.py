@@ -13,6 +13,18 @@ from routes.formatting import router as formatting_router
 from routes.chat import router as chat_router  
 from routes.document_analysis import router as document_analysis_router 
 from routes.report_editor import router as report_editor_router
+from routes.metrics import router as metrics_router
+from generation.langChainGiga import client_manager
+from services.docx_pool import docx_pool
+from services.password_hasher import password_hasher
+from services.chat_memory import chat_memory
+from worker import ReportWorker
+import asyncio
+import os
+
+# Воркеры очереди отчетов внутри процесса API. В docker-compose генерацию
+# выполняет отдельный сервис worker, там значение 0.
+EMBEDDED_WORKERS = int(os.getenv("REPORT_EMBEDDED_WORKERS", "1"))
 
 
 #import data.load_data
@@ -30,7 +42,28 @@ async def lifespan(app: FastAPI):
             session.add(user)
             await session.commit()
 
+    # Заранее получаем токен GigaChat, чтобы первый запрос не ждал авторизации
+    await client_manager.awarmup()
+    # Процессы пула DOCX запускаются заранее, а не на первом редактировании
+    await docx_pool.warmup()
+
+    worker = None
+    worker_task = None
+    if EMBEDDED_WORKERS > 0:
+        worker = ReportWorker(concurrency=EMBEDDED_WORKERS)
+        worker_task = asyncio.create_task(worker.run())
+
     yield
+
+    if worker_task:
+        # Незавершенные задания вернутся в очередь по истечении видимости
+        worker.stop()
+        worker_task.cancel()
+        await asyncio.gather(worker_task, return_exceptions=True)
+    docx_pool.shutdown()
+    password_hasher.shutdown()
+    await chat_memory.shutdown()
+    await client_manager.aclose()
 app = FastAPI(lifespan=lifespan)
 #app = FastAPI()
 
@@ -59,6 +92,7 @@ app.include_router(formatting_router, prefix="/api", tags=["formatting"])
 app.include_router(chat_router, prefix="/api", tags=["chats"]) 
 app.include_router(document_analysis_router, prefix="/api", tags=["document-analysis"])  
 app.include_router(report_editor_router, prefix="/api", tags=["report-editor"])  
+app.include_router(metrics_router, prefix="/api", tags=["metrics"])
 
 @app.get("/")
 async def root():
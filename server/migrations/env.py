@@ -0,0 +1,62 @@
+"""
+Окружение Alembic.
+
+При запуске из приложения (database.run_migrations) соединение передается
+через config.attributes["connection"]; при запуске из командной строки
+создается собственный async-движок по database.DATABASE_URL.
+"""
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from models.models import Base
+
+config = context.config
+target_metadata = Base.metadata
+
+
+def do_run_migrations(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        # В SQLite ALTER TABLE ограничен - изменения таблиц через пересоздание
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations():
+    from database import DATABASE_URL
+
+    engine = create_async_engine(config.get_main_option("sqlalchemy.url") or DATABASE_URL, poolclass=NullPool)
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await engine.dispose()
+
+
+def run_migrations_offline():
+    from database import DATABASE_URL
+
+    context.configure(
+        url=config.get_main_option("sqlalchemy.url") or DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+connection = config.attributes.get("connection")
+if connection is not None:
+    do_run_migrations(connection)
+elif context.is_offline_mode():
+    run_migrations_offline()
+else:
+    # Логирование из alembic.ini настраиваем только при запуске из командной строки
+    if config.config_file_name:
+        fileConfig(config.config_file_name)
+    asyncio.run(run_async_migrations())
@@ -0,0 +1,140 @@
+"""Исходная схема (как ее создавал Base.metadata.create_all)
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001_baseline"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _id_index(table):
+    op.create_index(f"ix_{table}_id", table, ["id"])
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("username", sa.String(), nullable=False, unique=True),
+        sa.Column("email", sa.String(), nullable=False, unique=True),
+        sa.Column("password", sa.String(), nullable=False),
+    )
+    _id_index("users")
+
+    op.create_table(
+        "templates",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("content", sa.Text(), nullable=False),
+    )
+    _id_index("templates")
+
+    op.create_table(
+        "formatting_presets",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String()),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("styles", sa.JSON(), nullable=False),
+        sa.Column("is_default", sa.Boolean()),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    _id_index("formatting_presets")
+    op.create_index("ix_formatting_presets_name", "formatting_presets", ["name"])
+
+    op.create_table(
+        "files",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("filename", sa.String(), nullable=False),
+        sa.Column("uploaded_at", sa.DateTime()),
+    )
+    _id_index("files")
+
+    op.create_table(
+        "chats",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String()),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    _id_index("chats")
+
+    op.create_table(
+        "chat_messages",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("chat_id", sa.Integer(), sa.ForeignKey("chats.id")),
+        sa.Column("content", sa.Text()),
+        sa.Column("role", sa.String()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    _id_index("chat_messages")
+
+    op.create_table(
+        "documents",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("original_filename", sa.String(), nullable=False),
+        sa.Column("file_path", sa.String(), nullable=False),
+        sa.Column("file_type", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    _id_index("documents")
+
+    op.create_table(
+        "chat_documents",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("chat_id", sa.Integer(), sa.ForeignKey("chats.id")),
+        sa.Column("document_id", sa.Integer(), sa.ForeignKey("documents.id")),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    _id_index("chat_documents")
+
+    op.create_table(
+        "reports",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("template_id", sa.Integer(), sa.ForeignKey("templates.id")),
+        sa.Column("chat_id", sa.Integer(), sa.ForeignKey("chats.id"), nullable=True),
+        sa.Column("title", sa.String()),
+        sa.Column("format", sa.String()),
+        sa.Column("file_path", sa.String()),
+        sa.Column("status", sa.String()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("sections", sa.JSON(), nullable=False),
+        sa.Column("formatting_preset_id", sa.Integer(), sa.ForeignKey("formatting_presets.id"), nullable=True),
+        sa.Column("html_content", sa.Text(), nullable=True),
+        sa.Column("document_version", sa.Integer()),
+        sa.Column("version_history", sa.JSON(), nullable=True),
+    )
+    _id_index("reports")
+    op.create_index("ix_reports_title", "reports", ["title"])
+
+    op.create_table(
+        "document_edits",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("report_id", sa.Integer(), sa.ForeignKey("reports.id")),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("chat_message_id", sa.Integer(), sa.ForeignKey("chat_messages.id"), nullable=True),
+        sa.Column("edit_type", sa.String()),
+        sa.Column("content_before", sa.Text(), nullable=True),
+        sa.Column("content_after", sa.Text(), nullable=True),
+        sa.Column("position", sa.JSON(), nullable=True),
+        sa.Column("timestamp", sa.DateTime()),
+    )
+    _id_index("document_edits")
+
+
+def downgrade():
+    for table in ("document_edits", "reports", "chat_documents", "documents", "chat_messages",
+                  "chats", "files", "formatting_presets", "templates", "users"):
+        op.drop_table(table)
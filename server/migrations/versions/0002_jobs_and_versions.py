@@ -0,0 +1,93 @@
+"""Очередь заданий, события генерации и хранилище версий отчетов
+
+Эти таблицы могли уже появиться через create_all (до перехода на миграции),
+поэтому создаются с IF NOT EXISTS.
+
+Revision ID: 0002_jobs_and_versions
+Revises: 0001_baseline
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002_jobs_and_versions"
+down_revision = "0001_baseline"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "report_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("report_id", sa.Integer(), sa.ForeignKey("reports.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("priority", sa.Integer(), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("max_attempts", sa.Integer(), nullable=False),
+        sa.Column("run_after", sa.DateTime(), nullable=False),
+        sa.Column("locked_by", sa.String(), nullable=True),
+        sa.Column("locked_until", sa.DateTime(), nullable=True),
+        sa.Column("progress", sa.Float(), nullable=False),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        if_not_exists=True,
+    )
+    op.create_index("ix_report_jobs_id", "report_jobs", ["id"], if_not_exists=True)
+    op.create_index("ix_report_jobs_report_id", "report_jobs", ["report_id"], if_not_exists=True)
+    op.create_index("ix_report_jobs_claim", "report_jobs", ["status", "priority", "run_after"], if_not_exists=True)
+    op.create_index("ix_report_jobs_user_status", "report_jobs", ["user_id", "status"], if_not_exists=True)
+
+    op.create_table(
+        "report_progress_events",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("report_id", sa.Integer(), sa.ForeignKey("reports.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("job_id", sa.Integer(), sa.ForeignKey("report_jobs.id", ondelete="CASCADE"), nullable=True),
+        sa.Column("event", sa.String(), nullable=False),
+        sa.Column("section_index", sa.Integer(), nullable=True),
+        sa.Column("section_title", sa.String(), nullable=True),
+        sa.Column("tokens", sa.Integer(), nullable=True),
+        sa.Column("elapsed", sa.Float(), nullable=True),
+        sa.Column("progress", sa.Float(), nullable=True),
+        sa.Column("message", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime()),
+        if_not_exists=True,
+    )
+    op.create_index("ix_report_progress_events_id", "report_progress_events", ["id"], if_not_exists=True)
+    op.create_index("ix_report_progress_events_report_id_id", "report_progress_events",
+                    ["report_id", "id"], if_not_exists=True)
+
+    op.create_table(
+        "html_blobs",
+        sa.Column("hash", sa.String(64), primary_key=True),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("compressed_size", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+        if_not_exists=True,
+    )
+
+    op.create_table(
+        "report_versions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("report_id", sa.Integer(), sa.ForeignKey("reports.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("edit_description", sa.String(), nullable=True),
+        sa.Column("file_path", sa.String(), nullable=True),
+        sa.Column("html_hash", sa.String(64), sa.ForeignKey("html_blobs.hash"), nullable=True),
+        sa.Column("created_at", sa.DateTime()),
+        sa.UniqueConstraint("report_id", "version", name="uq_report_versions_report_version"),
+        if_not_exists=True,
+    )
+    op.create_index("ix_report_versions_id", "report_versions", ["id"], if_not_exists=True)
+
+
+def downgrade():
+    for table in ("report_versions", "html_blobs", "report_progress_events", "report_jobs"):
+        op.drop_table(table)
@@ -0,0 +1,43 @@
+"""Индексы для частых выборок по внешним ключам и пагинации списков
+
+Перед уникальным индексом chat_documents(chat_id, document_id) удаляются
+повторные привязки документа к чату (остается самая ранняя).
+
+Revision ID: 0003_lookup_indexes
+Revises: 0002_jobs_and_versions
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "0003_lookup_indexes"
+down_revision = "0002_jobs_and_versions"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    # (имя, таблица, колонки, уникальный)
+    ("ix_chat_messages_chat_id_id", "chat_messages", ["chat_id", "id"], False),
+    ("uq_chat_documents_chat_document", "chat_documents", ["chat_id", "document_id"], True),
+    ("ix_chat_documents_document_id", "chat_documents", ["document_id"], False),
+    ("ix_document_edits_report_id", "document_edits", ["report_id", "timestamp"], False),
+    ("ix_reports_user_created", "reports", ["user_id", "created_at", "id"], False),
+    ("ix_reports_user_title", "reports", ["user_id", "title", "id"], False),
+    ("ix_reports_chat_id", "reports", ["chat_id"], False),
+    ("ix_documents_user_created", "documents", ["user_id", "created_at"], False),
+    ("ix_chats_user_updated", "chats", ["user_id", "updated_at", "id"], False),
+]
+
+
+def upgrade():
+    op.execute(
+        "DELETE FROM chat_documents WHERE id NOT IN "
+        "(SELECT MIN(id) FROM chat_documents GROUP BY chat_id, document_id)"
+    )
+    for name, table, columns, unique in INDEXES:
+        op.create_index(name, table, columns, unique=unique, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,38 @@
+"""Краткое содержание ранней переписки чата
+
+Колонки могли уже появиться через create_all, поэтому добавляются только
+отсутствующие.
+
+Revision ID: 0004_chat_summary
+Revises: 0003_lookup_indexes
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004_chat_summary"
+down_revision = "0003_lookup_indexes"
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    sa.Column("summary", sa.Text(), nullable=True),
+    sa.Column("summary_message_id", sa.Integer(), nullable=True),
+]
+
+
+def upgrade():
+    existing = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("chats")}
+    missing = [column for column in COLUMNS if column.name not in existing]
+    if not missing:
+        return
+    with op.batch_alter_table("chats") as batch:
+        for column in missing:
+            batch.add_column(column)
+
+
+def downgrade():
+    with op.batch_alter_table("chats") as batch:
+        for column in reversed(COLUMNS):
+            batch.drop_column(column.name)
@@ -0,0 +1,28 @@
+"""Название отчета NOT NULL
+
+Keyset-пагинация по названию сравнивает (title, id) с курсором; с NULL
+сравнение ложно и обход обрывается. Пустые названия заменяются на ''.
+
+Revision ID: 0005_report_title_not_null
+Revises: 0004_chat_summary
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005_report_title_not_null"
+down_revision = "0004_chat_summary"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("UPDATE reports SET title = '' WHERE title IS NULL")
+    with op.batch_alter_table("reports") as batch:
+        batch.alter_column("title", existing_type=sa.String(), nullable=False, server_default="")
+
+
+def downgrade():
+    with op.batch_alter_table("reports") as batch:
+        batch.alter_column("title", existing_type=sa.String(), nullable=True, server_default=None)
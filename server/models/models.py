@@ -1,12 +1,10 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Text, DateTime, JSON
-from sqlalchemy.orm import relationship,declarative_base
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Text, DateTime, JSON, Float, Index, LargeBinary, UniqueConstraint
+from sqlalchemy.orm import relationship,declarative_base, deferred
 from sqlalchemy.sql import func
-from passlib.context import CryptContext
+from services.password_hasher import pwd_context
 Base = declarative_base()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 
 class User(Base):
     __tablename__ = 'users'
@@ -21,6 +19,7 @@ class User(Base):
     chats = relationship("Chat", back_populates="user", cascade="all, delete-orphan")
     documents = relationship("Document", back_populates="user", cascade="all, delete-orphan")
 
+    # Синхронные версии; в обработчиках запросов используется services.password_hasher
     def set_password(self, password):
         """Хеширует пароль и сохраняет его."""
         self.password = pwd_context.hash(password)
@@ -45,16 +44,19 @@ class Report(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     template_id = Column(Integer, ForeignKey("templates.id"))
     chat_id = Column(Integer, ForeignKey("chats.id"), nullable=True)
-    title = Column(String, index=True)
+    title = Column(String, index=True, nullable=False, default="", server_default="")
     format = Column(String) 
     file_path = Column(String)
     status = Column(String, default="pending")
     created_at = Column(DateTime, default=datetime.utcnow)
-    sections = Column(JSON, nullable=False)  
+    # Тяжелые колонки отложены: списки и статусы их не читают, нужные
+    # места загружают их явно через undefer / undefer_group("content")
+    sections = deferred(Column(JSON, nullable=False), group="content")
     formatting_preset_id = Column(Integer, ForeignKey("formatting_presets.id"), nullable=True)
-    html_content = Column(Text, nullable=True)  # Для хранения HTML-представления документа
+    html_content = deferred(Column(Text, nullable=True), group="content")  # Для хранения HTML-представления документа
     document_version = Column(Integer, default=1)  # Версионность документа
-    version_history = Column(JSON, nullable=True, default=lambda: [])  # Массив версий
+    # Устаревший массив версий с полным HTML; переносится в report_versions (см. services/version_store.py)
+    version_history = deferred(Column(JSON, nullable=True, default=lambda: []), group="history")
 
     user = relationship("User", back_populates="reports")
     template = relationship("Template", back_populates="reports")
@@ -62,6 +64,13 @@ class Report(Base):
     chat = relationship("Chat", foreign_keys=[chat_id])
     edits = relationship("DocumentEdit", back_populates="report")
 
+    __table_args__ = (
+        # Курсорная пагинация списка отчетов (services/pagination.py)
+        Index("ix_reports_user_created", "user_id", "created_at", "id"),
+        Index("ix_reports_user_title", "user_id", "title", "id"),
+        Index("ix_reports_chat_id", "chat_id"),
+    )
+
 
 class FormattingPreset(Base):
     __tablename__ = "formatting_presets"
@@ -95,11 +104,19 @@ class Chat(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Краткое содержание ранней части переписки (services/chat_memory.py)
+    summary = Column(Text, nullable=True)
+    # ID последнего сообщения, учтенного в summary
+    summary_message_id = Column(Integer, nullable=True)
 
     user = relationship("User", back_populates="chats")
     messages = relationship("ChatMessage", back_populates="chat", cascade="all, delete-orphan")
     documents = relationship("ChatDocument", back_populates="chat", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_chats_user_updated", "user_id", "updated_at", "id"),
+    )
+
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
@@ -112,6 +129,11 @@ class ChatMessage(Base):
 
     chat = relationship("Chat", back_populates="messages")
 
+    __table_args__ = (
+        # Сообщения чата в порядке добавления
+        Index("ix_chat_messages_chat_id_id", "chat_id", "id"),
+    )
+
 
 class Document(Base):
     __tablename__ = "documents"
@@ -126,6 +148,10 @@ class Document(Base):
     user = relationship("User", back_populates="documents")
     chat_documents = relationship("ChatDocument", back_populates="document", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_documents_user_created", "user_id", "created_at"),
+    )
+
 
 class ChatDocument(Base):
     __tablename__ = "chat_documents"
@@ -138,6 +164,12 @@ class ChatDocument(Base):
     chat = relationship("Chat", back_populates="documents")
     document = relationship("Document", back_populates="chat_documents")
 
+    __table_args__ = (
+        # Документ привязывается к чату один раз
+        Index("uq_chat_documents_chat_document", "chat_id", "document_id", unique=True),
+        Index("ix_chat_documents_document_id", "document_id"),
+    )
+
 
 class DocumentEdit(Base):
     __tablename__ = 'document_edits'
@@ -153,3 +185,84 @@ class DocumentEdit(Base):
     
     report = relationship("Report", back_populates="edits")
     chat_message = relationship("ChatMessage")
+
+    __table_args__ = (
+        Index("ix_document_edits_report_id", "report_id", "timestamp"),
+    )
+
+
+class ReportJob(Base):
+    """Задание на генерацию отчета в очереди, которую разбирают воркеры"""
+    __tablename__ = "report_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    report_id = Column(Integer, ForeignKey("reports.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    status = Column(String, default="queued", nullable=False)  # queued, running, completed, failed
+    priority = Column(Integer, default=0, nullable=False)  # больше - раньше
+    payload = Column(JSON, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=3, nullable=False)
+    run_after = Column(DateTime, default=datetime.utcnow, nullable=False)  # не брать раньше (задержка повтора)
+    locked_by = Column(String, nullable=True)
+    locked_until = Column(DateTime, nullable=True)  # до этого момента задание принадлежит воркеру
+    progress = Column(Float, default=0.0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_report_jobs_claim", "status", "priority", "run_after"),
+        Index("ix_report_jobs_user_status", "user_id", "status"),
+    )
+
+
+class ReportProgressEvent(Base):
+    """Событие хода генерации отчета (начало/конец раздела, завершение, ошибка)"""
+    __tablename__ = "report_progress_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    report_id = Column(Integer, ForeignKey("reports.id", ondelete="CASCADE"), nullable=False)
+    job_id = Column(Integer, ForeignKey("report_jobs.id", ondelete="CASCADE"), nullable=True)
+    event = Column(String, nullable=False)
+    section_index = Column(Integer, nullable=True)
+    section_title = Column(String, nullable=True)
+    tokens = Column(Integer, nullable=True)  # токенов в сгенерированном разделе (оценка)
+    elapsed = Column(Float, nullable=True)  # секунд с начала генерации
+    progress = Column(Float, nullable=True)
+    message = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_report_progress_events_report_id_id", "report_id", "id"),
+    )
+
+
+class HtmlBlob(Base):
+    """HTML версии документа, сжатый zlib; одинаковый HTML хранится один раз"""
+    __tablename__ = "html_blobs"
+
+    hash = Column(String(64), primary_key=True)  # sha256 несжатого HTML
+    data = Column(LargeBinary, nullable=False)
+    size = Column(Integer, nullable=False)
+    compressed_size = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ReportVersion(Base):
+    """Метаданные версии отчета; HTML загружается отдельно по html_hash"""
+    __tablename__ = "report_versions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    report_id = Column(Integer, ForeignKey("reports.id", ondelete="CASCADE"), nullable=False)
+    version = Column(Integer, nullable=False)
+    description = Column(String, nullable=True)
+    edit_description = Column(String, nullable=True)
+    file_path = Column(String, nullable=True)
+    html_hash = Column(String(64), ForeignKey("html_blobs.hash"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("report_id", "version", name="uq_report_versions_report_version"),
+    )
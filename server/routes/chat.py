@@ -1,9 +1,11 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, status, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
-from database import get_db
-from models.models import User
+from typing import List, Optional
+from datetime import datetime
+from database import get_db, SessionLocal
 from routes.user import get_current_user
+from services.auth_cache import Principal
 from services.chat_service import ChatService
 from pydantic import BaseModel
 from schemas import (
@@ -15,6 +17,7 @@ from schemas import (
     ChatMessageResponse
 )
 from services.document_analysis_service import DocumentAnalysisService
+from services.streaming import sse_event, SSE_HEADERS
 
 class DocumentAnalysisRequest(BaseModel):
     document_id: int
@@ -28,7 +31,7 @@ chat_service = ChatService()
 async def create_chat(
     chat_data: ChatCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Создает новый чат"""
     return await chat_service.create_chat(db, current_user.id, chat_data.title)
@@ -37,7 +40,7 @@ async def create_chat(
 async def create_chat_with_message(
     message: ChatMessageCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Создает новый чат с начальным сообщением"""
     chat, messages = await chat_service.create_chat_with_first_message(
@@ -51,26 +54,84 @@ async def create_chat_with_message(
 
 @router.get("/", response_model=List[ChatResponse])
 async def get_user_chats(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, description="Размер страницы"),
+    cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor"),
+    title_prefix: Optional[str] = Query(None, description="Начало названия чата"),
+    updated_from: Optional[datetime] = Query(None, description="Обновлен не раньше"),
+    updated_to: Optional[datetime] = Query(None, description="Обновлен раньше"),
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
-    """Получает все чаты пользователя"""
-    return await chat_service.get_user_chats(db, current_user.id)
+    """
+    Получает страницу чатов пользователя (последние обновленные первыми).
+    Если есть следующая страница, ее курсор передается в заголовке X-Next-Cursor.
+    """
+    try:
+        chats, next_cursor = await chat_service.get_user_chats(
+            db, current_user.id, limit, cursor, title_prefix, updated_from, updated_to
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return chats
 
 
 @router.get("/{chat_id}", response_model=ChatDetailResponse)
 async def get_chat(
     chat_id: int,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, description="Сколько последних сообщений вернуть (по умолчанию LIST_PAGE_SIZE)"),
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
-    """Получает детали чата включая сообщения"""
+    """
+    Получает детали чата и последние сообщения (limit, по умолчанию
+    LIST_PAGE_SIZE). Если есть более ранние, курсор для
+    GET /chats/{chat_id}/messages передается в заголовке X-Next-Cursor.
+    """
     chat = await chat_service.get_chat(db, chat_id, current_user.id)
     if not chat:
         raise HTTPException(status_code=404, detail="Чат не найден")
-    if chat:
-        chat.messages.sort(key=lambda x: x.id)
-    return chat
+
+    messages, next_cursor = await chat_service.get_messages_page(db, chat_id, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return {
+        "id": chat.id,
+        "title": chat.title,
+        "created_at": chat.created_at,
+        "updated_at": chat.updated_at,
+        "messages": messages,
+    }
+
+
+@router.get("/{chat_id}/messages", response_model=List[ChatMessageResponse])
+async def get_chat_messages(
+    chat_id: int,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, description="Размер страницы"),
+    cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor"),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    Страница истории чата (в порядке добавления): без курсора - последние
+    сообщения, с курсором - более ранние. Курсор следующей (более ранней)
+    страницы передается в заголовке X-Next-Cursor.
+    """
+    chat = await chat_service.get_chat(db, chat_id, current_user.id)
+    if not chat:
+        raise HTTPException(status_code=404, detail="Чат не найден")
+
+    try:
+        messages, next_cursor = await chat_service.get_messages_page(db, chat_id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return messages
 
 
 @router.post("/{chat_id}/messages", response_model=List[ChatMessageResponse])
@@ -78,7 +139,7 @@ async def add_message(
     chat_id: int,
     message: ChatMessageCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Добавляет новое сообщение и генерирует ответ ИИ"""
     # Проверяем существование чата
@@ -87,7 +148,7 @@ async def add_message(
         raise HTTPException(status_code=404, detail="Чат не найден")
     
     # Проверяем, является ли это первым сообщением в чате
-    is_first_message = len(chat.messages) == 0
+    is_first_message = not await chat_service.has_messages(db, chat_id)
     
     # Добавляем сообщение пользователя
     user_message = await chat_service.add_message(db, chat_id, message.content, "user")
@@ -104,11 +165,55 @@ async def add_message(
     return [user_message, ai_message]
 
 
+@router.post("/{chat_id}/messages/stream")
+async def add_message_stream(
+    chat_id: int,
+    message: ChatMessageCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    Добавляет сообщение и отдает ответ ИИ потоком (Server-Sent Events).
+
+    События: user_message - сохраненное сообщение пользователя, token - очередной
+    фрагмент ответа, message - сохраненный ответ ассистента, error - ошибка генерации.
+    """
+    chat = await chat_service.get_chat(db, chat_id, current_user.id)
+    if not chat:
+        raise HTTPException(status_code=404, detail="Чат не найден")
+
+    is_first_message = not await chat_service.has_messages(db, chat_id)
+    user_message = await chat_service.add_message(db, chat_id, message.content, "user")
+    user_id = current_user.id
+
+    async def event_stream():
+        yield sse_event("user_message", ChatMessageResponse.model_validate(user_message).model_dump())
+
+        # Сессия запроса закрывается до окончания потока, поэтому открываем свою
+        async with SessionLocal() as session:
+            try:
+                async for event in chat_service.stream_ai_response(session, chat_id, user_id, message.content):
+                    if event["type"] == "token":
+                        yield sse_event("token", {"content": event["content"]})
+                    else:
+                        yield sse_event("message", ChatMessageResponse.model_validate(event["message"]).model_dump())
+            except Exception as e:
+                print(f"Ошибка потоковой генерации ответа: {str(e)}")
+                yield sse_event("error", {"detail": str(e)})
+                return
+
+            if is_first_message and message.content:
+                title = message.content[:30] + ("..." if len(message.content) > 30 else "")
+                await chat_service.update_chat_title(session, chat_id, user_id, title)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
 @router.post("/{chat_id}/reset", response_model=ChatMessageResponse)
 async def reset_chat_context(
     chat_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Сбрасывает контекст чата для улучшения качества ответов"""
     # Проверяем существование чата
@@ -137,7 +242,7 @@ async def update_chat(
     chat_id: int,
     chat_data: ChatUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Обновляет заголовок чата"""
     chat = await chat_service.update_chat_title(db, chat_id, current_user.id, chat_data.title)
@@ -150,7 +255,7 @@ async def update_chat(
 async def delete_chat(
     chat_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Удаляет чат"""
     result = await chat_service.delete_chat(db, chat_id, current_user.id)
@@ -164,7 +269,7 @@ async def analyze_document_in_chat(
     chat_id: int,
     request: DocumentAnalysisRequest,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Анализирует документ в контексте чата"""
     # Проверяем существование чата
@@ -192,7 +297,7 @@ async def analyze_document_in_chat(
 async def get_chat_documents(
     chat_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Получает список документов, прикрепленных к чату"""
     documents = await chat_service.list_documents_for_chat(db, chat_id, current_user.id)
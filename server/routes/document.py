@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, validator
-from typing import List, Optional, Dict, Literal
+from typing import List, Optional, Dict, Literal, Union
 from document_generation.document_service import DocumentService
 
 router = APIRouter(prefix="/documents", tags=["documents"])
@@ -11,6 +11,7 @@ class Section(BaseModel):
     prompt: str
     heading_level: int = 1
     generation_params: Optional[Dict] = None
+    depends_on: Optional[Union[str, List[Union[int, str]]]] = None
 
 class GenerateDocumentRequest(BaseModel):
     title: str
@@ -28,7 +29,7 @@ class GenerateDocumentRequest(BaseModel):
 async def generate_document(request: GenerateDocumentRequest):
     """Создать документ Word с контентом, сгенерированным ИИ, следуя стандартам ГОСТ, если указано"""
     try:
-        output_path = document_service.generate_report(
+        output_path = await document_service.generate_report_async(
             request.title,
             [section.dict() for section in request.sections],
             request.filename,
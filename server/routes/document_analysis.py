@@ -4,8 +4,9 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from database import get_db
-from models.models import User, Document, ChatDocument, Chat
+from models.models import Document, ChatDocument, Chat
 from routes.user import get_current_user
+from services.auth_cache import Principal
 from pydantic import BaseModel
 from services.document_analysis_service import DocumentAnalysisService
 
@@ -33,7 +34,7 @@ async def upload_document(
     file: UploadFile = File(...),
     chat_id: Optional[int] = Form(None),
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Загружает документ для анализа"""
     try:
@@ -64,7 +65,7 @@ async def upload_document(
 async def analyze_document(
     request: DocumentAnalysisRequest,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Анализирует документ и отвечает на вопрос"""
     try:
@@ -94,7 +95,7 @@ async def analyze_document(
 @router.get("/documents", response_model=List[DocumentResponse])
 async def get_user_documents(
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Получает список документов пользователя"""
     from sqlalchemy import select
@@ -108,7 +109,7 @@ async def get_user_documents(
 async def get_chat_documents(
     chat_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Получает список документов, связанных с конкретным чатом"""
     # Проверяем доступ к чату
@@ -134,7 +135,7 @@ async def get_chat_documents(
 async def summarize_document(
     document_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Создает краткое резюме документа"""
     # Проверяем доступ к документу
@@ -3,15 +3,16 @@ from typing import List, Optional
 from sqlalchemy import select, update, and_, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
-from models.models import FormattingPreset, User
+from models.models import FormattingPreset
 from schemas import FormattingPresetCreate, FormattingPresetResponse, FormattingPresetUpdate
 import json
 from routes.user import get_current_user
+from services.auth_cache import Principal
 
 router = APIRouter(prefix="/formatting", tags=["formatting"],)
 
 @router.get("/presets", response_model=List[FormattingPresetResponse])
-async def get_presets(db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def get_presets(db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     """
     Получить все пресеты форматирования, доступные пользователю
     """
@@ -39,7 +40,7 @@ async def get_default_presets(db: AsyncSession = Depends(get_db)):
     return presets
 
 @router.get("/presets/{preset_id}", response_model=FormattingPresetResponse)
-async def get_preset(preset_id: int, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def get_preset(preset_id: int, db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     """
     Получить конкретный пресет форматирования
     """
@@ -60,7 +61,7 @@ async def get_preset(preset_id: int, db: AsyncSession = Depends(get_db), current
 async def create_preset(
     preset: FormattingPresetCreate, 
     db: AsyncSession = Depends(get_db), 
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Создать новый пресет форматирования
@@ -111,7 +112,7 @@ async def update_preset(
     preset_id: int,
     preset_update: FormattingPresetUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Обновить пресет форматирования
@@ -181,7 +182,7 @@ async def update_preset(
 async def delete_preset(
     preset_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Удалить пресет форматирования
@@ -207,7 +208,7 @@ async def delete_preset(
 async def set_default_preset(
     preset_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Установить пресет форматирования по умолчанию для пользователя
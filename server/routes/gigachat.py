@@ -1,17 +1,22 @@
 from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
 from generation.generate_text_langchain import (
-    generate_text,
-    generate_text_with_params,
-    generate_long_text,
+    agenerate_text,
+    agenerate_text_with_params,
+    agenerate_long_text,
+    astream_text,
+    astream_text_with_params,
 )
+from services.streaming import sse_event, SSE_HEADERS
 
 router = APIRouter(prefix="/gigachat", tags=["gigachat"])
 
 # Модели Pydantic для запросов
 class GenerateTextRequest(BaseModel):
     prompt: str
+    use_cache: Optional[bool] = True
 
 class GenerateTextWithParamsRequest(BaseModel):
     prompt: str
@@ -19,6 +24,7 @@ class GenerateTextWithParamsRequest(BaseModel):
     max_tokens: Optional[int] = 500
     top_p: Optional[float] = 0.9
     n: Optional[int] = 1
+    use_cache: Optional[bool] = True
 
 class GenerateLongTextRequest(BaseModel):
     prompt: str
@@ -34,7 +40,7 @@ async def generate_text_endpoint(request: GenerateTextRequest):
     Генерирует текст по промпту с использованием GigaChat API через LangChain.
     """
     try:
-        generated_text = generate_text(request.prompt)
+        generated_text = await agenerate_text(request.prompt, use_cache=request.use_cache)
         return {"generated_text": generated_text}
     except Exception as e:
         raise HTTPException(
@@ -48,12 +54,13 @@ async def generate_text_with_params_endpoint(request: GenerateTextWithParamsRequ
     Генерирует текст по промпту с настраиваемыми параметрами через LangChain.
     """
     try:
-        generated_text = generate_text_with_params(
+        generated_text = await agenerate_text_with_params(
             request.prompt,
             temperature=request.temperature,
             max_tokens=request.max_tokens,
             top_p=request.top_p,
             n=request.n,
+            use_cache=request.use_cache,
         )
         return {"generated_text": generated_text}
     except Exception as e:
@@ -68,7 +75,7 @@ async def generate_long_text_endpoint(request: GenerateLongTextRequest):
     Генерирует длинный текст, разбивая промпт на части через LangChain.
     """
     try:
-        generated_text = generate_long_text(
+        generated_text = await agenerate_long_text(
             request.prompt,
             chunk_size=request.chunk_size,
         )
@@ -77,4 +84,35 @@ async def generate_long_text_endpoint(request: GenerateLongTextRequest):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при генерации текста: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+async def _stream_events(chunks):
+    """Преобразует поток фрагментов текста в события SSE"""
+    try:
+        async for chunk in chunks:
+            yield sse_event("token", {"content": chunk})
+        yield sse_event("done", {})
+    except Exception as e:
+        yield sse_event("error", {"detail": f"Ошибка при генерации текста: {str(e)}"})
+
+@router.post("/generate-text/stream")
+async def generate_text_stream_endpoint(request: GenerateTextRequest):
+    """
+    Потоковая генерация текста (Server-Sent Events): фрагменты отдаются по мере генерации.
+    """
+    chunks = astream_text(request.prompt, use_cache=request.use_cache)
+    return StreamingResponse(_stream_events(chunks), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.post("/generate-text-with-params/stream")
+async def generate_text_with_params_stream_endpoint(request: GenerateTextWithParamsRequest):
+    """
+    Потоковая генерация текста с настраиваемыми параметрами (Server-Sent Events).
+    """
+    chunks = astream_text_with_params(
+        request.prompt,
+        temperature=request.temperature,
+        max_tokens=request.max_tokens,
+        top_p=request.top_p,
+        use_cache=request.use_cache,
+    )
+    return StreamingResponse(_stream_events(chunks), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -0,0 +1,31 @@
+from fastapi import APIRouter
+from services.metrics import metrics
+from generation.response_cache import response_cache
+from services.html_fragment_cache import fragment_cache
+from database import pool_status
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("")
+async def get_metrics():
+    """Получить метрики производительности сервера"""
+    return metrics.snapshot()
+
+
+@router.get("/llm-cache")
+async def get_llm_cache_stats():
+    """Получить состояние кеша ответов LLM"""
+    return response_cache.stats()
+
+
+@router.get("/html-cache")
+async def get_html_cache_stats():
+    """Получить состояние кеша HTML-фрагментов параграфов (счетчики суммарно по процессам docx_pool)"""
+    return fragment_cache.stats()
+
+
+@router.get("/db-pool")
+async def get_db_pool_stats():
+    """Получить состояние пула соединений с БД (время ожидания - в /metrics, db.pool.*)"""
+    return pool_status()
@@ -1,24 +1,38 @@
-from typing import List, Optional
+from typing import List, Optional, Union
 
 from sqlalchemy import select
-from database import SessionLocal, get_db
-from fastapi import APIRouter, BackgroundTasks, Depends,HTTPException, status, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from database import get_db, SessionLocal
+from fastapi import APIRouter, Depends,HTTPException, status, UploadFile, File, HTTPException, Header, Query, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy.orm import Session, undefer
 from sqlalchemy.ext.asyncio import AsyncSession
-from models.models import FormattingPreset, Template, Report, User
+from models.models import FormattingPreset, Template, Report
 from document_generation.document_service import DocumentService
 from pathlib import Path
+from datetime import datetime
 from pydantic import BaseModel
 import json
 
 from routes.user import get_current_user
+from services.auth_cache import Principal
+from services.pagination import paginate
 from services.report_chat_service import ReportChatService
+from services.docx_version_store import docx_versions
+from services.job_queue import job_queue
+from services.progress_service import progress_service, serialize_event, TERMINAL_EVENTS
+from services.streaming import sse_event, SSE_HEADERS, SSE_KEEPALIVE
+import os
+
+# Как часто поток прогресса проверяет новые события других процессов, секунды
+PROGRESS_POLL_INTERVAL = float(os.getenv("REPORT_PROGRESS_POLL_INTERVAL", "1.0"))
 
 class SectionSchema(BaseModel):
     title: str
     prompt: str
     heading_level: int = 1
+    # None/"all" - зависит от всех предыдущих разделов, "previous" - от предыдущего,
+    # "none" - независимый раздел, список - индексы или заголовки разделов
+    depends_on: Optional[Union[str, List[Union[int, str]]]] = None
 
 class ReportCreate(BaseModel):
     title: str
@@ -26,6 +40,7 @@ class ReportCreate(BaseModel):
     format: str
     sections: List[SectionSchema]
     formatting_preset_id: Optional[int] = None
+    priority: int = 0  # задания с большим приоритетом берутся из очереди раньше
 
 router = APIRouter()
 document_service = DocumentService()
@@ -40,46 +55,15 @@ async def upload_data(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=400, detail="Ошибка при обработке файла")
 
-# Функция для фоновой генерации отчета
-async def generate_report_background(report_id: int, report_data: ReportCreate, db: AsyncSession):
-    try:
-        # Получаем пресет форматирования, если он указан
-        formatting_preset = None
-        if report_data.formatting_preset_id:
-            formatting_preset = await db.get(FormattingPreset, report_data.formatting_preset_id)
-        
-        # Генерируем документ вне транзакции
-        document_service = DocumentService()
-        file_path = document_service.generate_report(
-            title=report_data.title,
-            sections=report_data.dict()["sections"],
-            format=report_data.format,
-            formatting_styles=formatting_preset.styles if formatting_preset else None
-        )
-
-        # Обновляем статус в БД
-        report = await db.get(Report, report_id)
-        if report:
-            report.status = "completed"
-            report.file_path = file_path
-            await db.commit()
-
-    except Exception as e:
-        report = await db.get(Report, report_id)
-        if report:
-            report.status = "error"
-            await db.commit()
-        print(f"Error generating report: {str(e)}")  
-        raise e
 # Генерация отчета
 @router.post("/generate-report/")
 async def generate_report(
     report_data: ReportCreate,
-    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     try:
+        # Отчет и задание фиксируются одной транзакцией: отчет без задания навсегда остался бы pending
         async with db.begin():
             report = Report(
                 user_id=current_user.id,
@@ -94,21 +78,18 @@ async def generate_report(
             db.add(report)
             await db.flush()  
             report_id = report.id
-            await db.commit()
 
-        async_session = SessionLocal()
-        
-        background_tasks.add_task(
-            generate_report_background,
-            report_id,
-            report_data,
-            async_session
-        )
+            # Генерацию выполняют воркеры очереди (worker.py)
+            job = await job_queue.enqueue(
+                db, report_id, current_user.id, report_data.dict(), priority=report_data.priority,
+                commit=False,
+            )
 
         return {
             "id": report_id,
+            "job_id": job.id,
             "status": "pending",
-            "message": "Report generation started"
+            "message": "Report generation queued"
         }
 
     except Exception as e:
@@ -119,9 +100,10 @@ async def generate_report(
 async def get_report(
     report_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
-    report = await db.get(Report, report_id)
+    # Из тяжелых колонок нужны только разделы; HTML и история не загружаются
+    report = await db.get(Report, report_id, options=[undefer(Report.sections)])
     if not report or report.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Report not found")
     
@@ -136,14 +118,144 @@ async def get_report(
         "sections": report.sections
     }
 
+@router.get("/reports/{report_id}/job")
+async def get_report_job(
+    report_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Состояние задания на генерацию отчета"""
+    job = await job_queue.get_report_job(db, report_id)
+    if not job or job.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return {
+        "job_id": job.id,
+        "report_id": job.report_id,
+        "status": job.status,
+        "progress": job.progress,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "queue_position": await job_queue.queue_position(db, job),
+        "last_error": job.last_error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at
+    }
+
+async def _get_report_status(db: AsyncSession, report_id: int, user_id: int):
+    """Только статус отчета, без загрузки тяжелых колонок"""
+    stmt = select(Report.status).where(Report.id == report_id, Report.user_id == user_id)
+    return (await db.execute(stmt)).scalar_one_or_none()
+
+@router.get("/reports/{report_id}/progress")
+async def get_report_progress(
+    report_id: int,
+    after_id: int = 0,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """События хода генерации отчета после after_id (для опроса)"""
+    report_status = await _get_report_status(db, report_id, current_user.id)
+    if report_status is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+
+    events = await progress_service.list_events(db, report_id, after_id)
+    progress = next((e.progress for e in reversed(events) if e.progress is not None), None)
+
+    return {
+        "report_id": report_id,
+        "status": report_status,
+        "progress": progress,
+        "events": [serialize_event(e) for e in events],
+        "last_event_id": events[-1].id if events else after_id
+    }
+
+@router.get("/reports/{report_id}/progress/stream")
+async def stream_report_progress(
+    report_id: int,
+    after_id: int = 0,
+    last_event_id: Optional[int] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    Поток событий хода генерации отчета (Server-Sent Events).
+
+    Поток закрывается после report_finished/report_failed. При переподключении
+    браузер передает Last-Event-ID, и пропущенные события отправляются заново.
+    """
+    if await _get_report_status(db, report_id, current_user.id) is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    user_id = current_user.id
+    cursor = last_event_id or after_id
+
+    async def event_stream():
+        nonlocal cursor
+        while True:
+            async with SessionLocal() as session:
+                events = await progress_service.list_events(session, report_id, cursor)
+                report_status = None if events else await _get_report_status(session, report_id, user_id)
+
+            for event in events:
+                cursor = event.id
+                yield sse_event(event.event, serialize_event(event), event_id=event.id)
+                if event.event in TERMINAL_EVENTS:
+                    return
+
+            # Отчет удален или уже сгенерирован без событий (например, вместе с чатом)
+            if not events and report_status in (None, "completed", "error"):
+                yield sse_event("status", {"status": report_status})
+                return
+
+            if not events:
+                yield SSE_KEEPALIVE
+            await progress_service.wait(report_id, PROGRESS_POLL_INTERVAL)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
 @router.get("/reports/")
 async def get_reports(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, description="Размер страницы"),
+    cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor"),
+    status_filter: Optional[str] = Query(None, alias="status", description="Статус отчета"),
+    created_from: Optional[datetime] = Query(None, description="Создан не раньше"),
+    created_to: Optional[datetime] = Query(None, description="Создан раньше"),
+    title_prefix: Optional[str] = Query(None, description="Начало названия отчета"),
+    sort: str = Query("created_at", pattern="^(created_at|title)$"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
-    stmt = select(Report).where(Report.user_id == current_user.id)
-    result = await db.execute(stmt)
-    reports = result.scalars().all()
+    """
+    Страница отчетов пользователя с фильтрами и сортировкой.
+    Если есть следующая страница, ее курсор передается в заголовке X-Next-Cursor.
+    """
+    # Только метаданные: содержимое отчетов в списке не нужно
+    stmt = select(
+        Report.id, Report.title, Report.template_id, Report.format,
+        Report.status, Report.file_path, Report.created_at,
+    ).where(Report.user_id == current_user.id)
+    if status_filter:
+        stmt = stmt.where(Report.status == status_filter)
+    if created_from:
+        stmt = stmt.where(Report.created_at >= created_from)
+    if created_to:
+        stmt = stmt.where(Report.created_at < created_to)
+    if title_prefix:
+        stmt = stmt.where(Report.title.startswith(title_prefix, autoescape=True))
+
+    # title NOT NULL (миграция 0005), поэтому порядок и курсор обслуживает ix_reports_user_title
+    sort_column = Report.title if sort == "title" else Report.created_at
+    try:
+        reports, next_cursor = await paginate(
+            db, stmt, sort_column, Report.id, limit, cursor, descending=order == "desc"
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     
     return [
         {
@@ -162,20 +274,20 @@ async def get_reports(
 async def download_report(
     filename: str,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     # Проверяем права на скачивание
-    stmt = select(Report).where(
+    stmt = select(Report.file_path).where(
         Report.file_path.endswith(filename),
         Report.user_id == current_user.id
     )
     result = await db.execute(stmt)
-    report = result.scalar_one_or_none()
+    report_path = result.scalar_one_or_none()
     
-    if not report:
+    if not report_path:
         raise HTTPException(status_code=404, detail="Report not found")
     
-    file_path = Path(report.file_path)
+    file_path = Path(report_path)
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="File not found")
     
@@ -190,7 +302,7 @@ async def download_report(
 async def delete_report(
     report_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Удаление отчета"""
     try:
@@ -217,6 +329,8 @@ async def delete_report(
         # Удаляем запись из БД
         await db.delete(report)
         await db.commit()
+        # И хранилище версий DOCX
+        docx_versions.remove_report(report_id)
 
         return None
 
@@ -233,21 +347,22 @@ async def delete_report(
 async def generate_report_with_chat(
     report_data: ReportCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
-    """Генерирует отчет и создает связанный с ним чат"""
+    """Создает отчет со связанным чатом и ставит его генерацию в очередь"""
     try:
         # Используем интеграционный сервис
         report_chat_service = ReportChatService()
-        report, chat = await report_chat_service.create_report_with_chat(
+        report, chat, job = await report_chat_service.create_report_with_chat(
             db, current_user.id, report_data.dict()
         )
         
         return {
             "report_id": report.id,
             "chat_id": chat.id,
-            "status": "completed",
-            "message": "Report generated successfully with chat"
+            "job_id": job.id,
+            "status": "pending",
+            "message": "Report generation queued"
         }
     except Exception as e:
         raise HTTPException(
@@ -1,10 +1,19 @@
 from fastapi import APIRouter, HTTPException, Depends, Body, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer, undefer_group
 from typing import Dict, Any, List, Optional
-from models.models import User, Report
+from models.models import Report
 from routes.user import get_current_user
-from database import get_db
+from services.auth_cache import Principal
+from database import get_db, load_deferred
 from services.report_chat_service import ReportChatService
+from services.docx_html_converter import HTML_STREAM_CHUNK_SIZE
+from services.docx_pool import docx_pool
+from services.document_editor_service import write_docx_html
+from services.html_index import HtmlParagraphIndex, html_index_cache
+from services.version_store import version_store
+from services.docx_version_store import docx_versions
 from pydantic import BaseModel
 from datetime import datetime
 import json
@@ -13,6 +22,14 @@ import os
 router = APIRouter(prefix="/report-editor", tags=["report-editor"])
 report_chat_service = ReportChatService()
 
+# Максимум параграфов в одном окне HTML
+HTML_WINDOW_MAX_PARAGRAPHS = int(os.getenv("HTML_WINDOW_MAX_PARAGRAPHS", "500"))
+
+# Опции загрузки отчета: HTML нужен для отдачи текущей версии,
+# устаревшая история - для ее переноса в report_versions
+WITH_HTML = [undefer(Report.html_content)]
+WITH_HISTORY = [undefer_group("history")]
+
 class EditCommand(BaseModel):
     command: str
     # различные поля в зависимости от типа команды
@@ -33,7 +50,7 @@ class CreateVersionRequest(BaseModel):
 async def generate_report_with_chat(
     report_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Создает чат для существующего отчета"""
     # Проверяем доступ к отчету
@@ -57,7 +74,7 @@ async def edit_report(
     report_id: int,
     edit_command: EditCommand = Body(...),
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Применяет команду редактирования к отчету"""
     # Проверяем доступ к отчету
@@ -99,7 +116,7 @@ async def process_chat_edit_command(
     chat_id: int,
     command: Dict[str, Any] = Body(...),
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Обрабатывает команду редактирования через чат"""
     # Проверка доступа
@@ -120,98 +137,204 @@ async def process_chat_edit_command(
     
     return result
 
+async def _resolve_html_source(report: Report, version: Optional[int], db: AsyncSession):
+    """
+    Откуда брать HTML запрошенной версии отчета.
+    Возвращает (html_content или None, путь к DOCX, номер версии, это текущая версия).
+    """
+    if version is None or version == report.document_version:
+        await load_deferred(db, report, "html_content")
+        return report.html_content, report.file_path, report.document_version, True
+
+    if version < 1 or version > report.document_version:
+        raise HTTPException(status_code=400, detail="Неверный номер версии")
+
+    # Ищем в истории версий
+    if await version_store.ensure_current_version(
+        db, report, f"Начальная версия {report.document_version}", "Изначальная версия документа"
+    ):
+        await db.commit()
+    version_data = await version_store.get_version(db, report.id, version)
+    if version_data:
+        if version_data.html_hash:
+            html_content = await version_store.get_html(db, version_data.html_hash)
+            return html_content, version_data.file_path, version, False
+        file_path = await docx_versions.get_path(report.id, version, version_data.file_path)
+        if file_path:
+            # Если HTML нет, но есть файл - будем конвертировать
+            return None, file_path, version, False
+
+    raise HTTPException(status_code=404, detail=f"Версия {version} не найдена")
+
+async def _load_report_html(report: Report, version: Optional[int], db: AsyncSession):
+    """HTML версии отчета; если его нет - конвертирует DOCX (для текущей версии сохраняет результат)"""
+    html_content, file_path, version, is_current = await _resolve_html_source(report, version, db)
+    if html_content:
+        return html_content, version
+    
+    # Иначе - конвертируем документ
+    try:
+        html_content = await report_chat_service.editor_service.docx_to_html(file_path)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка конвертации документа: {str(e)}")
+    
+    if is_current:
+        # Сохраняем HTML в БД для будущего использования
+        report.html_content = html_content
+        await db.commit()
+    
+    return html_content, version
+
+async def _load_html_index(report: Report, version: Optional[int], db: AsyncSession):
+    """
+    Индекс параграфов HTML версии отчета и номер версии. Отпечаток версии
+    берется из уже загруженных полей: для текущей - путь к файлу (новая
+    версия, восстановление и перегенерация пишут новый файл), для версии из
+    истории - html_hash. HTML читается из БД только при промахе кеша.
+    """
+    if version is None or version == report.document_version:
+        version, fingerprint = report.document_version, report.file_path
+    else:
+        version_data = await version_store.get_version(db, report.id, version)
+        fingerprint = version_data and (version_data.html_hash or version_data.file_path)
+
+    if fingerprint:
+        index = html_index_cache.get(report.id, version, fingerprint)
+        if index is not None:
+            return index, version
+
+    html_content, version = await _load_report_html(report, version, db)
+    if not fingerprint:
+        return HtmlParagraphIndex(html_content), version
+    return html_index_cache.build(report.id, version, fingerprint, html_content), version
+
 @router.get("/reports/{report_id}/html")
 async def get_report_html(
     report_id: int,
     version: Optional[int] = Query(None, description="Версия документа для загрузки"),
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Возвращает HTML-представление отчета для отображения в браузере"""
     # Проверяем доступ к отчету
-    report = await db.get(Report, report_id)
+    report = await db.get(Report, report_id, options=WITH_HTML)
     if not report or report.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Отчет не найден")
     
-    # Если запрашивается конкретная версия
-    if version is not None:
-        if version < 1 or version > report.document_version:
-            raise HTTPException(status_code=400, detail="Неверный номер версии")
-        
-        # Если запрашивается текущая версия
-        if version == report.document_version:
-            if report.html_content:
-                return {"html": report.html_content, "version": version}
-        else:
-            # Ищем в истории версий
-            version_history = report.version_history or []
-            for version_data in version_history:
-                if version_data.get("version") == version:
-                    if version_data.get("html_content"):
-                        return {"html": version_data["html_content"], "version": version}
-                    elif version_data.get("file_path") and os.path.exists(version_data["file_path"]):
-                        # Если HTML нет, но есть файл - конвертируем
-                        html_content = await report_chat_service.editor_service.docx_to_html(version_data["file_path"])
-                        return {"html": html_content, "version": version}
-            
-            raise HTTPException(status_code=404, detail=f"Версия {version} не найдена")
-    
-    # Если HTML-контент уже есть для текущей версии, возвращаем его
-    if report.html_content:
-        return {"html": report.html_content, "version": report.document_version}
-    
-    # Иначе - конвертируем документ
-    try:
-        html_content = await report_chat_service.editor_service.docx_to_html(report.file_path)
-        
-        # Сохраняем HTML в БД для будущего использования
-        report.html_content = html_content
-        await db.commit()
-        
-        return {"html": html_content, "version": report.document_version}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка конвертации документа: {str(e)}")
+    html_content, version = await _load_report_html(report, version, db)
+    return {"html": html_content, "version": version}
+
+@router.get("/reports/{report_id}/html/stream")
+async def stream_report_html(
+    report_id: int,
+    version: Optional[int] = Query(None, description="Версия документа для загрузки"),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    Отдает HTML отчета потоком (text/html). Готовый HTML - частями по
+    HTML_STREAM_CHUNK_SIZE; если его нет, документ конвертируется в процессе
+    docx_pool, и части отдаются по мере конвертации: первой - заголовок с CSS.
+    """
+    report = await db.get(Report, report_id, options=WITH_HTML)
+    if not report or report.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Отчет не найден")
+
+    html_content, file_path, version, _ = await _resolve_html_source(report, version, db)
+    headers = {"X-Document-Version": str(version)}
+
+    if html_content:
+        chunks = (
+            html_content[i:i + HTML_STREAM_CHUNK_SIZE]
+            for i in range(0, len(html_content), HTML_STREAM_CHUNK_SIZE)
+        )
+    else:
+        if not file_path or not os.path.exists(file_path):
+            raise HTTPException(status_code=404, detail="Файл документа не найден")
+        # python-docx держит GIL - конвертация в процессе пула, а не в потоке API
+        chunks = docx_pool.stream(write_docx_html, file_path)
+    return StreamingResponse(chunks, media_type="text/html; charset=utf-8", headers=headers)
+
+@router.get("/reports/{report_id}/html/outline")
+async def get_report_html_outline(
+    report_id: int,
+    version: Optional[int] = Query(None, description="Версия документа"),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    Структура HTML отчета для постраничной загрузки: заголовок документа с CSS,
+    число параграфов и заголовки разделов с номерами параграфов
+    """
+    # HTML не загружаем: при попадании в кеш индекса он не нужен
+    report = await db.get(Report, report_id)
+    if not report or report.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Отчет не найден")
+
+    index, version = await _load_html_index(report, version, db)
+    return {
+        "version": version,
+        "head": index.head,
+        "paragraph_count": len(index),
+        "headings": index.headings,
+    }
+
+@router.get("/reports/{report_id}/html/window")
+async def get_report_html_window(
+    report_id: int,
+    start: int = Query(0, ge=0, description="Позиция первого параграфа"),
+    end: Optional[int] = Query(None, ge=0, description="Позиция после последнего параграфа"),
+    heading: Optional[int] = Query(None, description="Номер параграфа-заголовка: вернуть его раздел"),
+    version: Optional[int] = Query(None, description="Версия документа"),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    Окно параграфов HTML отчета: диапазон [start, end) или раздел по заголовку.
+    Размер окна ограничен HTML_WINDOW_MAX_PARAGRAPHS.
+    """
+    # HTML не загружаем: при попадании в кеш индекса он не нужен
+    report = await db.get(Report, report_id)
+    if not report or report.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Отчет не найден")
+
+    index, version = await _load_html_index(report, version, db)
+
+    if heading is not None:
+        bounds = index.section_bounds(heading)
+        if bounds is None:
+            raise HTTPException(status_code=404, detail=f"Заголовок {heading} не найден")
+        start, end = bounds
+    elif end is None:
+        end = start + HTML_WINDOW_MAX_PARAGRAPHS
+
+    end = min(end, start + HTML_WINDOW_MAX_PARAGRAPHS, len(index))
+    return {
+        "version": version,
+        "start": start,
+        "end": max(start, end),
+        "total": len(index),
+        "paragraphs": index.window(start, end),
+    }
 
 @router.post("/reports/{report_id}/versions")
 async def create_new_version(
     report_id: int,
     request: CreateVersionRequest,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Создает новую версию документа вручную"""
     # Проверяем доступ к отчету
-    report = await db.get(Report, report_id)
+    report = await db.get(Report, report_id, options=WITH_HTML + WITH_HISTORY)
     if not report or report.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Отчет не найден")
     
     try:
-        # Инициализируем version_history, если его нет
-        if report.version_history is None:
-            initial_version = {
-                "version": report.document_version,
-                "timestamp": datetime.utcnow().isoformat(),
-                "description": f"Начальная версия {report.document_version}",
-                "file_path": report.file_path,
-                "html_content": report.html_content,
-                "edit_description": "Изначальная версия документа"
-            }
-            report.version_history = [initial_version]
-        
         # Сохраняем текущую версию в истории (если еще не сохранена)
-        version_history = list(report.version_history)
-        current_version_exists = any(v.get("version") == report.document_version for v in version_history)
-        
-        if not current_version_exists:
-            current_version_data = {
-                "version": report.document_version,
-                "timestamp": datetime.utcnow().isoformat(),
-                "description": f"Версия {report.document_version}",
-                "file_path": report.file_path,
-                "html_content": report.html_content,
-                "edit_description": "Сохранение текущего состояния"
-            }
-            version_history.append(current_version_data)
+        await version_store.ensure_current_version(
+            db, report, f"Версия {report.document_version}", "Сохранение текущего состояния"
+        )
         
         # Увеличиваем номер версии
         new_version = report.document_version + 1
@@ -222,34 +345,33 @@ async def create_new_version(
             base_path = base_path[:-len(f"_v{report.document_version}")]
         new_file_path = f"{base_path}_v{new_version}{ext}"
         
-        # Копируем файл
+        # Копируем файл; в хранилище версий он попадет дельтой
         import shutil
         shutil.copy2(report.file_path, new_file_path)
+        previous_version, previous_path = report.document_version, report.file_path
+        await docx_versions.record(
+            report.id, new_version, new_file_path, previous_version, previous_path
+        )
         
-        # Создаем запись для новой версии
-        new_version_data = {
-            "version": new_version,
-            "timestamp": datetime.utcnow().isoformat(),
-            "description": request.description or f"Версия {new_version}",
-            "file_path": new_file_path,
-            "html_content": report.html_content,  # Копируем текущий HTML
-            "edit_description": "Ручное создание версии"
-        }
-        
-        version_history.append(new_version_data)
+        # Создаем запись для новой версии: HTML тот же, поэтому новый блоб не пишется
+        await version_store.add_version(
+            db, report.id, new_version,
+            request.description or f"Версия {new_version}", "Ручное создание версии",
+            new_file_path, report.html_content,
+        )
         
         # Обновляем отчет
         report.document_version = new_version
         report.file_path = new_file_path
-        report.version_history = version_history
         
         await db.commit()
+        docx_versions.prune_working_copy(report.id, previous_version, previous_path, new_file_path)
         
         return {
             "success": True,
             "message": f"Создана новая версия {new_version}",
             "version": new_version,
-            "total_versions": len(version_history)
+            "total_versions": await version_store.count_versions(db, report.id)
         }
         
     except Exception as e:
@@ -260,39 +382,30 @@ async def create_new_version(
 async def get_version_history(
     report_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Возвращает историю версий документа"""
     # Проверяем доступ к отчету
-    report = await db.get(Report, report_id)
+    report = await db.get(Report, report_id, options=WITH_HISTORY)
     if not report or report.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Отчет не найден")
     
-    # Инициализируем version_history, если его нет
-    if report.version_history is None:
-        initial_version = {
-            "version": report.document_version,
-            "timestamp": datetime.utcnow().isoformat(),
-            "description": f"Начальная версия {report.document_version}",
-            "file_path": report.file_path,
-            "html_content": report.html_content,
-            "edit_description": "Изначальная версия документа"
-        }
-        report.version_history = [initial_version]
+    if await version_store.ensure_current_version(
+        db, report, f"Начальная версия {report.document_version}", "Изначальная версия документа"
+    ):
         await db.commit()
     
-    version_history = report.version_history or []
-    
-    # Убираем HTML контент из ответа для экономии трафика
+    # Только метаданные: HTML версий хранится отдельно и здесь не загружается
     clean_history = []
-    for version in version_history:
+    for version in await version_store.list_versions(db, report.id):
         clean_version = {
-            "version": version.get("version"),
-            "timestamp": version.get("timestamp"),
-            "description": version.get("description"),
-            "edit_description": version.get("edit_description", ""),
-            "has_html": bool(version.get("html_content")),
-            "has_file": bool(version.get("file_path") and os.path.exists(version.get("file_path", "")))
+            "version": version.version,
+            "timestamp": version.created_at.isoformat() if version.created_at else None,
+            "description": version.description,
+            "edit_description": version.edit_description or "",
+            "has_html": version.html_hash is not None,
+            "has_file": docx_versions.has_version(report.id, version.version)
+                        or bool(version.file_path and os.path.exists(version.file_path))
         }
         clean_history.append(clean_version)
     
@@ -305,16 +418,32 @@ async def get_version_history(
         "history": clean_history
     }
 
+@router.get("/reports/{report_id}/versions/storage")
+async def get_version_storage(
+    report_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Сколько места занимают версии отчета: файлы DOCX (снимки и дельты) и HTML"""
+    report = await db.get(Report, report_id)
+    if not report or report.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Отчет не найден")
+
+    return {
+        "docx": docx_versions.storage_stats(report.id),
+        "html": await version_store.storage_stats(db, report.id),
+    }
+
 @router.post("/reports/{report_id}/versions/{version}/restore")
 async def restore_version(
     report_id: int,
     version: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Восстанавливает указанную версию как текущую (создает новую версию на основе старой)"""
     # Проверяем доступ к отчету
-    report = await db.get(Report, report_id)
+    report = await db.get(Report, report_id, options=WITH_HISTORY)
     if not report or report.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Отчет не найден")
     
@@ -325,31 +454,17 @@ async def restore_version(
         return {"success": True, "message": "Это уже текущая версия"}
     
     try:
-        # Ищем версию в истории
-        version_history = report.version_history or []
-        target_version_data = None
-        
-        for version_data in version_history:
-            if version_data.get("version") == version:
-                target_version_data = version_data
-                break
+        # Сохраняем текущую версию в истории перед восстановлением
+        await version_store.ensure_current_version(
+            db, report, f"Резервная копия версии {report.document_version}",
+            "Автосохранение перед восстановлением"
+        )
         
+        # Ищем версию в истории
+        target_version_data = await version_store.get_version(db, report.id, version)
         if not target_version_data:
             raise HTTPException(status_code=404, detail="Версия не найдена в истории")
         
-        # Сохраняем текущую версию в истории перед восстановлением
-        current_version_exists = any(v.get("version") == report.document_version for v in version_history)
-        if not current_version_exists:
-            current_version_data = {
-                "version": report.document_version,
-                "timestamp": datetime.utcnow().isoformat(),
-                "description": f"Резервная копия версии {report.document_version}",
-                "file_path": report.file_path,
-                "html_content": report.html_content,
-                "edit_description": "Автосохранение перед восстановлением"
-            }
-            version_history.append(current_version_data)
-        
         # Создаем новую версию на основе восстановленной
         new_version = report.document_version + 1
         
@@ -359,33 +474,32 @@ async def restore_version(
             base_path = base_path[:-len(f"_v{report.document_version}")]
         new_file_path = f"{base_path}_v{new_version}{ext}"
         
-        # Копируем файл из старой версии
-        old_file_path = target_version_data.get("file_path")
-        if old_file_path and os.path.exists(old_file_path):
+        # Копируем файл из старой версии (при необходимости собираем его из хранилища)
+        old_file_path = await docx_versions.get_path(report.id, version, target_version_data.file_path)
+        if old_file_path:
             import shutil
             shutil.copy2(old_file_path, new_file_path)
         else:
             raise HTTPException(status_code=404, detail="Файл старой версии не найден")
+        previous_version, previous_path = report.document_version, report.file_path
+        await docx_versions.record(
+            report.id, new_version, new_file_path, previous_version, previous_path
+        )
         
-        # Создаем новую версию в истории
-        restored_version_data = {
-            "version": new_version,
-            "timestamp": datetime.utcnow().isoformat(),
-            "description": f"Восстановлена версия {version}",
-            "file_path": new_file_path,
-            "html_content": target_version_data.get("html_content"),
-            "edit_description": f"Восстановление версии {version}"
-        }
-        
-        version_history.append(restored_version_data)
+        # Создаем новую версию в истории; HTML ссылается на тот же блоб
+        await version_store.add_version(
+            db, report.id, new_version,
+            f"Восстановлена версия {version}", f"Восстановление версии {version}",
+            new_file_path, html_key=target_version_data.html_hash,
+        )
         
         # Обновляем отчет
         report.document_version = new_version
         report.file_path = new_file_path
-        report.html_content = target_version_data.get("html_content")
-        report.version_history = version_history
+        report.html_content = await version_store.get_html(db, target_version_data.html_hash)
         
         await db.commit()
+        docx_versions.prune_working_copy(report.id, previous_version, previous_path, new_file_path)
         
         return {
             "success": True,
@@ -402,7 +516,7 @@ async def get_edit_suggestions(
     report_id: int,
     request: SuggestionRequest,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Генерирует предложения по редактированию выделенного текста"""
     # Проверяем доступ к отчету
@@ -424,7 +538,7 @@ async def get_edit_suggestions(
 async def save_document(
     report_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Сохраняет текущее состояние документа и возвращает ссылку на скачивание"""
     # Проверяем доступ к отчету
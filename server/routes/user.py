@@ -5,6 +5,8 @@ from sqlalchemy.sql import text
 from sqlalchemy.future import select
 from database import SessionLocal
 from models.models import User
+from services.auth_cache import Principal, principal_cache
+from services.password_hasher import password_hasher
 from pydantic import BaseModel
 from typing import Optional
 from jose import JWTError, jwt
@@ -48,40 +50,46 @@ async def get_db():
     finally:
         await db.close()
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> User:
+CREDENTIALS_ERROR = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Invalid authentication credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
     """
-    Проверяет токен и возвращает текущего пользователя.
+    Проверяет токен и возвращает текущего пользователя (Principal: id, имя, email).
+    Проверенные токены кешируются (services/auth_cache.py), поэтому обычно
+    запрос обходится без декодирования JWT и обращения к БД.
     """
+    principal = await principal_cache.aget(token)
+    if principal is not None:
+        return principal
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: Optional[int] = payload.get("sub")
         if user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        # result = await db.execute(select(User).where(User.id == user_id))
-        # user = result.scalar()
-        
-        stmt = select(User).where(User.id == int(user_id))
-        result = await db.execute(stmt)
-        user = result.scalar_one_or_none()
+            raise CREDENTIALS_ERROR
+
+        # Только нужные колонки, без ORM-объекта и его связей
+        async with SessionLocal() as db:
+            stmt = select(User.id, User.username, User.email).where(User.id == int(user_id))
+            row = (await db.execute(stmt)).first()
 
-        if user is None:
+        if row is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="User not found",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        return user
+        principal = Principal(row.id, row.username, row.email)
+        await principal_cache.aset(token, principal, payload.get("exp"))
+        return principal
+    except HTTPException:
+        raise
     except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise CREDENTIALS_ERROR
     except Exception as e:
         print(f"Error in get_current_user: {str(e)}")  # Add logging
         raise HTTPException(
@@ -89,6 +97,14 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
             detail="Internal server error",
         )
 
+async def _check_password(db: AsyncSession, user: User, password: str) -> bool:
+    """Проверяет пароль; хеш с устаревшими параметрами заменяется новым"""
+    valid, new_hash = await password_hasher.verify_and_update(password, user.password)
+    if valid and new_hash:
+        user.password = new_hash
+        await db.commit()
+    return valid
+
 @router.post("/token", include_in_schema=False)
 async def get_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """
@@ -98,7 +114,7 @@ async def get_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncS
         result = await db.execute(select(User).where(User.username == form_data.username))
         user = result.scalar()
 
-        if not user or not user.verify_password(form_data.password):
+        if not user or not await _check_password(db, user, form_data.password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect username or password"
@@ -134,7 +150,7 @@ async def register_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
         )
 
     new_user = User(username=user.username, email=user.email)
-    new_user.set_password(user.password)  # Хешируем пароль
+    new_user.password = await password_hasher.hash(user.password)  # Хешируем пароль
 
     db.add(new_user)
     await db.commit()
@@ -155,7 +171,7 @@ async def login_user(user_data: UserLogin, db: AsyncSession = Depends(get_db)):
         result = await db.execute(select(User).where(User.username == user_data.username))
         user = result.scalar()
 
-        if not user or not user.verify_password(user_data.password):
+        if not user or not await _check_password(db, user, user_data.password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Неверное имя пользователя или пароль."
@@ -178,7 +194,7 @@ async def login_user(user_data: UserLogin, db: AsyncSession = Depends(get_db)):
         raise
 
 @router.get("/me", response_model=UserResponse)
-async def get_me(current_user: User = Depends(get_current_user)):
+async def get_me(current_user: Principal = Depends(get_current_user)):
     """
     Возвращает данные текущего пользователя.
     """
@@ -225,7 +241,7 @@ async def get_user(user_id: int, db: AsyncSession = Depends(get_db)):
 async def update_user(
     user_id: int,
     user_data: UserUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -251,10 +267,12 @@ async def update_user(
     if user_data.email:
         user.email = user_data.email
     if user_data.password:
-        user.set_password(user_data.password)
+        user.password = await password_hasher.hash(user_data.password)
 
     await db.commit()
     await db.refresh(user)
+    # Закешированные по токенам данные пользователя устарели
+    principal_cache.invalidate_user(user_id)
 
     return UserResponse(id=user.id, username=user.username, email=user.email)
 
@@ -275,6 +293,7 @@ async def delete_user(user_id: int, db: AsyncSession = Depends(get_db)):
 
     await db.delete(user)
     await db.commit()
+    principal_cache.invalidate_user(user_id)
 
     return None
 
@@ -0,0 +1,216 @@
+"""
+Кеш проверенных токенов доступа.
+
+Ключ - sha256 токена, значение - Principal (id, имя, email), а не ORM-объект
+User со связями. Пока запись жива, get_current_user не декодирует JWT и не
+обращается к БД. Первый уровень - LRU в памяти процесса, второй
+(необязательный) - SQLite-файл, общий для нескольких процессов.
+
+При изменении или удалении пользователя его записи удаляются из обоих уровней;
+в памяти других процессов они могут прожить не дольше AUTH_CACHE_TTL.
+
+Настройки:
+    AUTH_CACHE_ENABLED - включить кеш (по умолчанию 1)
+    AUTH_CACHE_TTL - время жизни записи в секундах (по умолчанию 60)
+    AUTH_CACHE_MAX_ENTRIES - размер LRU в памяти (по умолчанию 10000)
+    AUTH_CACHE_PATH - путь к SQLite-файлу второго уровня (по умолчанию не используется)
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from services.metrics import metrics
+
+AUTH_CACHE_ENABLED = os.getenv("AUTH_CACHE_ENABLED", "1") not in ("0", "false", "False", "")
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+AUTH_CACHE_PATH = os.getenv("AUTH_CACHE_PATH")
+
+
+class Principal:
+    """Аутентифицированный пользователь: только то, что нужно маршрутам"""
+    __slots__ = ("id", "username", "email")
+
+    def __init__(self, id: int, username: str, email: str):
+        self.id = id
+        self.username = username
+        self.email = email
+
+    def to_dict(self):
+        return {"id": self.id, "username": self.username, "email": self.email}
+
+
+def token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class PrincipalCache:
+    """LRU токен -> Principal с TTL, индексом по пользователю и необязательным SQLite"""
+
+    def __init__(self, max_entries=None, ttl=None, path=None, enabled=None):
+        self.max_entries = max_entries or AUTH_CACHE_MAX_ENTRIES
+        self.ttl = AUTH_CACHE_TTL if ttl is None else ttl
+        self.path = path if path is not None else AUTH_CACHE_PATH
+        self.enabled = AUTH_CACHE_ENABLED if enabled is None else enabled
+
+        self._entries = OrderedDict()  # key -> (expires_at, principal)
+        self._by_user = {}  # user_id -> {key}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db = None
+
+    # --- второй уровень (SQLite) ---
+
+    def _get_db(self):
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS auth_principals ("
+                "key TEXT PRIMARY KEY, user_id INTEGER NOT NULL, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS ix_auth_principals_user_id ON auth_principals (user_id)")
+            self._db.commit()
+        return self._db
+
+    def _disk_get(self, key):
+        with self._db_lock:
+            row = self._get_db().execute(
+                "SELECT data, expires_at FROM auth_principals WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return Principal(**json.loads(row[0])), row[1]
+
+    def _disk_set(self, key, principal, expires_at):
+        with self._db_lock:
+            db = self._get_db()
+            db.execute(
+                "INSERT OR REPLACE INTO auth_principals (key, user_id, data, expires_at) VALUES (?, ?, ?, ?)",
+                (key, principal.id, json.dumps(principal.to_dict(), ensure_ascii=False), expires_at),
+            )
+            db.execute("DELETE FROM auth_principals WHERE expires_at < ?", (time.time(),))
+            db.commit()
+
+    # --- первый уровень (память) ---
+
+    def _forget(self, key):
+        """Удаляет запись из памяти; вызывается под self._lock"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._by_user.get(entry[1].id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_user[entry[1].id]
+
+    def _memory_get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                self._forget(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def _memory_set(self, key, principal, expires_at):
+        with self._lock:
+            self._forget(key)
+            self._entries[key] = (expires_at, principal)
+            self._by_user.setdefault(principal.id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._forget(next(iter(self._entries)))
+                metrics.increment("auth_cache.evictions")
+
+    # --- публичный интерфейс ---
+
+    def get(self, token: str) -> Optional[Principal]:
+        if not self.enabled:
+            return None
+        key = token_key(token)
+
+        principal = self._memory_get(key)
+        if principal is not None:
+            metrics.increment("auth_cache.hits")
+            return principal
+
+        if self.path:
+            try:
+                found = self._disk_get(key)
+            except sqlite3.Error as e:
+                print(f"Ошибка чтения кеша авторизации: {str(e)}")
+                found = None
+            if found is not None:
+                principal, expires_at = found
+                self._memory_set(key, principal, expires_at)
+                metrics.increment("auth_cache.hits")
+                metrics.increment("auth_cache.disk_hits")
+                return principal
+
+        metrics.increment("auth_cache.misses")
+        return None
+
+    def set(self, token: str, principal: Principal, token_expires_at: Optional[float] = None):
+        """Сохраняет пользователя для токена; запись не переживает срок действия токена"""
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        key = token_key(token)
+        self._memory_set(key, principal, expires_at)
+        if self.path:
+            try:
+                self._disk_set(key, principal, expires_at)
+            except sqlite3.Error as e:
+                print(f"Ошибка записи кеша авторизации: {str(e)}")
+
+    async def aget(self, token: str) -> Optional[Principal]:
+        """Как get, но обращение к SQLite выполняется вне цикла событий"""
+        if self.path:
+            return await asyncio.to_thread(self.get, token)
+        return self.get(token)
+
+    async def aset(self, token: str, principal: Principal, token_expires_at: Optional[float] = None):
+        if self.path:
+            await asyncio.to_thread(self.set, token, principal, token_expires_at)
+        else:
+            self.set(token, principal, token_expires_at)
+
+    def invalidate_user(self, user_id: int):
+        """Удаляет все записи пользователя (после изменения или удаления)"""
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._forget(key)
+        if self.path:
+            try:
+                with self._db_lock:
+                    db = self._get_db()
+                    db.execute("DELETE FROM auth_principals WHERE user_id = ?", (user_id,))
+                    db.commit()
+            except sqlite3.Error as e:
+                print(f"Ошибка очистки кеша авторизации: {str(e)}")
+        metrics.increment("auth_cache.invalidations")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+        if self.path:
+            with self._db_lock:
+                db = self._get_db()
+                db.execute("DELETE FROM auth_principals")
+                db.commit()
+
+
+principal_cache = PrincipalCache()
@@ -0,0 +1,228 @@
+"""
+Память чата для промпта ответа ИИ.
+
+История упаковывается в бюджет токенов, начиная с последних сообщений;
+слишком длинное сообщение обрезается, а не вытесняет остальные. То, что не
+поместилось или не вошло в окно CHAT_MEMORY_WINDOW, со временем попадает в
+краткое содержание чата (Chat.summary): когда таких сообщений набирается
+CHAT_SUMMARY_MIN_MESSAGES, фоновая задача дописывает их в содержание через LLM
+(партиями по CHAT_SUMMARY_BATCH) и сдвигает Chat.summary_message_id.
+Ответ пользователю обновления содержания не ждет.
+
+Настройки:
+    CHAT_HISTORY_TOKEN_BUDGET - бюджет токенов на содержание и историю (по умолчанию 1500)
+    CHAT_MESSAGE_TOKEN_LIMIT - максимум токенов одного сообщения истории (по умолчанию 400)
+    CHAT_SUMMARY_TOKEN_LIMIT - максимум токенов краткого содержания (по умолчанию 300)
+    CHAT_MEMORY_WINDOW - сколько последних несжатых сообщений читать из БД (по умолчанию 40)
+    CHAT_SUMMARY_MIN_MESSAGES - с какого числа вытесненных сообщений обновлять содержание (по умолчанию 4)
+    CHAT_SUMMARY_BATCH - сколько сообщений сжимать за одно обновление (по умолчанию 40)
+"""
+import asyncio
+import os
+from typing import List, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import SessionLocal
+from generation.context_compactor import estimate_tokens
+from generation.generate_text_langchain import agenerate_text_with_params
+from models.models import Chat, ChatMessage
+from services.metrics import metrics
+
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "1500"))
+CHAT_MESSAGE_TOKEN_LIMIT = int(os.getenv("CHAT_MESSAGE_TOKEN_LIMIT", "400"))
+CHAT_SUMMARY_TOKEN_LIMIT = int(os.getenv("CHAT_SUMMARY_TOKEN_LIMIT", "300"))
+CHAT_MEMORY_WINDOW = int(os.getenv("CHAT_MEMORY_WINDOW", "40"))
+CHAT_SUMMARY_MIN_MESSAGES = int(os.getenv("CHAT_SUMMARY_MIN_MESSAGES", "4"))
+CHAT_SUMMARY_BATCH = int(os.getenv("CHAT_SUMMARY_BATCH", "40"))
+
+
+def _clip(text, token_limit):
+    """Обрезает текст до token_limit токенов по границе слова"""
+    max_chars = token_limit * 4
+    if not text or len(text) <= max_chars:
+        return text or ""
+    cut = text[:max_chars]
+    space = cut.rfind(" ")
+    return (cut[:space] if space > 0 else cut) + "…"
+
+
+def _role_name(role):
+    return "Пользователь" if role == "user" else "Ассистент"
+
+
+class MemoryContext:
+    """Результат упаковки истории: что попало в промпт и что вытеснено"""
+
+    def __init__(self, summary: str, messages: List[ChatMessage], lines: List[str],
+                 dropped: List[ChatMessage], summary_tokens: int, history_tokens: int):
+        self.summary = summary
+        self.messages = messages
+        self.lines = lines
+        self.dropped = dropped
+        self.summary_tokens = summary_tokens
+        self.history_tokens = history_tokens
+
+    def render(self) -> str:
+        """История строками '- Роль: текст' (с кратким содержанием в начале)"""
+        head = f"\n- Краткое содержание более ранней переписки: {self.summary}" if self.summary else ""
+        return head + "".join(self.lines)
+
+
+class ChatMemory:
+    def __init__(self, token_budget=None, message_tokens=None, summary_tokens=None, window=None,
+                 min_messages=None, batch=None, session_factory=None):
+        self.token_budget = token_budget or CHAT_HISTORY_TOKEN_BUDGET
+        self.message_tokens = message_tokens or CHAT_MESSAGE_TOKEN_LIMIT
+        self.summary_tokens = summary_tokens or CHAT_SUMMARY_TOKEN_LIMIT
+        self.window = window or CHAT_MEMORY_WINDOW
+        self.min_messages = min_messages or CHAT_SUMMARY_MIN_MESSAGES
+        self.batch = batch or CHAT_SUMMARY_BATCH
+        self._session_factory = session_factory or SessionLocal
+        self._running = set()  # chat_id с идущим обновлением содержания
+        self._tasks = set()
+
+    async def load(self, db: AsyncSession, chat: Chat) -> List[ChatMessage]:
+        """Последние сообщения чата, еще не вошедшие в краткое содержание, в порядке добавления"""
+        query = (
+            select(ChatMessage)
+            .where(ChatMessage.chat_id == chat.id, ChatMessage.id > (chat.summary_message_id or 0))
+            .order_by(ChatMessage.id.desc())
+            .limit(self.window)
+        )
+        result = await db.execute(query)
+        return list(reversed(result.scalars().all()))
+
+    def pack(self, summary: Optional[str], messages: List[ChatMessage]) -> MemoryContext:
+        """
+        Упаковывает содержание и сообщения в бюджет токенов. Бюджет
+        расходуется с последнего сообщения; первое не поместившееся и все
+        более ранние считаются вытесненными.
+        """
+        summary = _clip(summary, self.summary_tokens) if summary else ""
+        summary_tokens = estimate_tokens(summary)
+        used = summary_tokens
+        lines = []
+        index = len(messages)
+        while index > 0:
+            msg = messages[index - 1]
+            line = f"\n- {_role_name(msg.role)}: {_clip(msg.content, self.message_tokens)}"
+            cost = estimate_tokens(line)
+            if used + cost > self.token_budget:
+                break
+            lines.append(line)
+            used += cost
+            index -= 1
+        lines.reverse()
+        return MemoryContext(summary, messages[index:], lines, messages[:index], summary_tokens, used - summary_tokens)
+
+    async def maybe_refresh(self, db: AsyncSession, chat: Chat, loaded: List[ChatMessage], context: MemoryContext):
+        """
+        Запускает фоновое обновление содержания, если не сжато достаточно
+        сообщений: вытесненных из бюджета и, когда окно load заполнено целиком,
+        более ранних, которые в окно не попали и иначе пропали бы из памяти.
+        """
+        pending = len(context.dropped)
+        if loaded and len(loaded) >= self.window:
+            pending += (await db.execute(
+                select(func.count(ChatMessage.id)).where(
+                    ChatMessage.chat_id == chat.id,
+                    ChatMessage.id > (chat.summary_message_id or 0),
+                    ChatMessage.id < loaded[0].id,
+                )
+            )).scalar()
+        if pending >= self.min_messages:
+            upto_id = context.dropped[-1].id if context.dropped else loaded[0].id - 1
+            self.schedule_refresh(chat.id, upto_id)
+
+    def schedule_refresh(self, chat_id: int, upto_id: int):
+        if chat_id in self._running:
+            return
+        self._running.add(chat_id)
+        task = asyncio.create_task(self._refresh_task(chat_id, upto_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh_task(self, chat_id, upto_id):
+        try:
+            # За один вызов сжимается не больше batch сообщений - продолжаем, пока есть что сжимать
+            while await self.refresh_summary(chat_id, upto_id):
+                pass
+        except Exception as e:
+            metrics.increment("chat_memory.summary_errors")
+            print(f"Ошибка обновления краткого содержания чата {chat_id}: {str(e)}")
+        finally:
+            self._running.discard(chat_id)
+
+    async def refresh_summary(self, chat_id: int, upto_id: int) -> bool:
+        """
+        Дописывает в краткое содержание сообщения после summary_message_id
+        (не более batch и не дальше upto_id). Возвращает True, если содержание
+        обновлено; False - если чат удален или его уже обновил другой процесс.
+        """
+        async with self._session_factory() as db:
+            row = (await db.execute(
+                select(Chat.summary, Chat.summary_message_id).where(Chat.id == chat_id)
+            )).first()
+            if row is None:
+                return False
+            previous_id = row.summary_message_id or 0
+            messages = (await db.execute(
+                select(ChatMessage.id, ChatMessage.role, ChatMessage.content)
+                .where(ChatMessage.chat_id == chat_id, ChatMessage.id > previous_id, ChatMessage.id <= upto_id)
+                .order_by(ChatMessage.id)
+                .limit(self.batch)
+            )).all()
+            if not messages:
+                return False
+
+            transcript = "".join(
+                f"\n- {_role_name(msg.role)}: {_clip(msg.content, self.message_tokens)}" for msg in messages
+            )
+            prompt = f"""Составь краткое содержание переписки пользователя с ассистентом системы отчетности.
+    Сохрани факты, решения, названия отчетов и документов, нерешенные вопросы. Не более {self.summary_tokens * 3} символов, без вступлений.
+
+    Предыдущее краткое содержание: {row.summary or "нет"}
+
+    Новые сообщения:{transcript}
+    """
+            summary = await agenerate_text_with_params(
+                prompt=prompt, temperature=0.3, max_tokens=self.summary_tokens * 2
+            )
+            summary = _clip(summary.strip(), self.summary_tokens)
+
+            # Условие на summary_message_id защищает от одновременного обновления
+            # из другого процесса; updated_at не меняем, чтобы чат не поднимался в списке
+            result = await db.execute(
+                update(Chat)
+                .where(Chat.id == chat_id, func.coalesce(Chat.summary_message_id, 0) == previous_id)
+                .values(summary=summary, summary_message_id=messages[-1].id, updated_at=Chat.updated_at)
+            )
+            await db.commit()
+
+        if result.rowcount != 1:
+            return False
+        metrics.increment("chat_memory.summaries")
+        metrics.increment("chat_memory.summarized_messages", len(messages))
+        return True
+
+    def record_usage(self, chat_id: int, context: MemoryContext, prompt: str):
+        """Публикует расход токенов промпта ответа в общие метрики"""
+        prompt_tokens = estimate_tokens(prompt)
+        metrics.increment("chat.replies")
+        metrics.increment("chat.prompt_tokens", prompt_tokens)
+        metrics.observe("chat.prompt_tokens_per_reply", prompt_tokens)
+        metrics.observe("chat.history_tokens_per_reply", context.history_tokens)
+        metrics.observe("chat.summary_tokens_per_reply", context.summary_tokens)
+        print(f"Промпт ответа в чате {chat_id}: {prompt_tokens} токенов (история {context.history_tokens}, "
+              f"содержание {context.summary_tokens}, вытеснено сообщений {len(context.dropped)})")
+
+    async def shutdown(self):
+        """Отменяет незавершенные обновления (вытесненные сообщения сожмутся при следующем ответе)"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+chat_memory = ChatMemory()
@@ -1,10 +1,13 @@
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from sqlalchemy.orm import selectinload
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from models.models import Chat, ChatDocument, Document, ChatMessage, User, Report
-from generation.generate_text_langchain import generate_text_with_params
+from services.chat_memory import chat_memory
+from services.intent_router import GREETING_ANSWER, intent_router
+from services.metrics import metrics
+from services.pagination import paginate
+from generation.generate_text_langchain import agenerate_text_with_params, astream_text_with_params
 
 
 class ChatService:
@@ -28,20 +31,72 @@ class ChatService:
         
         return chat, [user_message, ai_message]
     
-    async def get_user_chats(self, db: AsyncSession, user_id: int) -> List[Chat]:
-        """Возвращает все чаты пользователя"""
-        query = select(Chat).where(Chat.user_id == user_id).order_by(Chat.updated_at.desc())
-        result = await db.execute(query)
-        return result.scalars().all()
+    async def get_user_chats(
+        self, db: AsyncSession, user_id: int, limit: Optional[int] = None, cursor: Optional[str] = None,
+        title_prefix: Optional[str] = None, updated_from: Optional[datetime] = None,
+        updated_to: Optional[datetime] = None
+    ) -> Tuple[List[Chat], Optional[str]]:
+        """
+        Страница чатов пользователя, последние обновленные первыми.
+        Возвращает (чаты, курсор следующей страницы или None)
+        """
+        query = select(Chat).where(Chat.user_id == user_id)
+        if title_prefix:
+            query = query.where(Chat.title.startswith(title_prefix, autoescape=True))
+        if updated_from:
+            query = query.where(Chat.updated_at >= updated_from)
+        if updated_to:
+            query = query.where(Chat.updated_at < updated_to)
+        return await paginate(db, query, Chat.updated_at, Chat.id, limit, cursor)
     
     async def get_chat(self, db: AsyncSession, chat_id: int, user_id: int) -> Optional[Chat]:
-        """Возвращает чат с сообщениями по ID"""
+        """
+        Возвращает чат по ID без сообщений: история загружается частями
+        через get_recent_messages / get_messages_page
+        """
         query = select(Chat).where(
             Chat.id == chat_id, 
             Chat.user_id == user_id
-        ).options(selectinload(Chat.messages))
+        )
         result = await db.execute(query)
         return result.scalars().first()
+
+    async def get_recent_messages(self, db: AsyncSession, chat_id: int, limit: int) -> List[ChatMessage]:
+        """Последние limit сообщений чата в порядке добавления (по индексу (chat_id, id))"""
+        query = (
+            select(ChatMessage)
+            .where(ChatMessage.chat_id == chat_id)
+            .order_by(ChatMessage.id.desc())
+            .limit(limit)
+        )
+        result = await db.execute(query)
+        return list(reversed(result.scalars().all()))
+
+    async def get_messages_page(
+        self, db: AsyncSession, chat_id: int, limit: Optional[int] = None, cursor: Optional[str] = None
+    ) -> Tuple[List[ChatMessage], Optional[str]]:
+        """
+        Страница истории чата: без курсора - последние limit сообщений
+        (по умолчанию LIST_PAGE_SIZE), с курсором - предшествующие им.
+        Сообщения идут в порядке добавления;
+        возвращает (сообщения, курсор более ранней страницы или None)
+        """
+        query = select(ChatMessage).where(ChatMessage.chat_id == chat_id)
+        messages, next_cursor = await paginate(db, query, ChatMessage.id, ChatMessage.id, limit, cursor)
+        return list(reversed(messages)), next_cursor
+
+    async def has_messages(self, db: AsyncSession, chat_id: int) -> bool:
+        query = select(ChatMessage.id).where(ChatMessage.chat_id == chat_id).limit(1)
+        return (await db.execute(query)).first() is not None
+
+    async def _last_user_message(self, db: AsyncSession, chat_id: int) -> Optional[str]:
+        query = (
+            select(ChatMessage.content)
+            .where(ChatMessage.chat_id == chat_id, ChatMessage.role == "user")
+            .order_by(ChatMessage.id.desc())
+            .limit(1)
+        )
+        return (await db.execute(query)).scalar()
     
     async def add_message(self, db: AsyncSession, chat_id: int, content: str, role: str = "user") -> ChatMessage:
         """Добавляет новое сообщение в чат"""
@@ -57,87 +112,55 @@ class ChatService:
         await db.refresh(message)
         return message
     
-    async def generate_ai_response(self, db: AsyncSession, chat_id: int, user_id: int, current_message: str = None) -> ChatMessage:
-        """Генерирует ответ ИИ на основе истории чата"""
-        # Получаем историю чата
+    def _routed_answer(self, message: str) -> Optional[str]:
+        """Готовый ответ маршрутизатора намерений или None, если нужен LLM"""
+        intent = intent_router.route(message)
+        if intent is None:
+            return None
+        metrics.increment("chat.llm_calls_avoided")
+        return intent.answer
+
+    async def _prepare_ai_reply(self, db: AsyncSession, chat_id: int, user_id: int, current_message: str = None):
+        """
+        Готовит ответ ИИ: возвращает (готовый ответ, None) для стандартных ситуаций
+        или (None, промпт) если ответ нужно сгенерировать. None - если чат не найден.
+        """
         chat = await self.get_chat(db, chat_id, user_id)
         if not chat:
             return None
+
+        # Приветствия, FAQ и навигационные вопросы отвечаются без LLM и без чтения истории
+        if current_message:
+            answer = self._routed_answer(current_message)
+            if answer is not None:
+                return answer, None
+
+        # Получаем историю чата: последние сообщения, еще не вошедшие в краткое содержание
+        recent_messages = await chat_memory.load(db, chat)
         
-        if not chat.messages:
-            # ВАЖНО: Если это первое сообщение, используем current_message если оно передано
-            if current_message:
-                # Для первого сообщения используем общие ответы или генерируем ответ
-                last_message_lower = current_message.lower().strip()
-                
-                # Проверяем стандартные приветствия
-                if last_message_lower == "привет" or last_message_lower == "здравствуйте":
-                    return await self.add_message(
-                        db, 
-                        chat_id, 
-                        "Привет! Я ассистент для системы отчетности. Чем могу помочь?", 
-                        role="assistant"
-                    )
-                # Если это не приветствие, то продолжаем обработку как обычного сообщения
-                last_user_message = current_message
-            else:
-                # Если нет сообщений и нет текущего сообщения, отправляем стандартное приветствие
-                return await self.add_message(
-                    db, 
-                    chat_id, 
-                    "Привет! Я ассистент для системы отчетности. Чем могу помочь?", 
-                    role="assistant"
-                )
+        if not recent_messages and not current_message:
+            # Если нет сообщений и нет текущего сообщения, отправляем стандартное приветствие
+            return GREETING_ANSWER, None
         
-        sorted_messages = sorted(chat.messages, key=lambda x: x.id)
-
         # Определяем последнее сообщение от пользователя - ВАЖНО: сразу берем последнее, а не ищем в истории
         # Поскольку сообщение пользователя уже добавлено в базу данных, оно должно быть последним сообщением user
         if current_message:
             last_user_message = current_message
         else:
             last_user_message = None
-            for msg in reversed(sorted_messages):  # Идем от последнего к первому
+            for msg in reversed(recent_messages):  # Идем от последнего к первому
                 if msg.role == "user":
                     last_user_message = msg.content
                     break
+            if last_user_message is None:
+                # Среди последних сообщений нет пользовательских - ищем раньше
+                last_user_message = await self._last_user_message(db, chat_id)
         
-        if not last_user_message:
-            return await self.add_message(
-                db, 
-                chat_id,
-                "Пожалуйста, задайте вопрос или опишите, с чем вам нужна помощь.", 
-                role="assistant"
-            ) 
-        # Формируем контекст чата более структурировано
-        formatted_messages = []
-        for msg in sorted(chat.messages, key=lambda x: x.id)[-8:]:  # Сортируем по ID и берем последние 8
-            role = "user" if msg.role == "user" else "assistant"
-            formatted_messages.append({"role": role, "content": msg.content})
-        
-        # Создаем словарь с ответами на общие вопросы для большей надежности
-        common_answers = {
-            "привет": "Здравствуйте! Я ассистент для системы отчетности. Чем могу помочь?",
-            "что это за сайт": "Это система автоматической отчетности, которая позволяет создавать, редактировать и анализировать отчеты. Здесь вы можете работать с документами, использовать ИИ для анализа данных и автоматизации отчетности.",
-            "что умеешь": """Я могу помогать вам с различными задачами в системе отчетности:
-    1. Отвечать на вопросы о работе системы
-    2. Помогать в создании и редактировании отчетов
-    3. Предоставлять аналитические данные
-    4. Объяснять функционал различных компонентов
-    5. Предлагать оптимальные решения для ваших отчетов
-    6. Помогать с форматированием документов
-    7. Анализировать загруженные данные
-    8. Создавать шаблоны отчетов
-
-    Просто скажите, с чем конкретно вам нужна помощь."""
-        }
-        
-        # Проверяем, соответствует ли сообщение пользователя одному из часто задаваемых вопросов
-        last_message_lower = last_user_message.lower().strip()
-        
-        for key, answer in common_answers.items():
-            if last_message_lower == key or (len(last_message_lower) < 20 and key in last_message_lower):
-                return await self.add_message(db, chat_id, answer, role="assistant")
+            if not last_user_message:
+                return "Пожалуйста, задайте вопрос или опишите, с чем вам нужна помощь.", None 
+            answer = self._routed_answer(last_user_message)
+            if answer is not None:
+                return answer, None
         
         # Если нет прямого соответствия, используем генерацию текста с четкими инструкциями
         system_prompt = """Ты - полезный ассистент для системы автоматической отчетности. 
@@ -147,13 +170,11 @@ class ChatService:
     Не используй шаблонные фразы и общие ответы - будь конкретным и полезным.
     Система отчетности позволяет создавать отчеты, анализировать документы, форматировать тексты, работать с шаблонами и использовать ИИ для автоматизации работы с документами."""
         
-        # Формируем историю чата для контекста, но с акцентом на последнее сообщение
-        chat_history = ""
-        # Берем только предыдущие сообщения для контекста
-        previous_msgs = formatted_messages[:-1] if len(formatted_messages) > 1 else []
-        for msg in previous_msgs:
-            role_name = "Пользователь" if msg["role"] == "user" else "Ассистент"
-            chat_history += f"\n- {role_name}: {msg['content']}"
+        # Формируем историю чата для контекста, но с акцентом на последнее сообщение:
+        # предыдущие сообщения и краткое содержание в пределах бюджета токенов
+        memory = chat_memory.pack(chat.summary, recent_messages[:-1])
+        await chat_memory.maybe_refresh(db, chat, recent_messages, memory)
+        chat_history = memory.render()
         
         # Создаем промпт с четкими инструкциями и выделением последнего сообщения
         prompt = f"""
@@ -165,12 +186,26 @@ class ChatService:
 
     Дай четкий, конкретный и полезный ответ именно на это последнее сообщение пользователя без лишних приветствий.
     """
-        
+        chat_memory.record_usage(chat_id, memory, prompt)
+
+        return None, prompt
+
+    async def generate_ai_response(self, db: AsyncSession, chat_id: int, user_id: int, current_message: str = None) -> ChatMessage:
+        """Генерирует ответ ИИ на основе истории чата"""
+        reply = await self._prepare_ai_reply(db, chat_id, user_id, current_message)
+        if reply is None:
+            return None
+        answer, prompt = reply
+        if answer is not None:
+            return await self.add_message(db, chat_id, answer, role="assistant")
+
         # Генерируем ответ с низкой температурой для детерминированности
-        ai_response = generate_text_with_params(
+        # Ответ семплируется (temperature 0.7) - кеш вернул бы одинаковый ответ на повторный вопрос
+        ai_response = await agenerate_text_with_params(
             prompt=prompt,
             temperature=0.7,  # Снижаем температуру еще больше для предсказуемости
-            max_tokens=2000
+            max_tokens=2000,
+            use_cache=False,
         )
         
         # Удаляем лишние приветствия из начала ответа
@@ -191,6 +226,31 @@ class ChatService:
         return await self.add_message(db, chat_id, ai_response, role="assistant")
 
 
+    async def stream_ai_response(self, db: AsyncSession, chat_id: int, user_id: int, current_message: str = None):
+        """
+        Потоковая версия generate_ai_response.
+
+        Отдает события {"type": "token", "content": ...} по мере генерации, а после
+        завершения сохраняет ответ в чат и отдает {"type": "message", "message": ChatMessage}.
+        """
+        reply = await self._prepare_ai_reply(db, chat_id, user_id, current_message)
+        if reply is None:
+            return
+        answer, prompt = reply
+
+        if answer is None:
+            parts = []
+            async for chunk in astream_text_with_params(prompt=prompt, temperature=0.7, max_tokens=2000,
+                                                        use_cache=False):
+                parts.append(chunk)
+                yield {"type": "token", "content": chunk}
+            answer = "".join(parts)
+        else:
+            yield {"type": "token", "content": answer}
+
+        message = await self.add_message(db, chat_id, answer, role="assistant")
+        yield {"type": "message", "message": message}
+
     async def update_chat_title(self, db: AsyncSession, chat_id: int, user_id: int, title: str) -> Optional[Chat]:
         """Обновляет заголовок чата"""
         chat = await db.get(Chat, chat_id)
@@ -10,7 +10,7 @@ from langchain_community.document_loaders import (
     UnstructuredExcelLoader
 )
 from models.models import User, ChatMessage, Document
-from generation.generate_text_langchain import generate_text_with_params
+from generation.generate_text_langchain import agenerate_text_with_params
 
 class DocumentAnalysisService:
     """Сервис для анализа документов и взаимодействия с ними через ИИ"""
@@ -119,7 +119,7 @@ class DocumentAnalysisService:
         """
         
         # Генерируем ответ
-        response = generate_text_with_params(
+        response = await agenerate_text_with_params(
             prompt=prompt,
             temperature=0.3,  # Низкая температура для более точных ответов
             max_tokens=5000
@@ -147,7 +147,7 @@ class DocumentAnalysisService:
         """
         
         # Генерируем резюме
-        summary = generate_text_with_params(
+        summary = await agenerate_text_with_params(
             prompt=prompt,
             temperature=0.5,
             max_tokens=1500
@@ -1,34 +1,33 @@
 import os
 import json
+import asyncio
 from datetime import datetime
 from docx import Document
+from docx.oxml import parse_xml
+from docx.text.paragraph import Paragraph
+from lxml import etree
 from bs4 import BeautifulSoup
 import mammoth
 from models.models import Report, DocumentEdit
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer, undefer_group
+from database import load_deferred
 from docx.shared import Pt
 from docx.enum.text import WD_UNDERLINE
 from .docx_html_converter import WordToHtmlConverter
+from .docx_pool import docx_pool
+from .metrics import metrics
+from .version_store import version_store
+from .docx_version_store import docx_versions
 
 class DocumentEditorService:
     """Сервис для работы с документами в интерактивном режиме"""
     
     async def docx_to_html(self, docx_path):
-        """Конвертация DOCX в HTML с использованием WordToHtmlConverter"""
-        
-        try:
-            # Используем только новый конвертер
-            converter = WordToHtmlConverter()
-            enhanced_html = converter.convert_with_precise_formatting(docx_path)
-            
-            return enhanced_html
-            
-        except Exception as e:
-            print(f"Ошибка при конвертации DOCX в HTML: {str(e)}")
-            # Простой fallback без mammoth
-            return await self._simple_fallback_conversion(docx_path)
+        """Конвертация DOCX в HTML с использованием WordToHtmlConverter (в пуле процессов)"""
+        return await docx_pool.run(convert_docx_to_html, docx_path)
     
-    async def _simple_fallback_conversion(self, docx_path):
+    def _simple_fallback_conversion(self, docx_path):
         """Простой fallback метод конвертации"""
         try:
             doc = Document(docx_path)
@@ -67,30 +66,91 @@ class DocumentEditorService:
     async def update_document_with_edit(self, db: AsyncSession, report_id: int, edit_command: dict):
         """Обновляет документ на основе команды редактирования и создает новую версию"""
         # Получаем отчет
-        report = await db.get(Report, report_id)
+        report = await db.get(
+            Report, report_id, options=[undefer(Report.html_content), undefer_group("history")]
+        )
         if not report:
             raise ValueError(f"Отчет с ID {report_id} не найден")
+        # Отчет мог уже быть в сессии без HTML - тогда опции выше не применились
+        await load_deferred(db, report, "html_content")
         
-        # Инициализируем version_history, если его нет
-        if report.version_history is None:
-            initial_version = {
-                "version": 1,
-                "timestamp": datetime.utcnow().isoformat(),
-                "description": "Начальная версия документа",
-                "file_path": report.file_path,
-                "html_content": report.html_content,
-                "edit_description": "Создание документа"
-            }
-            report.version_history = [initial_version]
+        # Текущее состояние должно быть в истории версий до правки
+        if await version_store.ensure_current_version(
+            db, report, "Начальная версия документа", "Создание документа"
+        ):
             await db.commit()
         
-        # Загружаем текущую версию документа
-        doc = Document(report.file_path)
+        command_type = edit_command.get("command")
+        print(f"🔧 Выполняем команду: {edit_command}")
+
+        # Путь для новой версии
+        new_version = report.document_version + 1
+        base_path, ext = os.path.splitext(report.file_path)
+        # Убираем старый номер версии, если есть
+        if base_path.endswith(f"_v{report.document_version}"):
+            base_path = base_path[:-len(f"_v{report.document_version}")]
+        new_file_path = f"{base_path}_v{new_version}{ext}"
+
+        # Разбор, правка, сохранение и конвертация документа - в пуле процессов
+        outcome = await docx_pool.run(
+            edit_docx, report.file_path, edit_command, new_file_path, report.html_content
+        )
+        result = outcome["result"]
+        old_text = outcome["old_text"]
+        new_text = outcome["new_text"]
+        paragraph_id = outcome["paragraph_id"]
+        edit_description = outcome["edit_description"]
+
+        # Если команда выполнена успешно, создаем новую версию
+        if result["success"]:
+            print(f"💾 Сохранена новая версия: {new_file_path}")
+            html_content = outcome["html_content"]
+            # Сколько правок обошлось без полной конвертации документа
+            metrics.increment(f"document_edit.html_{outcome['html_mode']}")
+            
+            # Файл версии - дельтой к предыдущей
+            previous_version, previous_path = report.document_version, report.file_path
+            await docx_versions.record(
+                report_id, new_version, new_file_path, report.document_version, report.file_path
+            )
+            
+            # Записываем новую версию (HTML хранится отдельно, сжатым и без дублей)
+            await version_store.add_version(
+                db, report_id, new_version, f"Версия {new_version}", edit_description,
+                new_file_path, html_content,
+            )
+            
+            # Обновляем запись в базе данных
+            report.document_version = new_version
+            report.file_path = new_file_path
+            report.html_content = html_content
+            
+            # Сохраняем запись об изменении
+            edit = DocumentEdit(
+                report_id=report_id,
+                user_id=edit_command.get("user_id"),
+                chat_message_id=edit_command.get("message_id"),
+                edit_type=command_type,
+                content_before=json.dumps({"text": old_text}) if old_text else None,
+                content_after=json.dumps({"text": new_text}) if new_text else None,
+                position=json.dumps({"paragraph_id": paragraph_id}) if paragraph_id is not None else None
+            )
+            db.add(edit)
+            await db.commit()
+            # Рабочая копия предыдущей версии больше не нужна - ее можно собрать из хранилища
+            docx_versions.prune_working_copy(report_id, previous_version, previous_path, new_file_path)
+            
+            print(f"✅ Создана версия {new_version}: {edit_description}")
         
-        # Выполняем команду
+        return result
+    
+    async def _apply_command(self, doc, edit_command: dict):
+        """
+        Применяет команду редактирования к загруженному документу.
+        Возвращает (result, old_text, new_text, paragraph_id, edit_description).
+        """
         command_type = edit_command.get("command")
         result = {"success": False, "message": "Неизвестная команда"}
-        print(f"🔧 Выполняем команду: {edit_command}")
         
         # Устанавливаем переменные по умолчанию для избежания ошибок
         old_text = None
@@ -169,73 +229,7 @@ class DocumentEditorService:
             new_text = "Обычный текст"
             edit_description = "Снятие всего форматирования"
 
-        # Если команда выполнена успешно, создаем новую версию
-        if result["success"]:
-            # Сохраняем текущую версию в истории (если еще не сохранена)
-            version_history = list(report.version_history) if report.version_history else []
-            current_version_exists = any(v.get("version") == report.document_version for v in version_history)
-            
-            if not current_version_exists:
-                current_version_data = {
-                    "version": report.document_version,
-                    "timestamp": datetime.utcnow().isoformat(),
-                    "description": f"Версия {report.document_version}",
-                    "file_path": report.file_path,
-                    "html_content": report.html_content,
-                    "edit_description": "Предыдущее состояние"
-                }
-                version_history.append(current_version_data)
-            
-            # Создаем новую версию документа
-            new_version = report.document_version + 1
-            
-            # Создаем путь для новой версии
-            base_path, ext = os.path.splitext(report.file_path)
-            # Убираем старый номер версии, если есть
-            if base_path.endswith(f"_v{report.document_version}"):
-                base_path = base_path[:-len(f"_v{report.document_version}")]
-            new_file_path = f"{base_path}_v{new_version}{ext}"
-            
-            # Сохраняем обновленный документ
-            doc.save(new_file_path)
-            print(f"💾 Сохранена новая версия: {new_file_path}")
-            
-            # Конвертируем в HTML и сохраняем
-            html_content = await self.docx_to_html(new_file_path)
-            
-            # Создаем запись для новой версии
-            new_version_data = {
-                "version": new_version,
-                "timestamp": datetime.utcnow().isoformat(),
-                "description": f"Версия {new_version}",
-                "file_path": new_file_path,
-                "html_content": html_content,
-                "edit_description": edit_description
-            }
-            version_history.append(new_version_data)
-            
-            # Обновляем запись в базе данных
-            report.document_version = new_version
-            report.file_path = new_file_path
-            report.html_content = html_content
-            report.version_history = version_history
-            
-            # Сохраняем запись об изменении
-            edit = DocumentEdit(
-                report_id=report_id,
-                user_id=edit_command.get("user_id"),
-                chat_message_id=edit_command.get("message_id"),
-                edit_type=command_type,
-                content_before=json.dumps({"text": old_text}) if old_text else None,
-                content_after=json.dumps({"text": new_text}) if new_text else None,
-                position=json.dumps({"paragraph_id": paragraph_id}) if paragraph_id is not None else None
-            )
-            db.add(edit)
-            await db.commit()
-            
-            print(f"✅ Создана версия {new_version}: {edit_description}")
-        
-        return result
+        return result, old_text, new_text, paragraph_id, edit_description
     
     async def _replace_text(self, doc, old_text, new_text, paragraph_id=None):
         """Заменяет текст в документе"""
@@ -1247,3 +1241,110 @@ class DocumentEditorService:
             "processed_count": processed_count
         }
 
+
+# Функции ниже выполняются в процессах docx_pool, поэтому объявлены на уровне модуля
+
+def convert_docx_to_html(docx_path):
+    """Конвертирует DOCX в HTML, при ошибке - упрощенным способом"""
+    try:
+        return WordToHtmlConverter().convert_with_precise_formatting(docx_path)
+    except Exception as e:
+        print(f"Ошибка при конвертации DOCX в HTML: {str(e)}")
+        # Простой fallback без mammoth
+        return DocumentEditorService()._simple_fallback_conversion(docx_path)
+
+
+def write_docx_html(docx_path, out_path):
+    """
+    Пишет HTML документа в out_path частями по мере конвертации (для
+    docx_pool.stream): первой - заголовок с CSS. Если конвертация упала до
+    первой части, пишет результат упрощенного способа.
+    """
+    with open(out_path, "w", encoding="utf-8") as f:
+        written = False
+        try:
+            for chunk in WordToHtmlConverter().iter_html(docx_path):
+                f.write(chunk)
+                f.flush()
+                written = True
+        except Exception as e:
+            if written:
+                raise
+            print(f"Ошибка при конвертации DOCX в HTML: {str(e)}")
+            f.write(DocumentEditorService()._simple_fallback_conversion(docx_path))
+
+
+def _snapshot_paragraphs(doc):
+    """XML параграфов документа - для поиска параграфов, измененных правкой"""
+    return [etree.tostring(paragraph._p) for paragraph in doc.paragraphs]
+
+
+def _changed_paragraphs(doc, before, converter):
+    """
+    Индексы параграфов, которые изменила правка, или None, если изменилась
+    структура документа (число параграфов или группировка списков)
+    """
+    paragraphs = doc.paragraphs
+    if len(paragraphs) != len(before):
+        return None
+
+    changed = []
+    for index, paragraph in enumerate(paragraphs):
+        if etree.tostring(paragraph._p) == before[index]:
+            continue
+        old_paragraph = Paragraph(parse_xml(before[index]), paragraph._parent)
+        if converter.list_kind(old_paragraph) != converter.list_kind(paragraph):
+            return None
+        changed.append(index)
+    return changed
+
+
+def render_edited_html(doc, docx_path, before, html_content):
+    """
+    HTML новой версии документа: если правка не меняла структуру, в прежнем
+    html_content перерисовываются только измененные параграфы, иначе документ
+    конвертируется целиком. Возвращает (html, "patch" | "full").
+    """
+    converter = WordToHtmlConverter()
+    if html_content:
+        changed = _changed_paragraphs(doc, before, converter)
+        if changed is not None:
+            paragraphs = doc.paragraphs
+            context = converter.styles_context(doc)
+            fragments = {index: converter.render_paragraph(paragraphs[index], index, context) for index in changed}
+            patched = converter.patch_paragraphs(html_content, fragments)
+            if patched is not None:
+                return patched, "patch"
+    return convert_docx_to_html(docx_path), "full"
+
+
+def edit_docx(file_path, edit_command, new_file_path, html_content=None):
+    """
+    Загружает документ, применяет команду и при успехе сохраняет новую версию
+    в new_file_path вместе с ее HTML-представлением.
+
+    html_content - HTML текущей версии; если передан, в нем обновляются
+    только затронутые правкой параграфы.
+    """
+    doc = Document(file_path)
+    before = _snapshot_paragraphs(doc)
+    # Методы правки асинхронные, но ввода-вывода в них нет
+    result, old_text, new_text, paragraph_id, edit_description = asyncio.run(
+        DocumentEditorService()._apply_command(doc, edit_command)
+    )
+
+    html_mode = None
+    new_html = None
+    if result["success"]:
+        doc.save(new_file_path)
+        new_html, html_mode = render_edited_html(doc, new_file_path, before, html_content)
+
+    return {
+        "result": result,
+        "old_text": old_text,
+        "new_text": new_text,
+        "paragraph_id": paragraph_id,
+        "edit_description": edit_description,
+        "html_content": new_html,
+        "html_mode": html_mode,
+    }
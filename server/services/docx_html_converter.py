@@ -3,8 +3,22 @@ from docx.shared import Pt
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.oxml.ns import qn
 from bs4 import BeautifulSoup
+from lxml import etree
+import os
 import re
 
+from services.html_fragment_cache import fragment_cache, make_fragment_context, make_fragment_key
+
+# Фрагмент параграфа в HTML: <tag data-paragraph-id="N" ...>...</tag>.
+# Текст внутри экранирован, поэтому закрывающий тег однозначен
+_PARAGRAPH_FRAGMENT_RE = re.compile(r'<(\w+) data-paragraph-id="(\d+)"[^>]*>.*?</\1>', re.DOTALL)
+
+# Размер части HTML при потоковой отдаче, символов
+HTML_STREAM_CHUNK_SIZE = int(os.getenv("HTML_STREAM_CHUNK_SIZE", str(64 * 1024)))
+
+# Кешированные фрагменты хранятся без номера параграфа, он подставляется при выдаче
+_INDEX_PLACEHOLDER = '__PARAGRAPH_ID__'
+
 class WordToHtmlConverter:
     """Утилита для точной конвертации Word документов в HTML"""
     
@@ -13,93 +27,161 @@ class WordToHtmlConverter:
     
     def convert_with_precise_formatting(self, docx_path: str) -> str:
         """Конвертирует DOCX в HTML с максимальным сохранением форматирования"""
-        
-        doc = Document(docx_path)
-        html_parts = []
-        
+        return ''.join(self.iter_html(docx_path))
+
+    def iter_html(self, docx_path: str, chunk_size: int = None):
+        """
+        Генератор HTML документа частями примерно по chunk_size символов.
+
+        Первая часть - заголовок с CSS, поэтому браузер может начать отрисовку,
+        пока остальной документ еще конвертируется. Склеенные части совпадают
+        с результатом convert_with_precise_formatting.
+        """
+        chunk_size = chunk_size or HTML_STREAM_CHUNK_SIZE
+        buffer = []
+        size = 0
+        for i, part in enumerate(self._iter_html_parts(Document(docx_path))):
+            if i:
+                part = '\n' + part
+            buffer.append(part)
+            size += len(part)
+            # Заголовок отдаем сразу
+            if i == 0 or size >= chunk_size:
+                yield ''.join(buffer)
+                buffer = []
+                size = 0
+        if buffer:
+            yield ''.join(buffer)
+
+    def _iter_html_parts(self, doc):
+        """Части HTML-документа: заголовок с CSS, затем параграфы и закрывающие теги"""
         # Создаем HTML структуру
-        html_parts.append('<!DOCTYPE html>')
-        html_parts.append('<html>')
-        html_parts.append('<head>')
-        html_parts.append('<meta charset="utf-8">')
-        html_parts.append('<style>')
-        html_parts.append(self._generate_comprehensive_css(doc))
-        html_parts.append('</style>')
-        html_parts.append('</head>')
-        html_parts.append('<body>')
-        html_parts.append('<div class="word-document-page">')
-        
+        yield '\n'.join([
+            '<!DOCTYPE html>',
+            '<html>',
+            '<head>',
+            '<meta charset="utf-8">',
+            '<style>',
+            self._generate_comprehensive_css(doc),
+            '</style>',
+            '</head>',
+            '<body>',
+            '<div class="word-document-page">',
+        ])
+
         # Группируем параграфы для обработки списков
-        processed_paragraphs = self._process_lists_and_paragraphs(doc.paragraphs)
-        
-        for item in processed_paragraphs:
-            html_parts.append(item)
-        
-        html_parts.append('</div>')
-        html_parts.append('</body>')
-        html_parts.append('</html>')
-        
-        return '\n'.join(html_parts)
+        yield from self._iter_lists_and_paragraphs(doc.paragraphs, self.styles_context(doc))
+
+        yield '</div>'
+        yield '</body>'
+        yield '</html>'
     
-    def _process_lists_and_paragraphs(self, paragraphs):
-        """Обрабатывает параграфы и группирует их в списки"""
-        result = []
+    def styles_context(self, doc):
+        """Хеш XML стилей документа: от них, кроме самого параграфа, зависит HTML параграфа"""
+        return make_fragment_context(etree.tostring(doc.styles.element))
+
+    def render_paragraph(self, paragraph, index: int, context) -> str:
+        """HTML одного параграфа - в том же виде, что и при полной конвертации"""
+        return self._with_index(self._render_fragment(paragraph, context)[1], index)
+
+    def _render_fragment(self, paragraph, context):
+        """(тип списка, HTML без номера параграфа); неизмененные параграфы берутся из кеша"""
+        key = make_fragment_key(context, etree.tostring(paragraph._p))
+        cached = fragment_cache.get(key)
+        if cached is not None:
+            return cached
+
+        kind = self.list_kind(paragraph)
+        if kind is not None:
+            html = self._convert_list_item_to_html(paragraph, _INDEX_PLACEHOLDER)
+        else:
+            html = self._convert_paragraph_to_html(paragraph, _INDEX_PLACEHOLDER)
+        fragment_cache.set(key, kind, html)
+        return kind, html
+
+    def _with_index(self, html, index):
+        # Атрибут с номером идет первым, раньше текста параграфа
+        return html.replace(f'data-paragraph-id="{_INDEX_PLACEHOLDER}"', f'data-paragraph-id="{index}"', 1)
+
+    def list_kind(self, paragraph):
+        """Тип списка параграфа ('bullet' / 'number') или None; от него зависит группировка в <ul>/<ol>"""
+        if self._is_list_paragraph(paragraph):
+            return self._get_list_type(paragraph)
+        return None
+
+    def patch_paragraphs(self, html: str, fragments: dict):
+        """
+        Заменяет в готовом HTML параграфы с указанными индексами на новые фрагменты.
+        Возвращает None, если какой-то из параграфов в HTML не найден.
+        """
+        replaced = set()
+
+        def replace(match):
+            index = int(match.group(2))
+            if index in fragments:
+                replaced.add(index)
+                return fragments[index]
+            return match.group(0)
+
+        patched = _PARAGRAPH_FRAGMENT_RE.sub(replace, html)
+        if len(replaced) != len(fragments):
+            return None
+        return patched
+
+    def _iter_lists_and_paragraphs(self, paragraphs, context):
+        """Обрабатывает параграфы и группирует их в списки (генератор HTML-частей)"""
         current_list = None
         list_type = None
         paragraph_index = 0
         
         for paragraph in paragraphs:
-            # Проверяем, является ли параграф элементом списка
-            is_list_item = self._is_list_paragraph(paragraph)
+            # Тип списка (None - не элемент списка) и HTML параграфа
+            current_list_type, fragment = self._render_fragment(paragraph, context)
+            is_list_item = current_list_type is not None
             
             if is_list_item:
-                current_list_type = self._get_list_type(paragraph)
                 
                 # Если начинается новый список или меняется тип
                 if current_list is None or current_list_type != list_type:
                     # Закрываем предыдущий список
                     if current_list is not None:
                         if list_type == 'bullet':
-                            result.append('</ul>')
+                            yield '</ul>'
                         else:
-                            result.append('</ol>')
+                            yield '</ol>'
                     
                     # Начинаем новый список
                     list_type = current_list_type
                     if list_type == 'bullet':
-                        result.append('<ul class="word-list">')
+                        yield '<ul class="word-list">'
                     else:
-                        result.append('<ol class="word-list">')
+                        yield '<ol class="word-list">'
                     current_list = []
                 
                 # Добавляем элемент списка
-                list_item_html = self._convert_list_item_to_html(paragraph, paragraph_index)
-                result.append(list_item_html)
+                yield self._with_index(fragment, paragraph_index)
                 
             else:
                 # Закрываем текущий список, если он открыт
                 if current_list is not None:
                     if list_type == 'bullet':
-                        result.append('</ul>')
+                        yield '</ul>'
                     else:
-                        result.append('</ol>')
+                        yield '</ol>'
                     current_list = None
                     list_type = None
                 
                 # Обрабатываем как обычный параграф
-                paragraph_html = self._convert_paragraph_to_html(paragraph, paragraph_index)
-                result.append(paragraph_html)
+                yield self._with_index(fragment, paragraph_index)
             
             paragraph_index += 1
         
         # Закрываем последний список, если он открыт
         if current_list is not None:
             if list_type == 'bullet':
-                result.append('</ul>')
+                yield '</ul>'
             else:
-                result.append('</ol>')
-        
-        return result
+                yield '</ol>'
     
     def _is_list_paragraph(self, paragraph):
         """Проверяет, является ли параграф элементом списка"""
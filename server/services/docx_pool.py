@@ -0,0 +1,159 @@
+"""
+Пул процессов для тяжелой работы с DOCX (разбор, редактирование, сохранение,
+конвертация в HTML).
+
+python-docx и lxml держат GIL, поэтому в потоке такая работа все равно тормозит
+цикл событий; в отдельных процессах она идет параллельно и не мешает запросам.
+
+Настройки:
+    DOCX_POOL_WORKERS - число процессов (по умолчанию min(4, число CPU));
+                        0 - выполнять в потоке текущего процесса (для отладки)
+    DOCX_POOL_START_METHOD - способ запуска процессов (по умолчанию spawn)
+    DOCX_STREAM_POLL_INTERVAL - как часто проверять новые данные при потоковой
+                                отдаче результата, секунд (по умолчанию 0.05)
+"""
+import asyncio
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from services.metrics import metrics
+
+DOCX_POOL_WORKERS = int(os.getenv("DOCX_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+DOCX_POOL_START_METHOD = os.getenv("DOCX_POOL_START_METHOD", "spawn")
+DOCX_STREAM_POLL_INTERVAL = float(os.getenv("DOCX_STREAM_POLL_INTERVAL", "0.05"))
+
+
+def _noop():
+    return os.getpid()
+
+
+def _call_collecting_metrics(call):
+    # Метрики процесса пула недоступны из основного процесса - возвращаем счетчики вместе с результатом
+    metrics.take_counters()
+    result = call()
+    return result, metrics.take_counters()
+
+
+def extract_docx_text(file_path):
+    """Текст непустых абзацев документа, разделенный пустой строкой"""
+    from docx import Document
+
+    doc = Document(file_path)
+    return '\n\n'.join(p.text.strip() for p in doc.paragraphs if p.text.strip())
+
+
+class DocxProcessPool:
+    """Асинхронный фасад над ProcessPoolExecutor"""
+
+    def __init__(self, max_workers=None, start_method=None):
+        self.max_workers = DOCX_POOL_WORKERS if max_workers is None else max_workers
+        self.start_method = start_method or DOCX_POOL_START_METHOD
+        self._executor = None
+        self._semaphore = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+            )
+        return self._executor
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Выполняет fn(*args, **kwargs) в процессе пула и возвращает результат.
+
+        fn должна быть функцией уровня модуля, а аргументы и результат - сериализуемыми.
+        Одновременно выполняется не больше max_workers задач, остальные ждут в
+        цикле событий (и могут быть отменены вместе с запросом).
+        """
+        return await self._execute(partial(fn, *args, **kwargs), retry=True)
+
+    async def _execute(self, call, retry):
+        if self.max_workers <= 0:
+            return await asyncio.to_thread(call)
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+
+        loop = asyncio.get_running_loop()
+        task = partial(_call_collecting_metrics, call)
+        async with self._semaphore:
+            try:
+                result, counters = await loop.run_in_executor(self._get_executor(), task)
+            except BrokenProcessPool:
+                if not retry:
+                    self._reset()
+                    raise
+                # Процесс упал (например, из-за нехватки памяти) - пересоздаем пул и повторяем один раз
+                print("Пул процессов DOCX поврежден, пересоздаем")
+                metrics.increment("docx_pool.restarts")
+                self._reset()
+                result, counters = await loop.run_in_executor(self._get_executor(), task)
+
+        for name, value in counters.items():
+            metrics.increment(name, value)
+        return result
+
+    async def stream(self, fn, *args, poll_interval=None):
+        """
+        Выполняет fn(*args, out_path) в процессе пула и отдает байты, которые fn
+        пишет во временный файл out_path, по мере записи - не дожидаясь конца задачи.
+
+        fn должна писать результат частями и сбрасывать буфер после каждой.
+        Ошибка fn пробрасывается после уже прочитанных данных; при падении
+        процесса задача не повторяется - часть результата уже отдана. Если
+        потребитель перестал читать, ожидание задачи отменяется, а файл удаляется.
+        """
+        poll_interval = DOCX_STREAM_POLL_INTERVAL if poll_interval is None else poll_interval
+        fd, out_path = tempfile.mkstemp(prefix="docx_stream_")
+        os.close(fd)
+        task = asyncio.ensure_future(self._execute(partial(fn, *args, out_path), retry=False))
+        try:
+            with open(out_path, "rb") as f:
+                while True:
+                    # Состояние задачи берем до чтения: все, что записано до ее завершения, будет прочитано
+                    done = task.done()
+                    data = f.read()
+                    if data:
+                        yield data
+                    elif done:
+                        task.result()
+                        break
+                    else:
+                        await asyncio.wait({task}, timeout=poll_interval)
+        finally:
+            if not task.done():
+                task.cancel()
+            os.remove(out_path)
+
+    async def warmup(self):
+        """Запускает процессы заранее, чтобы первый запрос не ждал их старта"""
+        if self.max_workers <= 0:
+            return
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.gather(*(loop.run_in_executor(executor, _noop) for _ in range(self.max_workers)))
+        except Exception as e:
+            print(f"Не удалось запустить пул процессов DOCX: {str(e)}")
+
+    def _reset(self):
+        executor = self._executor
+        self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        """Останавливает процессы, дождавшись текущих задач"""
+        executor = self._executor
+        self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+docx_pool = DocxProcessPool()
@@ -0,0 +1,299 @@
+"""
+Хранилище версий DOCX-файлов отчетов.
+
+Вместо полной копии файла на каждую правку хранятся периодические полные
+снимки и между ними дельты относительно предыдущей версии. DOCX - это zip;
+дельта хранит только измененные части, а для XML-частей (word/document.xml
+и т.п.) - только измененные параграфы. Любая версия собирается по запросу из
+ближайшего снимка и цепочки дельт; собранные файлы держатся в LRU на диске.
+
+Структура каталога DOCX_VERSION_DIR/<report_id>/:
+    v<N>.docx   - полный снимок версии N
+    v<N>.delta  - дельта версии N относительно N-1 (JSON, сжатый zlib)
+    cache/      - собранные версии (LRU)
+
+Настройки:
+    DOCX_VERSION_DIR - корень хранилища (по умолчанию reports/versions)
+    DOCX_SNAPSHOT_INTERVAL - полный снимок не реже чем раз в N версий (по умолчанию 10)
+    DOCX_VERSION_CACHE_SIZE - сколько собранных версий держать на диске (по умолчанию 32)
+    DOCX_VERSION_PRUNE_FILES - удалять рабочие копии прежних версий после фиксации новой (по умолчанию 1)
+"""
+import base64
+import difflib
+import json
+import os
+import re
+import shutil
+import threading
+import zipfile
+import zlib
+from collections import OrderedDict
+from typing import Optional
+
+from services.docx_pool import docx_pool
+from services.metrics import metrics
+
+DOCX_VERSION_DIR = os.getenv("DOCX_VERSION_DIR", os.path.join("reports", "versions"))
+DOCX_SNAPSHOT_INTERVAL = int(os.getenv("DOCX_SNAPSHOT_INTERVAL", "10"))
+DOCX_VERSION_CACHE_SIZE = int(os.getenv("DOCX_VERSION_CACHE_SIZE", "32"))
+DOCX_VERSION_PRUNE_FILES = os.getenv("DOCX_VERSION_PRUNE_FILES", "1") not in ("0", "false", "False", "")
+
+# Граница параграфов в XML-частях: дельта считается по параграфам, а не по байтам
+_PARAGRAPH_SPLIT_RE = re.compile(r'(?=<w:p[ >])')
+
+
+def _snapshot_path(report_dir, version):
+    return os.path.join(report_dir, f"v{version}.docx")
+
+
+def _delta_path(report_dir, version):
+    return os.path.join(report_dir, f"v{version}.delta")
+
+
+def _read_parts(path):
+    """Части zip-архива в исходном порядке: [(имя, байты)]"""
+    with zipfile.ZipFile(path) as archive:
+        return [(info.filename, archive.read(info)) for info in archive.infolist()]
+
+
+def _write_parts(path, parts):
+    tmp_path = f"{path}.tmp"
+    with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in parts:
+            archive.writestr(name, data)
+    os.replace(tmp_path, path)
+
+
+def _diff_part(name, old, new):
+    if old == new:
+        return {"op": "same"}
+    if old is not None and name.endswith(".xml"):
+        try:
+            old_tokens = _PARAGRAPH_SPLIT_RE.split(old.decode("utf-8"))
+            new_tokens = _PARAGRAPH_SPLIT_RE.split(new.decode("utf-8"))
+        except UnicodeDecodeError:
+            old_tokens = None
+        if old_tokens is not None:
+            ops = []
+            matcher = difflib.SequenceMatcher(None, old_tokens, new_tokens, autojunk=False)
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                if tag == "equal":
+                    ops.append(["copy", i1, i2])
+                elif j2 > j1:
+                    ops.append(["insert", new_tokens[j1:j2]])
+            return {"op": "xml", "ops": ops}
+    return {"op": "data", "data": base64.b64encode(new).decode("ascii")}
+
+
+def _apply_part(patch, old):
+    if patch["op"] == "same":
+        return old
+    if patch["op"] == "data":
+        return base64.b64decode(patch["data"])
+    old_tokens = _PARAGRAPH_SPLIT_RE.split(old.decode("utf-8"))
+    result = []
+    for op in patch["ops"]:
+        if op[0] == "copy":
+            result.extend(old_tokens[op[1]:op[2]])
+        else:
+            result.extend(op[1])
+    return "".join(result).encode("utf-8")
+
+
+def _load_parts(report_dir, version):
+    """Собирает части версии из ближайшего снимка и цепочки дельт"""
+    chain = []
+    current = version
+    while not os.path.exists(_snapshot_path(report_dir, current)):
+        delta_file = _delta_path(report_dir, current)
+        if not os.path.exists(delta_file):
+            raise FileNotFoundError(f"Версия {current} отсутствует в хранилище")
+        with open(delta_file, "rb") as f:
+            delta = json.loads(zlib.decompress(f.read()))
+        chain.append(delta)
+        current = delta["base"]
+
+    parts = _read_parts(_snapshot_path(report_dir, current))
+    for delta in reversed(chain):
+        old = dict(parts)
+        parts = [(name, _apply_part(delta["parts"][name], old.get(name))) for name in delta["order"]]
+    return parts
+
+
+def store_docx_version(report_dir, version, path, base_version=None, base_path=None, snapshot_interval=None):
+    """
+    Сохраняет файл версии: полным снимком или дельтой относительно base_version.
+    Возвращает размер записанного и размер исходного файла.
+    Выполняется в процессе docx_pool.
+    """
+    os.makedirs(report_dir, exist_ok=True)
+    interval = snapshot_interval or DOCX_SNAPSHOT_INTERVAL
+    full_size = os.path.getsize(path)
+
+    # Сколько дельт уже накопилось после последнего снимка
+    depth = 0
+    current = base_version
+    while (current is not None and current >= 1 and depth < interval
+           and not os.path.exists(_snapshot_path(report_dir, current))):
+        depth += 1
+        current -= 1
+
+    if base_version is None or depth + 1 >= interval:
+        target = _snapshot_path(report_dir, version)
+        shutil.copyfile(path, f"{target}.tmp")
+        os.replace(f"{target}.tmp", target)
+        return {"kind": "snapshot", "stored": full_size, "size": full_size}
+
+    base_parts = dict(
+        _read_parts(base_path) if base_path and os.path.exists(base_path)
+        else _load_parts(report_dir, base_version)
+    )
+    new_parts = _read_parts(path)
+    delta = {
+        "base": base_version,
+        "size": full_size,
+        "order": [name for name, _ in new_parts],
+        "parts": {name: _diff_part(name, base_parts.get(name), data) for name, data in new_parts},
+    }
+    payload = zlib.compress(json.dumps(delta, ensure_ascii=False).encode("utf-8"), 6)
+    target = _delta_path(report_dir, version)
+    with open(f"{target}.tmp", "wb") as f:
+        f.write(payload)
+    os.replace(f"{target}.tmp", target)
+    return {"kind": "delta", "stored": len(payload), "size": full_size}
+
+
+def materialize_docx_version(report_dir, version, target):
+    """Собирает версию в файл target. Выполняется в процессе docx_pool"""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    _write_parts(target, _load_parts(report_dir, version))
+    return target
+
+
+class DocxVersionStore:
+    """Асинхронный фасад: запись версий, сборка по запросу и LRU собранных файлов"""
+
+    def __init__(self, root=None, snapshot_interval=None, cache_size=None, prune_files=None):
+        self.root = root or DOCX_VERSION_DIR
+        self.snapshot_interval = snapshot_interval or DOCX_SNAPSHOT_INTERVAL
+        self.cache_size = cache_size or DOCX_VERSION_CACHE_SIZE
+        self.prune_files = DOCX_VERSION_PRUNE_FILES if prune_files is None else prune_files
+        self._materialized = OrderedDict()  # (report_id, version) -> путь
+        self._lock = threading.Lock()
+
+    def _report_dir(self, report_id):
+        return os.path.join(self.root, str(report_id))
+
+    def has_version(self, report_id: int, version: int) -> bool:
+        report_dir = self._report_dir(report_id)
+        return (os.path.exists(_snapshot_path(report_dir, version))
+                or os.path.exists(_delta_path(report_dir, version)))
+
+    async def record(self, report_id: int, version: int, path: str,
+                     base_version: Optional[int] = None, base_path: Optional[str] = None):
+        """
+        Сохраняет новую версию файла. Если базовой версии еще нет в хранилище
+        (отчет создан до его появления), она сначала сохраняется снимком.
+        Рабочие копии не трогает: после фиксации новой версии в БД прежнюю
+        удаляет prune_working_copy.
+        """
+        report_dir = self._report_dir(report_id)
+        if base_version is not None and not self.has_version(report_id, base_version):
+            if base_path and os.path.exists(base_path):
+                await self._store(report_dir, base_version, base_path)
+            else:
+                base_version = None
+
+        await self._store(report_dir, version, path, base_version, base_path)
+
+    def prune_working_copy(self, report_id: int, version: int, path: Optional[str], current_path: str):
+        """
+        Удаляет рабочую копию прежней версии, если ее можно собрать из хранилища.
+        Вызывается после успешного commit, когда отчет уже указывает на current_path.
+        """
+        if (not self.prune_files or not path or os.path.abspath(path) == os.path.abspath(current_path)
+                or not self.has_version(report_id, version)):
+            return
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def remove_report(self, report_id: int):
+        """Удаляет все версии отчета (снимки, дельты и собранные файлы)"""
+        with self._lock:
+            for key in [key for key in self._materialized if key[0] == report_id]:
+                del self._materialized[key]
+        shutil.rmtree(self._report_dir(report_id), ignore_errors=True)
+
+    async def _store(self, report_dir, version, path, base_version=None, base_path=None):
+        result = await docx_pool.run(
+            store_docx_version, report_dir, version, path, base_version, base_path, self.snapshot_interval
+        )
+        metrics.increment(f"docx_versions.{result['kind']}s")
+        metrics.increment("docx_versions.full_bytes", result["size"])
+        metrics.increment("docx_versions.stored_bytes", result["stored"])
+        return result
+
+    async def get_path(self, report_id: int, version: int, file_path: Optional[str] = None) -> Optional[str]:
+        """
+        Путь к файлу версии: рабочая копия, если она есть, иначе версия
+        собирается из хранилища. None - версии нет нигде.
+        """
+        if file_path and os.path.exists(file_path):
+            return file_path
+        if not self.has_version(report_id, version):
+            return None
+
+        key = (report_id, version)
+        with self._lock:
+            cached = self._materialized.get(key)
+            if cached and os.path.exists(cached):
+                self._materialized.move_to_end(key)
+                metrics.increment("docx_versions.cache_hits")
+                return cached
+
+        target = os.path.join(self._report_dir(report_id), "cache", f"v{version}.docx")
+        await docx_pool.run(materialize_docx_version, self._report_dir(report_id), version, target)
+        metrics.increment("docx_versions.materialized")
+
+        evicted = []
+        with self._lock:
+            self._materialized[key] = target
+            self._materialized.move_to_end(key)
+            while len(self._materialized) > self.cache_size:
+                evicted.append(self._materialized.popitem(last=False)[1])
+        for path in evicted:
+            if os.path.exists(path):
+                os.remove(path)
+        return target
+
+    def storage_stats(self, report_id: int) -> dict:
+        """Сколько места занимают версии отчета в хранилище и сколько заняли бы полные копии"""
+        report_dir = self._report_dir(report_id)
+        stats = {"versions": 0, "snapshots": 0, "full_bytes": 0, "stored_bytes": 0}
+        if not os.path.isdir(report_dir):
+            return {**stats, "saved_ratio": 0.0}
+
+        for name in os.listdir(report_dir):
+            path = os.path.join(report_dir, name)
+            if name.endswith(".docx"):
+                size = os.path.getsize(path)
+                stats["snapshots"] += 1
+                stats["full_bytes"] += size
+            elif name.endswith(".delta"):
+                with open(path, "rb") as f:
+                    payload = f.read()
+                size = len(payload)
+                stats["full_bytes"] += json.loads(zlib.decompress(payload))["size"]
+            else:
+                continue
+            stats["versions"] += 1
+            stats["stored_bytes"] += size
+
+        full = stats["full_bytes"]
+        stats["saved_ratio"] = 1 - stats["stored_bytes"] / full if full else 0.0
+        return stats
+
+
+docx_versions = DocxVersionStore()
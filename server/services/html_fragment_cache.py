@@ -0,0 +1,116 @@
+"""
+Кеш HTML-фрагментов параграфов DOCX.
+
+Ключ - хеш XML параграфа (w:p) вместе с XML стилей документа: от них зависит
+результат конвертации. Неизмененные параграфы не конвертируются повторно ни
+при следующих правках, ни для других версий документа. Номер параграфа в
+фрагмент не входит и подставляется при выдаче, поэтому вставка и удаление
+параграфов не сбрасывают кеш.
+
+Кеш живет в процессе, где идет конвертация: у каждого процесса docx_pool
+своя копия, общей памяти между ними нет. Поэтому HTML_FRAGMENT_CACHE_MAX_BYTES -
+бюджет на весь пул, а каждому процессу достается его доля
+(HTML_FRAGMENT_CACHE_MAX_BYTES / DOCX_POOL_WORKERS). При DOCX_POOL_WORKERS=0
+конвертация идет в основном процессе, и ему достается весь бюджет.
+
+Настройки:
+    HTML_FRAGMENT_CACHE_ENABLED - включить кеш (по умолчанию 1)
+    HTML_FRAGMENT_CACHE_MAX_BYTES - предельный размер фрагментов во всех процессах пула, в байтах (по умолчанию 32 МБ)
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from services.docx_pool import DOCX_POOL_WORKERS
+from services.metrics import metrics
+
+HTML_FRAGMENT_CACHE_ENABLED = os.getenv("HTML_FRAGMENT_CACHE_ENABLED", "1") not in ("0", "false", "False", "")
+HTML_FRAGMENT_CACHE_MAX_BYTES = int(os.getenv("HTML_FRAGMENT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Число процессов, между которыми делится бюджет
+HTML_FRAGMENT_CACHE_PROCESSES = max(1, DOCX_POOL_WORKERS)
+
+
+def make_fragment_context(styles_xml):
+    """Хеш XML стилей: считается один раз на документ, а не для каждого параграфа"""
+    return hashlib.sha1(styles_xml)
+
+
+def make_fragment_key(context, paragraph_xml):
+    """Хеш XML параграфа в контексте стилей документа (context - из make_fragment_context)"""
+    key = context.copy()
+    key.update(paragraph_xml)
+    return key.digest()
+
+
+class FragmentCache:
+    """LRU-кеш фрагментов (тип списка, HTML) одного процесса; max_bytes - предел этого процесса"""
+
+    def __init__(self, max_bytes=None, enabled=None):
+        if max_bytes is None:
+            max_bytes = HTML_FRAGMENT_CACHE_MAX_BYTES // HTML_FRAGMENT_CACHE_PROCESSES
+        self.max_bytes = max_bytes
+        self.enabled = HTML_FRAGMENT_CACHE_ENABLED if enabled is None else enabled
+        self._entries = OrderedDict()  # key -> (list_kind, html)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Возвращает (list_kind, html) или None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        metrics.increment("html_fragment_cache.hits" if entry is not None else "html_fragment_cache.misses")
+        return entry
+
+    def set(self, key, list_kind, html):
+        if not self.enabled:
+            return
+        size = len(html) + len(key)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[1]) + len(key)
+            self._entries[key] = (list_kind, html)
+            self._size += size
+            evicted = 0
+            while self._size > self.max_bytes:
+                old_key, (_, old_html) = self._entries.popitem(last=False)
+                self._size -= len(old_html) + len(old_key)
+                evicted += 1
+        if evicted:
+            metrics.increment("html_fragment_cache.evictions", evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        """
+        Состояние кеша для /metrics/html-cache. Счетчики попаданий, промахов
+        и вытеснений - сумма по всем процессам пула (docx_pool пересылает их
+        в основной процесс), а не данные одного кеша: у каждого процесса свои
+        записи и свой предел max_bytes_per_process.
+        """
+        hits = metrics.get("html_fragment_cache.hits")
+        misses = metrics.get("html_fragment_cache.misses")
+        return {
+            "enabled": self.enabled,
+            "scope": "aggregated across docx_pool processes",
+            "processes": HTML_FRAGMENT_CACHE_PROCESSES,
+            "max_bytes_per_process": self.max_bytes,
+            "max_bytes_total": self.max_bytes * HTML_FRAGMENT_CACHE_PROCESSES,
+            "hits": hits,
+            "misses": misses,
+            "evictions": metrics.get("html_fragment_cache.evictions"),
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+
+fragment_cache = FragmentCache()
@@ -0,0 +1,125 @@
+"""
+Индекс параграфов в HTML отчета.
+
+Для сохраненного html_content один раз вычисляются смещения каждого
+параграфа (data-paragraph-id) и список заголовков. По индексу редактор
+получает окна параграфов (например, 200-300 или один раздел) без разбора
+всего документа, что позволяет виртуализировать прокрутку.
+
+Индекс ищется по (отчет, версия, отпечаток) - отпечаток хранится в БД и
+меняется вместе с HTML (путь к файлу версии или html_hash), поэтому сам HTML
+загружается и разбирается только при промахе кеша.
+
+Настройки:
+    HTML_INDEX_CACHE_ENTRIES - сколько индексов хранить в памяти (по умолчанию 64)
+"""
+import html as html_lib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from services.metrics import metrics
+
+HTML_INDEX_CACHE_ENTRIES = int(os.getenv("HTML_INDEX_CACHE_ENTRIES", "64"))
+
+_PARAGRAPH_RE = re.compile(r'<(\w+) data-paragraph-id="(\d+)"[^>]*>(.*?)</\1>', re.DOTALL)
+_HEADING_TAGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+_PAGE_START = '<div class="word-document-page">'
+
+
+class HtmlParagraphIndex:
+    """Смещения параграфов и заголовки в HTML документа"""
+
+    def __init__(self, html: str):
+        self.html = html
+        self.paragraphs = []  # (id, start, end, list) - list: "ul" / "ol" / None
+        self.headings = []
+        self._positions = {}
+
+        page_start = html.find(_PAGE_START)
+        self.head = html[:page_start + len(_PAGE_START)] if page_start >= 0 else ""
+
+        current_list = None
+        previous_end = 0
+        for match in _PARAGRAPH_RE.finditer(html):
+            # Между параграфами могут быть только открывающие и закрывающие теги списков
+            between = html[previous_end:match.start()]
+            if "</ul>" in between or "</ol>" in between:
+                current_list = None
+            if '<ul class="word-list">' in between:
+                current_list = "ul"
+            elif '<ol class="word-list">' in between:
+                current_list = "ol"
+
+            tag, paragraph_id = match.group(1), int(match.group(2))
+            self._positions[paragraph_id] = len(self.paragraphs)
+            self.paragraphs.append((paragraph_id, match.start(), match.end(), current_list if tag == "li" else None))
+
+            if tag in _HEADING_TAGS:
+                text = html_lib.unescape(re.sub(r"<[^>]+>", "", match.group(3))).strip()
+                self.headings.append({"id": paragraph_id, "level": _HEADING_TAGS[tag], "text": text})
+            previous_end = match.end()
+
+    def __len__(self):
+        return len(self.paragraphs)
+
+    def window(self, start: int, end: int):
+        """Параграфы с позициями [start, end) в порядке документа"""
+        return [
+            {"id": paragraph_id, "list": list_tag, "html": self.html[begin:finish]}
+            for paragraph_id, begin, finish, list_tag in self.paragraphs[max(0, start):end]
+        ]
+
+    def section_bounds(self, heading_id: int):
+        """
+        Позиции [start, end) раздела, начинающегося с заголовка heading_id:
+        до следующего заголовка того же или более высокого уровня.
+        Возвращает None, если такого заголовка нет.
+        """
+        for i, heading in enumerate(self.headings):
+            if heading["id"] != heading_id:
+                continue
+            end = len(self.paragraphs)
+            for following in self.headings[i + 1:]:
+                if following["level"] <= heading["level"]:
+                    end = self._positions[following["id"]]
+                    break
+            return self._positions[heading_id], end
+        return None
+
+
+class HtmlIndexCache:
+    """LRU индексов по (отчет, версия, отпечаток HTML)"""
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or HTML_INDEX_CACHE_ENTRIES
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, report_id: int, version: int, fingerprint: str):
+        """Готовый индекс или None"""
+        key = (report_id, version, fingerprint)
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None:
+                self._entries.move_to_end(key)
+                metrics.increment("html_index.hits")
+            return index
+
+    def build(self, report_id: int, version: int, fingerprint: str, html: str) -> HtmlParagraphIndex:
+        """Строит индекс HTML и запоминает его под ключом (отчет, версия, отпечаток)"""
+        metrics.increment("html_index.builds")
+        index = HtmlParagraphIndex(html)
+        with self._lock:
+            self._entries[(report_id, version, fingerprint)] = index
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+html_index_cache = HtmlIndexCache()
@@ -0,0 +1,216 @@
+"""
+Быстрая маршрутизация сообщений чата до обращения к LLM.
+
+Приветствия, вопросы о системе и навигационные вопросы получают готовый
+ответ сразу. Таблица намерений компилируется один раз при загрузке:
+    - точные фразы после нормализации (регистр, ё, пунктуация, пробелы) -
+      словарь, поиск за O(1);
+    - ключевые фразы - префиксное дерево по словам; ищутся как подряд идущие
+      слова в коротких сообщениях (не длиннее INTENT_MAX_WORDS слов), чтобы
+      "привет, проанализируй документ" по-прежнему уходило в LLM. У намерений
+      с "standalone": true (приветствия) остальные слова сообщения должны быть
+      словами-связками или словами самого намерения: "ну привет, бот" - да,
+      "привет, напиши введение" - нет.
+Другие классификаторы подключаются через IntentRouter.add_matcher.
+
+Формат файла намерений (JSON):
+    [{"name": "greeting", "answer": "...", "phrases": ["привет"], "keywords": ["добрый день"], "standalone": true}]
+Намерения из файла заменяют встроенные с тем же именем и дополняют остальные.
+
+Настройки:
+    CHAT_INTENTS_PATH - путь к JSON-файлу намерений (по умолчанию только встроенные)
+    INTENT_MAX_WORDS - максимальная длина сообщения в словах для ключевых фраз (по умолчанию 4)
+"""
+import json
+import os
+import re
+from typing import Callable, Dict, List, Optional
+
+from services.metrics import metrics
+
+CHAT_INTENTS_PATH = os.getenv("CHAT_INTENTS_PATH")
+INTENT_MAX_WORDS = int(os.getenv("INTENT_MAX_WORDS", "4"))
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+# Слова, которые не меняют смысл приветствия
+FILLER_WORDS = frozenset([
+    "ну", "и", "а", "же", "еще", "раз", "снова", "всем", "вам", "тебе", "бот", "ассистент",
+    "эй", "ой", "как", "дела", "там",
+])
+
+GREETING_ANSWER = "Привет! Я ассистент для системы отчетности. Чем могу помочь?"
+
+DEFAULT_INTENTS = [
+    {
+        "name": "greeting",
+        "answer": GREETING_ANSWER,
+        "phrases": ["привет", "здравствуйте", "добрый день", "добрый вечер", "доброе утро"],
+        "keywords": ["привет", "здравствуйте", "добрый день"],
+        "standalone": True,
+    },
+    {
+        "name": "about",
+        "answer": "Это система автоматической отчетности, которая позволяет создавать, редактировать и анализировать отчеты. Здесь вы можете работать с документами, использовать ИИ для анализа данных и автоматизации отчетности.",
+        "phrases": ["что это за сайт", "что это за система", "что это за сервис"],
+        "keywords": ["что это за сайт"],
+    },
+    {
+        "name": "capabilities",
+        "answer": """Я могу помогать вам с различными задачами в системе отчетности:
+    1. Отвечать на вопросы о работе системы
+    2. Помогать в создании и редактировании отчетов
+    3. Предоставлять аналитические данные
+    4. Объяснять функционал различных компонентов
+    5. Предлагать оптимальные решения для ваших отчетов
+    6. Помогать с форматированием документов
+    7. Анализировать загруженные данные
+    8. Создавать шаблоны отчетов
+
+    Просто скажите, с чем конкретно вам нужна помощь.""",
+        "phrases": ["что умеешь", "что ты умеешь", "что ты можешь", "помощь"],
+        "keywords": ["что умеешь", "что ты умеешь"],
+    },
+    {
+        "name": "nav_reports",
+        "answer": "Созданные отчеты находятся в разделе «Отчеты». Новый отчет создается там же кнопкой создания: выберите шаблон, заполните разделы и запустите генерацию.",
+        "phrases": ["где мои отчеты", "как создать отчет", "где отчеты"],
+        "keywords": ["где мои отчеты", "как создать отчет"],
+    },
+    {
+        "name": "nav_documents",
+        "answer": "Документы загружаются в разделе «Документы» или прямо в чате через прикрепление файла. После загрузки документ можно проанализировать в чате.",
+        "phrases": ["как загрузить документ", "где мои документы", "как загрузить файл"],
+        "keywords": ["как загрузить документ", "как загрузить файл"],
+    },
+    {
+        "name": "nav_formatting",
+        "answer": "Оформление настраивается в разделе «Форматирование»: создайте или выберите пресет стилей и укажите его при создании отчета.",
+        "phrases": ["как изменить форматирование", "как настроить форматирование", "где форматирование"],
+        "keywords": ["как изменить форматирование", "как настроить форматирование"],
+    },
+]
+
+
+def normalize(text: str) -> str:
+    """Нижний регистр, ё -> е, пунктуация и лишние пробелы убраны"""
+    text = (text or "").lower().replace("ё", "е")
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+class Intent:
+    __slots__ = ("name", "answer", "phrases", "keywords", "standalone", "own_words")
+
+    def __init__(self, name: str, answer: str, phrases=None, keywords=None, standalone=False):
+        self.name = name
+        self.answer = answer
+        self.phrases = list(phrases or [])
+        self.keywords = list(keywords or [])
+        self.standalone = standalone
+        self.own_words = frozenset(
+            word for text in self.phrases + self.keywords for word in normalize(text).split()
+        )
+
+    def covers(self, words: List[str]) -> bool:
+        """Все слова сообщения - слова намерения или связки (для standalone-намерений)"""
+        return all(word in self.own_words or word in FILLER_WORDS for word in words)
+
+
+class ExactMatcher:
+    """Нормализованная фраза -> намерение"""
+
+    def __init__(self, intents: List[Intent]):
+        self._table = {}
+        for intent in intents:
+            for phrase in intent.phrases:
+                self._table.setdefault(normalize(phrase), intent)
+
+    def __call__(self, text: str, words: List[str]) -> Optional[Intent]:
+        return self._table.get(text)
+
+
+class KeywordTrie:
+    """Префиксное дерево по словам ключевых фраз; находит самую длинную фразу в сообщении"""
+
+    _END = object()
+
+    def __init__(self, intents: List[Intent], max_words: int = None):
+        self.max_words = max_words or INTENT_MAX_WORDS
+        self._root = {}
+        for intent in intents:
+            for keyword in intent.keywords:
+                node = self._root
+                for word in normalize(keyword).split():
+                    node = node.setdefault(word, {})
+                node.setdefault(self._END, intent)
+
+    def __call__(self, text: str, words: List[str]) -> Optional[Intent]:
+        if len(words) > self.max_words:
+            return None
+        best, best_length = None, 0
+        for start in range(len(words)):
+            node = self._root
+            for position in range(start, len(words)):
+                node = node.get(words[position])
+                if node is None:
+                    break
+                intent = node.get(self._END)
+                if intent is not None and position - start + 1 > best_length:
+                    if intent.standalone and not intent.covers(words):
+                        continue
+                    best, best_length = intent, position - start + 1
+        return best
+
+
+class IntentRouter:
+    def __init__(self, intents: List[dict] = None, path: Optional[str] = None, max_words: int = None):
+        self.max_words = max_words or INTENT_MAX_WORDS
+        self._extra_matchers = []
+        self.load(intents if intents is not None else DEFAULT_INTENTS, path)
+
+    def load(self, intents: List[dict], path: Optional[str] = None):
+        """Компилирует таблицу намерений; намерения из файла path заменяют одноименные"""
+        by_name: Dict[str, dict] = {item["name"]: item for item in intents}
+        if path:
+            with open(path, "r", encoding="utf-8") as f:
+                for item in json.load(f):
+                    by_name[item["name"]] = item
+        compiled = [Intent(item["name"], item["answer"], item.get("phrases"), item.get("keywords"),
+                           item.get("standalone", False))
+                    for item in by_name.values()]
+        self.intents = {intent.name: intent for intent in compiled}
+        self._matchers = [ExactMatcher(compiled), KeywordTrie(compiled, self.max_words)]
+
+    def add_matcher(self, matcher: Callable[[str, List[str]], Optional[Intent]]):
+        """
+        Подключает дополнительный классификатор: вызывается с нормализованным
+        текстом и списком слов, возвращает Intent или None. Проверяется после
+        встроенных.
+        """
+        self._extra_matchers.append(matcher)
+
+    def route(self, message: str) -> Optional[Intent]:
+        """Намерение с готовым ответом или None, если сообщение нужно отдать LLM"""
+        text = normalize(message)
+        if not text:
+            return None
+        words = text.split()
+        for matcher in self._matchers + self._extra_matchers:
+            intent = matcher(text, words)
+            if intent is not None:
+                metrics.increment("intent_router.hits")
+                metrics.increment(f"intent_router.hits.{intent.name}")
+                return intent
+        metrics.increment("intent_router.misses")
+        return None
+
+
+def _load_default_router():
+    try:
+        return IntentRouter(path=CHAT_INTENTS_PATH)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Ошибка загрузки намерений чата из {CHAT_INTENTS_PATH}: {str(e)}, используются встроенные")
+        return IntentRouter()
+
+
+intent_router = _load_default_router()
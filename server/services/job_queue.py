@@ -0,0 +1,211 @@
+"""
+Очередь заданий на генерацию отчетов в базе данных.
+
+Задание забирает воркер (см. worker.py) и держит его, пока продлевает
+locked_until. Если воркер упал, по истечении видимости задание снова
+становится доступным и будет повторено (не больше max_attempts раз).
+"""
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, func, and_, or_, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.models import Report, ReportJob
+
+# Сколько секунд задание принадлежит воркеру без продления
+JOB_VISIBILITY_TIMEOUT = float(os.getenv("REPORT_JOB_VISIBILITY_TIMEOUT", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("REPORT_JOB_MAX_ATTEMPTS", "3"))
+# Базовая задержка перед повтором, секунды (растет экспоненциально)
+JOB_RETRY_DELAY = float(os.getenv("REPORT_JOB_RETRY_DELAY", "10"))
+# Сколько отчетов одного пользователя может генерироваться одновременно
+JOB_PER_USER_LIMIT = int(os.getenv("REPORT_JOB_PER_USER_LIMIT", "2"))
+
+# Ключ advisory-блокировки Postgres, сериализующей выбор заданий
+_CLAIM_LOCK_KEY = 7_310_421
+
+
+class JobQueue:
+    def __init__(self, visibility_timeout=None, max_attempts=None, retry_delay=None, per_user_limit=None):
+        self.visibility_timeout = visibility_timeout or JOB_VISIBILITY_TIMEOUT
+        self.max_attempts = max_attempts or JOB_MAX_ATTEMPTS
+        self.retry_delay = JOB_RETRY_DELAY if retry_delay is None else retry_delay
+        self.per_user_limit = per_user_limit or JOB_PER_USER_LIMIT
+
+    async def enqueue(self, db: AsyncSession, report_id: int, user_id: int, payload: dict,
+                      priority: int = 0, commit: bool = True) -> ReportJob:
+        """
+        Ставит отчет в очередь на генерацию. С commit=False задание только
+        добавляется в текущую транзакцию (вместе с отчетом фиксирует вызывающий)
+        """
+        job = ReportJob(
+            report_id=report_id,
+            user_id=user_id,
+            payload=payload,
+            priority=priority,
+            max_attempts=self.max_attempts,
+            run_after=datetime.utcnow(),
+        )
+        db.add(job)
+        if not commit:
+            await db.flush()
+            return job
+        await db.commit()
+        await db.refresh(job)
+        return job
+
+    def _claim_query(self, now):
+        # Пользователи, у которых уже выполняется максимум заданий
+        busy_users = (
+            select(ReportJob.user_id)
+            .where(ReportJob.status == "running", ReportJob.locked_until >= now)
+            .group_by(ReportJob.user_id)
+            .having(func.count(ReportJob.id) >= self.per_user_limit)
+        )
+        return (
+            select(ReportJob)
+            .where(
+                or_(
+                    and_(ReportJob.status == "queued", ReportJob.run_after <= now),
+                    # Воркер не продлил задание вовремя - считаем его упавшим
+                    and_(ReportJob.status == "running", ReportJob.locked_until < now),
+                ),
+                ReportJob.user_id.not_in(busy_users),
+            )
+            .order_by(ReportJob.priority.desc(), ReportJob.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+
+    async def claim(self, db: AsyncSession, worker_id: str) -> Optional[ReportJob]:
+        """Забирает следующее задание для воркера или возвращает None"""
+        while True:
+            now = datetime.utcnow()
+            if db.bind.dialect.name == "postgresql":
+                # Без сериализации два воркера могут одновременно превысить лимит на пользователя
+                await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _CLAIM_LOCK_KEY})
+
+            job = (await db.execute(self._claim_query(now))).scalars().first()
+            if job is None:
+                await db.commit()
+                return None
+
+            if job.attempts >= job.max_attempts:
+                # Задание с истекшей видимостью исчерпало попытки
+                await self._mark_failed(db, job, job.last_error or "Воркер не завершил задание")
+                await db.commit()
+                continue
+
+            job.status = "running"
+            job.attempts += 1
+            job.locked_by = worker_id
+            job.locked_until = now + timedelta(seconds=self.visibility_timeout)
+            job.started_at = job.started_at or now
+
+            report = await db.get(Report, job.report_id)
+            if report:
+                report.status = "generating"
+
+            await db.commit()
+            return job
+
+    async def heartbeat(self, db: AsyncSession, job_id: int, worker_id: str, progress: float = None) -> bool:
+        """Продлевает владение заданием; False - задание уже забрал другой воркер"""
+        job = await db.get(ReportJob, job_id, with_for_update=True, populate_existing=True)
+        if not job or job.status != "running" or job.locked_by != worker_id:
+            await db.rollback()
+            return False
+        job.locked_until = datetime.utcnow() + timedelta(seconds=self.visibility_timeout)
+        if progress is not None:
+            job.progress = progress
+        await db.commit()
+        return True
+
+    async def complete(self, db: AsyncSession, job_id: int, worker_id: str, file_path: str,
+                       html_content: str = None) -> bool:
+        """Отмечает задание выполненным и сохраняет результат (файл и, если есть, HTML) в отчет"""
+        job = await db.get(ReportJob, job_id, with_for_update=True, populate_existing=True)
+        if not job or job.locked_by != worker_id:
+            await db.rollback()
+            return False
+
+        job.status = "completed"
+        job.progress = 1.0
+        job.locked_until = None
+        job.finished_at = datetime.utcnow()
+
+        report = await db.get(Report, job.report_id)
+        if report:
+            report.status = "completed"
+            report.file_path = file_path
+            if html_content is not None:
+                report.html_content = html_content
+
+        await db.commit()
+        return True
+
+    async def fail(self, db: AsyncSession, job_id: int, worker_id: str, error: str) -> Optional[str]:
+        """
+        Возвращает задание в очередь с задержкой или окончательно отмечает ошибку.
+        Возвращает новый статус задания ("queued" или "failed").
+        """
+        job = await db.get(ReportJob, job_id, with_for_update=True, populate_existing=True)
+        if not job or job.locked_by != worker_id:
+            await db.rollback()
+            return None
+
+        job.last_error = error
+        if job.attempts >= job.max_attempts:
+            await self._mark_failed(db, job, error)
+        else:
+            delay = self.retry_delay * (2 ** (job.attempts - 1)) * (0.5 + random.random())
+            job.status = "queued"
+            job.locked_by = None
+            job.locked_until = None
+            job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+
+            report = await db.get(Report, job.report_id)
+            if report:
+                report.status = "pending"
+
+        await db.commit()
+        return job.status
+
+    async def _mark_failed(self, db: AsyncSession, job: ReportJob, error: str):
+        job.status = "failed"
+        job.last_error = error
+        job.locked_by = None
+        job.locked_until = None
+        job.finished_at = datetime.utcnow()
+
+        report = await db.get(Report, job.report_id)
+        if report:
+            report.status = "error"
+
+    async def get_report_job(self, db: AsyncSession, report_id: int) -> Optional[ReportJob]:
+        """Последнее задание по отчету"""
+        stmt = (
+            select(ReportJob)
+            .where(ReportJob.report_id == report_id)
+            .order_by(ReportJob.id.desc())
+            .limit(1)
+        )
+        return (await db.execute(stmt)).scalars().first()
+
+    async def queue_position(self, db: AsyncSession, job: ReportJob) -> Optional[int]:
+        """Сколько заданий в очереди будут взяты раньше этого"""
+        if job.status != "queued":
+            return None
+        stmt = select(func.count(ReportJob.id)).where(
+            ReportJob.status == "queued",
+            or_(
+                ReportJob.priority > job.priority,
+                and_(ReportJob.priority == job.priority, ReportJob.id < job.id),
+            ),
+        )
+        return (await db.execute(stmt)).scalar()
+
+
+job_queue = JobQueue()
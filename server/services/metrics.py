@@ -0,0 +1,67 @@
+import threading
+import time
+
+
+class MetricsRegistry:
+    """
+    Простое хранилище метрик процесса: счетчики и наблюдения (время, размеры).
+
+    Значения доступны через GET /api/metrics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._observations = {}
+        self._started_at = time.time()
+
+    def increment(self, name, value=1):
+        """Увеличивает счетчик"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        """Записывает наблюдение: хранятся количество, сумма, минимум, максимум и последнее значение"""
+        with self._lock:
+            stats = self._observations.get(name)
+            if stats is None:
+                stats = {"count": 0, "sum": 0.0, "min": value, "max": value, "last": value}
+                self._observations[name] = stats
+            stats["count"] += 1
+            stats["sum"] += value
+            stats["min"] = min(stats["min"], value)
+            stats["max"] = max(stats["max"], value)
+            stats["last"] = value
+
+    def get(self, name, default=0):
+        """Текущее значение счетчика"""
+        with self._lock:
+            return self._counters.get(name, default)
+
+    def snapshot(self):
+        """Копия всех метрик для отдачи наружу"""
+        with self._lock:
+            observations = {
+                name: {**stats, "avg": stats["sum"] / stats["count"] if stats["count"] else 0}
+                for name, stats in self._observations.items()
+            }
+            return {
+                "uptime": time.time() - self._started_at,
+                "counters": dict(self._counters),
+                "observations": observations,
+            }
+
+    def take_counters(self):
+        """Возвращает накопленные счетчики и обнуляет их (для передачи из дочерних процессов)"""
+        with self._lock:
+            counters = self._counters
+            self._counters = {}
+            return counters
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._observations.clear()
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,86 @@
+"""
+Курсорная (keyset) пагинация списков.
+
+Страница выбирается условием (sort_column, id) < (значения последней строки
+предыдущей страницы) вместо OFFSET, поэтому время запроса не растет с номером
+страницы и размером аккаунта (при индексе на (user_id, sort_column, id)).
+Курсор - непрозрачная строка base64 с именем поля сортировки и значениями.
+Без limit возвращается страница LIST_PAGE_SIZE; клиент догружает следующие
+по курсору из заголовка X-Next-Cursor.
+
+Поле сортировки должно быть NOT NULL: сравнение (NULL, id) < (...) ложно
+и обход страниц оборвется.
+
+Настройки:
+    LIST_PAGE_SIZE - размер страницы по умолчанию (50)
+    LIST_PAGE_MAX - максимальный размер страницы (200)
+"""
+import base64
+import json
+import os
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import DateTime, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "50"))
+LIST_PAGE_MAX = int(os.getenv("LIST_PAGE_MAX", "200"))
+
+
+def page_size(limit: Optional[int]) -> int:
+    if not limit or limit < 1:
+        return LIST_PAGE_SIZE
+    return min(limit, LIST_PAGE_MAX)
+
+
+def encode_cursor(sort_key: str, value: Any, row_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort_key, value, row_id], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_column) -> Tuple[Any, int]:
+    """Значения (поле сортировки, id) из курсора; ValueError - курсор испорчен или от другой сортировки"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_key, value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        if sort_key != sort_column.key or not isinstance(row_id, int):
+            raise ValueError
+        if isinstance(sort_column.type, DateTime):
+            value = datetime.fromisoformat(value)
+    except (ValueError, TypeError, json.JSONDecodeError):
+        raise ValueError("Неверный курсор страницы")
+    return value, row_id
+
+
+async def paginate(db: AsyncSession, stmt, sort_column, id_column, limit: Optional[int] = None,
+                   cursor: Optional[str] = None, descending: bool = True) -> Tuple[List[Any], Optional[str]]:
+    """
+    Выполняет stmt постранично: возвращает (элементы страницы, курсор следующей
+    страницы или None). Элемент - объект (select(Model)) или строка (select колонок);
+    у него должны быть атрибуты с именами sort_column и id_column.
+    """
+    limit = page_size(limit)
+    if cursor:
+        value, row_id = decode_cursor(cursor, sort_column)
+        key = tuple_(sort_column, id_column)
+        stmt = stmt.where(key < tuple_(value, row_id) if descending else key > tuple_(value, row_id))
+
+    if descending:
+        stmt = stmt.order_by(sort_column.desc(), id_column.desc())
+    else:
+        stmt = stmt.order_by(sort_column.asc(), id_column.asc())
+
+    # Одна лишняя строка показывает, есть ли следующая страница
+    rows = (await db.execute(stmt.limit(limit + 1))).all()
+    items = [row[0] if len(row) == 1 else row for row in rows[:limit]]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(
+            sort_column.key, getattr(last, sort_column.key), getattr(last, id_column.key)
+        )
+    return items, next_cursor
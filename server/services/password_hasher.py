@@ -0,0 +1,68 @@
+"""
+Хеширование и проверка паролей вне цикла событий.
+
+bcrypt намеренно медленный (~100-300 мс на операцию); вызванный прямо в
+async-обработчике он останавливает все запросы процесса. Здесь операции
+выполняются в отдельном пуле потоков (bcrypt отпускает GIL), число
+одновременных операций ограничено размером пула.
+
+Если параметры хеширования изменились (например, BCRYPT_ROUNDS), при
+успешном входе пароль перехешируется с новыми параметрами.
+
+Настройки:
+    BCRYPT_ROUNDS - стоимость bcrypt, log2 числа раундов (по умолчанию 12)
+    PASSWORD_HASH_WORKERS - потоков для хеширования (по умолчанию min(4, число CPU))
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+from services.metrics import metrics
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+class PasswordHasher:
+    def __init__(self, max_workers=None, context=None):
+        self.max_workers = max_workers or PASSWORD_HASH_WORKERS
+        self.context = context or pwd_context
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password-hash")
+
+    async def _run(self, name, fn, *args):
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            metrics.observe(f"password.{name}_time", time.perf_counter() - started)
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", self.context.hash, password)
+
+    async def verify_and_update(self, password: str, password_hash: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """
+        Проверяет пароль. Возвращает (совпал ли, новый хеш или None);
+        новый хеш - если сохраненный создан с устаревшими параметрами.
+        """
+        if not password_hash:
+            return False, None
+        try:
+            valid, new_hash = await self._run("verify", self.context.verify_and_update, password, password_hash)
+        except ValueError:
+            # Сохранено не хешем bcrypt (например, пароль тестового пользователя)
+            return False, None
+        if new_hash:
+            metrics.increment("password.rehashed")
+        return valid, new_hash
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+password_hasher = PasswordHasher()
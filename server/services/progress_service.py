@@ -0,0 +1,79 @@
+"""
+События хода генерации отчетов.
+
+События пишутся в таблицу report_progress_events, поэтому их видят все
+процессы API независимо от того, в каком воркере идет генерация. Внутри
+процесса подписчики SSE будятся сразу, а события других процессов
+подхватываются опросом таблицы.
+"""
+import asyncio
+from typing import Dict, List
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.models import ReportProgressEvent
+
+# События, после которых новых событий по отчету не будет
+TERMINAL_EVENTS = {"report_finished", "report_failed"}
+
+
+class ProgressService:
+    def __init__(self):
+        self._waiters: Dict[int, List[asyncio.Event]] = {}
+
+    async def record(self, db: AsyncSession, report_id: int, event: str, job_id: int = None,
+                     **fields) -> ReportProgressEvent:
+        """Сохраняет событие и будит подписчиков этого отчета"""
+        progress_event = ReportProgressEvent(report_id=report_id, job_id=job_id, event=event, **fields)
+        db.add(progress_event)
+        await db.commit()
+        self._notify(report_id)
+        return progress_event
+
+    async def list_events(self, db: AsyncSession, report_id: int, after_id: int = 0,
+                          limit: int = 200) -> List[ReportProgressEvent]:
+        """События отчета после after_id в порядке появления"""
+        stmt = (
+            select(ReportProgressEvent)
+            .where(ReportProgressEvent.report_id == report_id, ReportProgressEvent.id > after_id)
+            .order_by(ReportProgressEvent.id)
+            .limit(limit)
+        )
+        return (await db.execute(stmt)).scalars().all()
+
+    def _notify(self, report_id: int):
+        for waiter in self._waiters.pop(report_id, []):
+            waiter.set()
+
+    async def wait(self, report_id: int, timeout: float):
+        """Ждет нового события по отчету в этом процессе, но не дольше timeout"""
+        waiter = asyncio.Event()
+        self._waiters.setdefault(report_id, []).append(waiter)
+        try:
+            await asyncio.wait_for(waiter.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            waiters = self._waiters.get(report_id)
+            if waiters and waiter in waiters:
+                waiters.remove(waiter)
+                if not waiters:
+                    del self._waiters[report_id]
+
+
+def serialize_event(event: ReportProgressEvent) -> dict:
+    return {
+        "id": event.id,
+        "event": event.event,
+        "section_index": event.section_index,
+        "section_title": event.section_title,
+        "tokens": event.tokens,
+        "elapsed": event.elapsed,
+        "progress": event.progress,
+        "message": event.message,
+        "created_at": event.created_at,
+    }
+
+
+progress_service = ProgressService()
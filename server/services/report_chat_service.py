@@ -1,20 +1,19 @@
 from typing import Tuple, Dict, Any, Optional, List
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from models.models import Report, Chat, ChatMessage, User
+from models.models import Report, Chat, ChatMessage, ReportJob, User
+from database import load_deferred
 #from services.document_agent_service import DocumentAgentService
 from Agent.SmartDocumentAgent import SmartDocumentAgent
 from services.chat_service import ChatService
-from document_generation.document_service import DocumentService
 from services.document_editor_service import DocumentEditorService
-from generation.generate_text_langchain import generate_text_with_params
+from services.job_queue import job_queue
 
 class ReportChatService:
     """Сервис для интеграции отчетов и чатов"""
     
     def __init__(self):
         self.chat_service = ChatService()
-        self.document_service = DocumentService()
         self.editor_service = DocumentEditorService()
         # Заменяем DocumentAIService на DocumentAgentService
         #self.document_agent_service = DocumentAgentService()
@@ -22,51 +21,38 @@ class ReportChatService:
 
     async def create_report_with_chat(
         self, db: AsyncSession, user_id: int, report_data: Dict[str, Any]
-    ) -> Tuple[Report, Chat]:
-        """Создает отчет и связанный с ним чат"""
-        # Шаг 1: Создаем чат
-        chat = await self.chat_service.create_chat(
-            db, user_id, f"Чат отчета: {report_data['title']}"
-        )
-        
-        # Шаг 2: Генерируем отчет
-        file_path = await self.document_service.generate_report_async(
-            report_data['title'],
-            report_data['sections'],
-            report_data.get('format', 'docx'),
-            report_data.get('formatting_styles')
-        )
-        
-        # Шаг 3: Конвертируем документ в HTML для отображения
-        html_content = await self.editor_service.docx_to_html(file_path)
-        
-        # Шаг 4: Создаем запись отчета в БД, связывая с чатом
-        report = Report(
-            user_id=user_id,
-            title=report_data['title'],
-            template_id=report_data.get('template_id'),
-            format=report_data.get('format', 'docx'),
-            file_path=file_path,
-            chat_id=chat.id,
-            html_content=html_content,
-            status="completed",
-            sections=report_data['sections'],
-            document_version=1,
-            formatting_preset_id=report_data.get('formatting_preset_id')
-        )
-        db.add(report)
-        await db.commit()
-        await db.refresh(report)
-        
-        # Шаг 5: Отправляем приветственное сообщение в чат
-        await self.chat_service.add_message(
-            db, 
-            chat.id, 
-            f"Отчет «{report_data['title']}» создан! Я могу помочь вам с редактированием. Вы можете выделить текст в документе и попросить меня внести изменения.", 
-            role="assistant"
-        )
-        
-        return report, chat
+    ) -> Tuple[Report, Chat, ReportJob]:
+        """
+        Создает чат, отчет и задание на генерацию одной транзакцией. Документ
+        генерирует и конвертирует в HTML воркер очереди (worker.py), он же
+        пишет в чат приветственное сообщение.
+        """
+        async with db.begin():
+            chat = Chat(user_id=user_id, title=f"Чат отчета: {report_data['title']}")
+            db.add(chat)
+            await db.flush()
+
+            report = Report(
+                user_id=user_id,
+                title=report_data['title'],
+                template_id=report_data.get('template_id'),
+                format=report_data.get('format', 'docx'),
+                file_path="",
+                chat_id=chat.id,
+                status="pending",
+                sections=report_data['sections'],
+                document_version=1,
+                formatting_preset_id=report_data.get('formatting_preset_id')
+            )
+            db.add(report)
+            await db.flush()
+
+            job = await job_queue.enqueue(
+                db, report.id, user_id, {**report_data, "chat_id": chat.id},
+                priority=report_data.get('priority', 0), commit=False,
+            )
+
+        return report, chat, job
     
     async def process_edit_command(
             self, db: AsyncSession, report_id: int, chat_id: int, user_id: int, command_text: str
@@ -177,6 +163,7 @@ class ReportChatService:
         )
         
         # Конвертируем документ в HTML, если это еще не сделано
+        await load_deferred(db, report, "html_content")
         if not report.html_content:
             html_content = await self.editor_service.docx_to_html(report.file_path)
             report.html_content = html_content
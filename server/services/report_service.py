@@ -5,6 +5,7 @@ from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.enum.section import WD_SECTION
 import os
 from generation.generate_text_langchain import generate_text, generate_text_with_params
+from generation.context_compactor import ContextCompactor, ReportContextStats
 
 class GostStyle:
     """GOST document styling configuration"""
@@ -78,6 +79,8 @@ class WordDocumentGenerator:
         """Add a section with AI-generated content"""
         self.document.add_heading(section_title, level=heading_level)
         
+        # Без кеша: перегенерация раздела должна давать новый текст
+        generation_params.setdefault("use_cache", False)
         generated_content = generate_text_with_params(prompt, **generation_params)
         
         self.document.add_paragraph(generated_content)
@@ -111,17 +114,20 @@ def generate_report_document(title, sections, output_path, gost_type=None):
     generator = WordDocumentGenerator(gost_style)
     generator.add_title(title)
 
+    compactor = ContextCompactor()
+    stats = ReportContextStats()
     previous_content = []
+    previous_digests = []
 
     for i, section in enumerate(sections):
-        # Create a context-aware prompt by including previous section content
+        # Create a context-aware prompt from compacted digests of previous sections
         context_prompt = section["prompt"]
         
-        if i > 0 and previous_content:
-            # Add context from previous sections
-            context = "\n\n".join(previous_content)
+        if i > 0 and previous_digests:
+            context = compactor.build_context(previous_digests)
+            stats.add("\n\n".join(previous_content), context)
             context_prompt = f"""
-            Предыдущие разделы содержали следующее содержание:
+            Краткое содержание предыдущих разделов:
             ---
             {context}
             ---
@@ -139,7 +145,9 @@ def generate_report_document(title, sections, output_path, gost_type=None):
         
         # Store generated content for context in subsequent sections
         previous_content.append(f"Section {i+1} - {section['title']}: {content}")
+        previous_digests.append((section['title'], compactor.make_digest(content)))
 
+    stats.record(title)
     generator.save(output_path)
 
 if __name__ == "__main__":
@@ -0,0 +1,18 @@
+import json
+
+# Заголовки для потоковых ответов: отключаем кеширование и буферизацию в прокси (nginx)
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+def sse_event(event, data, event_id=None):
+    """Форматирует событие Server-Sent Events с JSON-данными"""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {event}\ndata: {payload}\n\n"
+
+
+# Комментарий SSE: поддерживает соединение, клиент его игнорирует
+SSE_KEEPALIVE = ": keepalive\n\n"
@@ -0,0 +1,174 @@
+"""
+Хранилище версий отчетов.
+
+Метаданные версий лежат в report_versions, HTML - в html_blobs: сжат zlib и
+адресуется sha256 содержимого, поэтому одинаковый HTML (например, версия,
+созданная вручную без правок, или восстановленная) хранится один раз.
+HTML версии загружается только когда он действительно нужен.
+
+Раньше каждая версия с полным HTML дописывалась в JSON-колонку
+Report.version_history; такие записи переносятся сюда при первом обращении.
+"""
+import hashlib
+import zlib
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import load_deferred
+from models.models import Report, ReportVersion, HtmlBlob
+from services.metrics import metrics
+
+
+def html_hash(html: str) -> str:
+    return hashlib.sha256(html.encode("utf-8")).hexdigest()
+
+
+class VersionStore:
+    async def put_html(self, db: AsyncSession, html: Optional[str]) -> Optional[str]:
+        """Сохраняет HTML (если такого еще нет) и возвращает его хеш"""
+        if not html:
+            return None
+        key = html_hash(html)
+        if await db.get(HtmlBlob, key) is None and await self._insert_blob(db, key, html):
+            metrics.increment("version_store.blobs_written")
+        else:
+            metrics.increment("version_store.blobs_deduplicated")
+        return key
+
+    async def _insert_blob(self, db: AsyncSession, key: str, html: str) -> bool:
+        """
+        Вставляет блоб; если его уже записала другая сессия, конфликт по хешу
+        не считается ошибкой. Возвращает True, если запись добавлена этой вставкой.
+        """
+        raw = html.encode("utf-8")
+        data = zlib.compress(raw, 6)
+        values = {"hash": key, "data": data, "size": len(raw), "compressed_size": len(data)}
+
+        dialect = db.get_bind().dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+            result = await db.execute(insert(HtmlBlob).values(**values).on_conflict_do_nothing(index_elements=["hash"]))
+            return result.rowcount == 1
+
+        try:
+            async with db.begin_nested():
+                db.add(HtmlBlob(**values))
+        except IntegrityError:
+            return False
+        return True
+
+    async def get_html(self, db: AsyncSession, key: Optional[str]) -> Optional[str]:
+        if not key:
+            return None
+        data = (await db.execute(select(HtmlBlob.data).where(HtmlBlob.hash == key))).scalar()
+        if data is None:
+            return None
+        return zlib.decompress(data).decode("utf-8")
+
+    async def list_versions(self, db: AsyncSession, report_id: int) -> List[ReportVersion]:
+        """Метаданные всех версий отчета по возрастанию номера"""
+        stmt = (
+            select(ReportVersion)
+            .where(ReportVersion.report_id == report_id)
+            .order_by(ReportVersion.version)
+        )
+        return list((await db.execute(stmt)).scalars())
+
+    async def get_version(self, db: AsyncSession, report_id: int, version: int) -> Optional[ReportVersion]:
+        stmt = select(ReportVersion).where(
+            ReportVersion.report_id == report_id, ReportVersion.version == version
+        )
+        return (await db.execute(stmt)).scalars().first()
+
+    async def count_versions(self, db: AsyncSession, report_id: int) -> int:
+        stmt = select(func.count(ReportVersion.id)).where(ReportVersion.report_id == report_id)
+        return (await db.execute(stmt)).scalar()
+
+    async def add_version(self, db: AsyncSession, report_id: int, version: int, description: str,
+                          edit_description: str, file_path: str, html: Optional[str] = None,
+                          html_key: Optional[str] = None, created_at: Optional[datetime] = None) -> ReportVersion:
+        """Добавляет версию; html_key - хеш уже сохраненного HTML (тогда html не нужен)"""
+        entry = ReportVersion(
+            report_id=report_id,
+            version=version,
+            description=description,
+            edit_description=edit_description,
+            file_path=file_path,
+            html_hash=html_key or await self.put_html(db, html),
+            created_at=created_at or datetime.utcnow(),
+        )
+        db.add(entry)
+        await db.flush()
+        return entry
+
+    async def ensure_current_version(self, db: AsyncSession, report: Report, description: str,
+                                     edit_description: str) -> bool:
+        """
+        Переносит устаревшую историю из report.version_history и добавляет
+        текущее состояние отчета, если его версии еще нет в хранилище.
+        Возвращает True, если что-то было записано (нужен commit).
+        """
+        changed = await self._migrate_legacy_history(db, report)
+        if await self.get_version(db, report.id, report.document_version) is None:
+            await load_deferred(db, report, "html_content")
+            await self.add_version(
+                db, report.id, report.document_version, description, edit_description,
+                report.file_path, report.html_content,
+            )
+            changed = True
+        return changed
+
+    async def _migrate_legacy_history(self, db: AsyncSession, report: Report) -> bool:
+        await load_deferred(db, report, "version_history")
+        legacy = report.version_history
+        if not legacy:
+            return False
+
+        existing = {v.version for v in await self.list_versions(db, report.id)}
+        for entry in legacy:
+            version = entry.get("version")
+            if version is None or version in existing:
+                continue
+            timestamp = entry.get("timestamp")
+            await self.add_version(
+                db, report.id, version,
+                entry.get("description"), entry.get("edit_description"), entry.get("file_path"),
+                entry.get("html_content"),
+                created_at=datetime.fromisoformat(timestamp) if timestamp else None,
+            )
+            existing.add(version)
+
+        # В строке отчета больше не храним историю
+        report.version_history = None
+        metrics.increment("version_store.legacy_migrated")
+        return True
+
+    async def storage_stats(self, db: AsyncSession, report_id: int) -> dict:
+        """
+        Сколько байт HTML занимают версии отчета: в виде полных копий (как
+        в прежнем JSON) и в хранилище (уникальные сжатые блобы)
+        """
+        referenced = (await db.execute(
+            select(func.coalesce(func.sum(HtmlBlob.size), 0))
+            .join(ReportVersion, ReportVersion.html_hash == HtmlBlob.hash)
+            .where(ReportVersion.report_id == report_id)
+        )).scalar()
+        unique_keys = (
+            select(ReportVersion.html_hash)
+            .where(ReportVersion.report_id == report_id)
+            .distinct()
+        )
+        stored = (await db.execute(
+            select(func.coalesce(func.sum(HtmlBlob.compressed_size), 0))
+            .where(HtmlBlob.hash.in_(unique_keys))
+        )).scalar()
+        return {"html_bytes": referenced, "stored_bytes": stored}
+
+
+version_store = VersionStore()
@@ -0,0 +1,75 @@
+import os
+import socket
+import sys
+import threading
+import time
+
+import pytest
+import pytest_asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="session")
+def gigachat_stub():
+    """Поднимает локальную заглушку GigaChat API в отдельном потоке"""
+    import uvicorn
+    from generation.stub_server import app
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    yield {
+        "app": app,
+        "base_url": f"http://127.0.0.1:{port}/api/v1",
+        "auth_url": f"http://127.0.0.1:{port}/api/v2/oauth",
+    }
+
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+@pytest_asyncio.fixture
+async def stub_llm(gigachat_stub):
+    """Направляет общий клиент GigaChat в заглушку на время теста"""
+    import base64
+    from generation.langChainGiga import client_manager
+    from generation.response_cache import response_cache
+
+    saved = (client_manager.credentials, client_manager.base_url, client_manager.auth_url)
+    client_manager.credentials = base64.b64encode(b"stub:stub").decode()
+    client_manager.base_url = gigachat_stub["base_url"]
+    client_manager.auth_url = gigachat_stub["auth_url"]
+    await client_manager.aclose()
+    response_cache.clear()
+
+    yield gigachat_stub
+
+    await client_manager.aclose()
+    client_manager.credentials, client_manager.base_url, client_manager.auth_url = saved
+
+
+@pytest_asyncio.fixture
+async def db_sessionmaker(tmp_path):
+    """Отдельная база SQLite со схемой моделей для тестов сервисов"""
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    from models.models import Base
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    yield sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+    await engine.dispose()
@@ -0,0 +1,41 @@
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from routes.user import get_current_user
+from services.auth_cache import Principal, PrincipalCache, principal_cache
+
+
+# Тест кеша токенов: TTL, срок действия токена, сброс по пользователю, общий SQLite
+def test_principal_cache_expiry_and_invalidation(tmp_path):
+    path = str(tmp_path / "auth.db")
+    cache = PrincipalCache(ttl=60, path=path, enabled=True)
+    alice, bob = Principal(1, "alice", "a@example.com"), Principal(2, "bob", "b@example.com")
+
+    cache.set("token-a1", alice)
+    cache.set("token-a2", alice)
+    cache.set("token-b", bob, token_expires_at=time.time() - 1)
+    assert cache.get("token-a1").username == "alice"
+    assert cache.get("token-b") is None
+
+    # Другой процесс с тем же файлом видит запись
+    other = PrincipalCache(ttl=60, path=path, enabled=True)
+    assert other.get("token-a2").email == "a@example.com"
+
+    cache.invalidate_user(1)
+    assert cache.get("token-a1") is None and cache.get("token-a2") is None
+    assert PrincipalCache(ttl=60, path=path, enabled=True).get("token-a1") is None
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_uses_cache():
+    principal_cache.set("cached-token", Principal(7, "carol", "c@example.com"))
+    try:
+        assert (await get_current_user("cached-token")).id == 7
+    finally:
+        principal_cache.invalidate_user(7)
+
+    with pytest.raises(HTTPException) as error:
+        await get_current_user("not-a-jwt")
+    assert error.value.status_code == 401
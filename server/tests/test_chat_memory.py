@@ -0,0 +1,72 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+
+from models.models import Chat, ChatMessage
+from services.chat_memory import ChatMemory
+
+
+# Тест упаковки: длинное сообщение обрезается, старые вытесняются бюджетом
+def test_pack_respects_token_budget():
+    memory = ChatMemory(token_budget=120, message_tokens=50)
+    messages = [ChatMessage(id=i, role="user" if i % 2 else "assistant", content=f"сообщение {i}")
+                for i in range(1, 11)]
+    messages[-1].content = "очень длинное " * 200
+
+    context = memory.pack("ранее обсуждали отчет", messages)
+    assert context.messages[-1] is messages[-1] and len(context.lines[-1]) < 260
+    assert context.summary_tokens + context.history_tokens <= 120
+    assert context.dropped == messages[:len(messages) - len(context.messages)] and context.dropped
+    assert context.render().startswith("\n- Краткое содержание более ранней переписки: ранее обсуждали отчет")
+
+
+# Тест обновления содержания: вытесненные сообщения сжимаются, чат не поднимается в списке
+@pytest.mark.asyncio
+async def test_refresh_summary(db_sessionmaker, stub_llm):
+    memory = ChatMemory(token_budget=60, min_messages=2, session_factory=db_sessionmaker)
+    updated_at = datetime(2024, 1, 1)
+    async with db_sessionmaker() as db:
+        chat = Chat(user_id=1, title="Память", updated_at=updated_at)
+        db.add(chat)
+        await db.flush()
+        for i in range(12):
+            db.add(ChatMessage(chat_id=chat.id, role="user" if i % 2 == 0 else "assistant",
+                               content=f"Сообщение номер {i} про квартальный отчет"))
+        await db.commit()
+
+        context = memory.pack(chat.summary, await memory.load(db, chat))
+        assert len(context.dropped) >= 2
+        upto_id = context.dropped[-1].id
+
+    assert await memory.refresh_summary(chat.id, upto_id)
+    assert not await memory.refresh_summary(chat.id, upto_id)
+
+    async with db_sessionmaker() as db:
+        row = (await db.execute(select(Chat.summary, Chat.summary_message_id, Chat.updated_at))).one()
+        assert row.summary and row.summary_message_id == upto_id and row.updated_at == updated_at
+        chat = await db.get(Chat, chat.id)
+        assert all(msg.id > upto_id for msg in await memory.load(db, chat))
+
+
+# Тест окна: короткие сообщения помещаются в бюджет, но более ранние, чем окно, все равно сжимаются
+@pytest.mark.asyncio
+async def test_messages_before_window_are_summarized(db_sessionmaker, stub_llm):
+    memory = ChatMemory(window=5, min_messages=2, batch=3, session_factory=db_sessionmaker)
+    async with db_sessionmaker() as db:
+        chat = Chat(user_id=1, title="Окно")
+        db.add(chat)
+        await db.flush()
+        for i in range(12):
+            db.add(ChatMessage(chat_id=chat.id, role="user" if i % 2 == 0 else "assistant", content=f"Коротко {i}"))
+        await db.commit()
+
+        loaded = await memory.load(db, chat)
+        context = memory.pack(chat.summary, loaded)
+        assert not context.dropped
+        await memory.maybe_refresh(db, chat, loaded, context)
+        await asyncio.gather(*memory._tasks)
+
+        await db.refresh(chat)
+        assert chat.summary and chat.summary_message_id == loaded[0].id - 1
@@ -0,0 +1,36 @@
+import pytest
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from database import MeteredPool, engine_options, pool_status
+from services.metrics import metrics
+
+
+def test_engine_options_by_backend():
+    options = engine_options("postgresql+asyncpg://user:pass@db/reports")
+    assert options["poolclass"] is MeteredPool and options["echo"] is False
+    assert "prepared_statement_cache_size" in options["connect_args"]
+    assert "pool_size" not in engine_options("sqlite+aiosqlite:///reports.db")
+
+
+# Тест метрик пула: занятые соединения, время получения и тайм-аут ожидания
+@pytest.mark.asyncio
+async def test_pool_metrics(tmp_path):
+    metrics.reset()
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        poolclass=MeteredPool, pool_size=1, max_overflow=0, pool_timeout=0.1,
+    )
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+        assert pool_status(engine)["checked_out"] == 1
+        with pytest.raises(exc.TimeoutError):
+            async with engine.connect():
+                pass
+    assert pool_status(engine)["checked_out"] == 0
+    await engine.dispose()
+
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"]["db.pool.timeouts"] == 1
+    assert snapshot["observations"]["db.pool.acquire_time"]["max"] >= 0.1
+    assert snapshot["observations"]["db.pool.checked_out"]["max"] == 1
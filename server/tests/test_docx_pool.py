@@ -0,0 +1,33 @@
+import pytest
+from docx import Document
+
+from services.docx_pool import DocxProcessPool, extract_docx_text
+from services.document_editor_service import edit_docx
+
+
+def _make_docx(path, paragraphs):
+    doc = Document()
+    for text in paragraphs:
+        doc.add_paragraph(text)
+    doc.save(path)
+    return str(path)
+
+
+@pytest.mark.asyncio
+async def test_edit_runs_in_process_pool(tmp_path):
+    source = _make_docx(tmp_path / "source.docx", ["Первый абзац", "Второй абзац"])
+    target = str(tmp_path / "edited.docx")
+    pool = DocxProcessPool(max_workers=1)
+    try:
+        outcome = await pool.run(
+            edit_docx, source,
+            {"command": "replace_text", "oldText": "Второй", "newText": "Новый"},
+            target,
+        )
+        assert outcome["result"]["success"]
+        assert "Новый абзац" in outcome["html_content"]
+        assert await pool.run(extract_docx_text, target) == "Первый абзац\n\nНовый абзац"
+        # Исходный файл не меняется
+        assert await pool.run(extract_docx_text, source) == "Первый абзац\n\nВторой абзац"
+    finally:
+        pool.shutdown()
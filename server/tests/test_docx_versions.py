@@ -0,0 +1,50 @@
+import os
+
+import pytest
+from docx import Document
+
+from services.docx_version_store import DocxVersionStore
+
+
+def _texts(path):
+    return [p.text for p in Document(path).paragraphs]
+
+
+# Тест сборки версий из снимков и дельт после удаления рабочих копий
+@pytest.mark.asyncio
+async def test_versions_are_rebuilt_from_snapshots_and_deltas(tmp_path):
+    store = DocxVersionStore(root=str(tmp_path / "versions"), snapshot_interval=3, cache_size=2)
+
+    doc = Document()
+    for i in range(200):
+        doc.add_paragraph(f"Абзац {i}. " + "Текст отчета. " * 10)
+    path = str(tmp_path / "report.docx")
+    doc.save(path)
+
+    expected = {1: _texts(path)}
+    for version in range(2, 8):
+        doc.paragraphs[version].text = f"Правка {version}"
+        new_path = str(tmp_path / f"report_v{version}.docx")
+        doc.save(new_path)
+        expected[version] = _texts(new_path)
+        await store.record(1, version, new_path, version - 1, path)
+        # До фиксации версии в БД рабочая копия прежней остается на месте
+        assert os.path.exists(path)
+        store.prune_working_copy(1, version - 1, path, new_path)
+        path = new_path
+
+    # Рабочие копии прежних версий удалены, осталась только текущая
+    assert sorted(os.listdir(tmp_path)) == ["report_v7.docx", "versions"]
+
+    for version, texts in expected.items():
+        assert _texts(await store.get_path(1, version, str(tmp_path / "missing.docx"))) == texts
+
+    stats = store.storage_stats(1)
+    assert stats["versions"] == 7
+    assert 1 < stats["snapshots"] < 7
+    assert stats["saved_ratio"] > 0.5
+    # В кеше собранных версий не больше cache_size файлов
+    assert len(os.listdir(tmp_path / "versions" / "1" / "cache")) == 2
+
+    store.remove_report(1)
+    assert os.listdir(tmp_path / "versions") == []
@@ -0,0 +1,59 @@
+import base64
+import pytest
+from langchain_core.messages import HumanMessage
+
+from generation.langChainGiga import GigaChatClientManager
+
+CREDENTIALS = base64.b64encode(b"stub:stub").decode()
+
+
+def make_manager(stub, **kwargs):
+    return GigaChatClientManager(
+        credentials=CREDENTIALS,
+        base_url=stub["base_url"],
+        auth_url=stub["auth_url"],
+        **kwargs,
+    )
+
+
+# Тест повторного использования клиента и токена
+@pytest.mark.asyncio
+async def test_client_and_token_are_reused(gigachat_stub):
+    stats = gigachat_stub["app"].state.stats
+    manager = make_manager(gigachat_stub)
+    auth_before = stats["auth_requests"]
+
+    client = manager.get_client()
+    for _ in range(3):
+        response = await manager.ainvoke([HumanMessage(content="Привет")])
+        assert "Привет" in response.content
+
+    assert manager.get_client() is client
+    assert stats["auth_requests"] - auth_before == 1
+    await manager.aclose()
+
+
+# Тест заблаговременного обновления токена
+@pytest.mark.asyncio
+async def test_token_is_refreshed_before_expiry(gigachat_stub):
+    app = gigachat_stub["app"]
+    stats = app.state.stats
+    old_ttl = app.state.token_ttl
+    app.state.token_ttl = 30
+    try:
+        # Запас больше времени жизни токена - каждый вызов должен обновлять токен заранее
+        manager = make_manager(gigachat_stub, refresh_margin=60)
+        auth_before = stats["auth_requests"]
+        await manager.ainvoke([HumanMessage(content="1")])
+        await manager.ainvoke([HumanMessage(content="2")])
+        assert stats["auth_requests"] - auth_before == 2
+        await manager.aclose()
+    finally:
+        app.state.token_ttl = old_ttl
+
+
+# Тест синхронного вызова через общий клиент
+def test_sync_invoke(gigachat_stub):
+    manager = make_manager(gigachat_stub)
+    response = manager.invoke([HumanMessage(content="Синхронный запрос")])
+    assert "Синхронный запрос" in response.content
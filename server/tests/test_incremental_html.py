@@ -0,0 +1,244 @@
+import asyncio
+import threading
+from functools import partial
+from unittest.mock import patch
+
+import httpx
+import pytest
+from docx import Document
+from fastapi import FastAPI
+
+from services.document_editor_service import convert_docx_to_html, edit_docx
+
+
+def _make_report(path):
+    doc = Document()
+    doc.add_heading("Введение", level=1)
+    doc.add_paragraph("Первый абзац отчета.")
+    doc.add_paragraph("- пункт списка")
+    doc.add_paragraph("Второй абзац с важным текстом.")
+    doc.save(path)
+    return str(path)
+
+
+def test_edit_patches_only_changed_paragraphs(tmp_path):
+    source = _make_report(tmp_path / "report.docx")
+    html = convert_docx_to_html(source)
+
+    target = str(tmp_path / "report_v2.docx")
+    outcome = edit_docx(
+        source,
+        {"command": "format_text", "text": "важным", "style": "bold", "paragraphId": 3},
+        target,
+        html,
+    )
+
+    assert outcome["result"]["success"]
+    assert outcome["html_mode"] == "patch"
+    # Результат совпадает с полной конвертацией новой версии
+    assert outcome["html_content"] == convert_docx_to_html(target)
+
+
+def test_structural_edit_falls_back_to_full_conversion(tmp_path):
+    source = _make_report(tmp_path / "report.docx")
+    html = convert_docx_to_html(source)
+
+    target = str(tmp_path / "report_v2.docx")
+    outcome = edit_docx(
+        source,
+        {"command": "add_paragraph", "text": "Новый абзац", "afterParagraphId": 1},
+        target,
+        html,
+    )
+
+    assert outcome["result"]["success"]
+    assert outcome["html_mode"] == "full"
+    assert 'data-paragraph-id="4"' in outcome["html_content"]
+
+
+def test_fragment_cache_reuses_unchanged_paragraphs(tmp_path):
+    from services.html_fragment_cache import fragment_cache
+    from services.metrics import metrics
+
+    source = _make_report(tmp_path / "report.docx")
+    fragment_cache.clear()
+    fragment_cache.enabled = False
+    try:
+        expected = convert_docx_to_html(source)
+    finally:
+        fragment_cache.enabled = True
+
+    hits = metrics.get("html_fragment_cache.hits")
+    assert convert_docx_to_html(source) == expected
+    # Повторная конвертация (например, другой версии) берет все параграфы из кеша
+    assert convert_docx_to_html(source) == expected
+    assert metrics.get("html_fragment_cache.hits") - hits == 4
+
+
+def test_iter_html_sends_css_first(tmp_path):
+    from services.docx_html_converter import WordToHtmlConverter
+
+    source = _make_report(tmp_path / "report.docx")
+    chunks = list(WordToHtmlConverter().iter_html(source, chunk_size=100))
+
+    assert chunks[0].rstrip().endswith('<div class="word-document-page">')
+    assert "</style>" in chunks[0]
+    assert len(chunks) > 2
+    assert "".join(chunks) == convert_docx_to_html(source)
+
+
+def _editor_app(db_sessionmaker):
+    # Маршруты редактора с тестовой БД и пользователем 1
+    from database import get_db
+    from routes import report_editor
+    from routes.user import get_current_user
+    from services.auth_cache import Principal
+
+    async def override_db():
+        async with db_sessionmaker() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(report_editor.router)
+    app.dependency_overrides[get_db] = override_db
+    app.dependency_overrides[get_current_user] = lambda: Principal(1, "user", "user@example.com")
+    return app
+
+
+def _gated_write(gate, docx_path, out_path):
+    # Как write_docx_html, но после заголовка ждет, пока клиент его получит
+    from services.docx_html_converter import WordToHtmlConverter
+
+    with open(out_path, "w", encoding="utf-8") as f:
+        for i, chunk in enumerate(WordToHtmlConverter().iter_html(docx_path, chunk_size=100)):
+            f.write(chunk)
+            f.flush()
+            if i == 0:
+                assert gate.wait(10)
+
+
+# Тест потоковой отдачи HTML: заголовок с CSS приходит до окончания конвертации
+@pytest.mark.asyncio
+async def test_stream_endpoint_sends_head_before_conversion_ends(tmp_path, db_sessionmaker):
+    from models.models import Report
+    from routes import report_editor
+    from services.docx_pool import docx_pool
+
+    source = _make_report(tmp_path / "report.docx")
+    async with db_sessionmaker() as db:
+        report = Report(user_id=1, title="Поток", format="docx", sections=[], file_path=source, status="completed")
+        db.add(report)
+        await db.commit()
+
+    app = _editor_app(db_sessionmaker)
+
+    # httpx.ASGITransport собирает ответ целиком, поэтому части принимаем сами
+    gate = threading.Event()
+    bodies, head_before_end = [], []
+    requests = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        # Клиент не отключается до конца ответа
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            if not bodies:
+                head_before_end.append(not gate.is_set())
+                gate.set()
+            bodies.append(message["body"])
+
+    path = f"/report-editor/reports/{report.id}/html/stream"
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [], "server": ("test", 80), "client": ("test", 1),
+    }
+    with patch.object(docx_pool, "max_workers", 0), \
+            patch.object(report_editor, "write_docx_html", partial(_gated_write, gate)):
+        await asyncio.wait_for(app(scope, receive, send), 30)
+
+    assert head_before_end == [True]
+    assert b"</style>" in bodies[0] and b"</html>" not in bodies[0]
+    assert b"".join(bodies).decode("utf-8") == convert_docx_to_html(source)
+
+
+# Тест кеша индекса: повторные outline/window не читают HTML, новая версия строит индекс заново
+@pytest.mark.asyncio
+async def test_html_index_routes_load_html_only_on_miss(tmp_path, db_sessionmaker):
+    from models.models import Report
+    from routes import report_editor
+
+    source = _make_report(tmp_path / "report.docx")
+    async with db_sessionmaker() as db:
+        report = Report(user_id=1, title="Окна", format="docx", sections=[], file_path=source,
+                        status="completed", html_content=convert_docx_to_html(source))
+        db.add(report)
+        await db.commit()
+
+    loads = []
+    load_report_html = report_editor._load_report_html
+
+    async def counting_load(*args):
+        loads.append(args[1])
+        return await load_report_html(*args)
+
+    base = f"/report-editor/reports/{report.id}/html"
+    transport = httpx.ASGITransport(app=_editor_app(db_sessionmaker))
+    with patch.object(report_editor, "_load_report_html", counting_load):
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            outline = (await client.get(f"{base}/outline")).json()
+            window = (await client.get(f"{base}/window", params={"start": 1, "end": 3})).json()
+            section = (await client.get(f"{base}/window", params={"heading": 0})).json()
+            assert len(loads) == 1
+
+            # Новая версия - другой файл: индекс строится по новому HTML
+            doc = Document(source)
+            doc.add_paragraph("Новый абзац")
+            target = str(tmp_path / "report_v2.docx")
+            doc.save(target)
+            async with db_sessionmaker() as db:
+                stored = await db.get(Report, report.id)
+                stored.document_version, stored.file_path = 2, target
+                stored.html_content = convert_docx_to_html(target)
+                await db.commit()
+            updated = (await client.get(f"{base}/outline")).json()
+
+    assert outline["version"] == 1 and outline["paragraph_count"] == 4
+    assert outline["headings"] == [{"id": 0, "level": 1, "text": "Введение"}]
+    assert [p["id"] for p in window["paragraphs"]] == [1, 2] and window["total"] == 4
+    assert section["start"] == 0 and section["end"] == 4
+    assert len(loads) == 2 and updated["version"] == 2 and updated["paragraph_count"] == 5
+
+
+def test_paragraph_index_windows_and_sections(tmp_path):
+    from services.html_index import HtmlParagraphIndex
+
+    doc = Document()
+    doc.add_heading("Введение", level=1)
+    doc.add_paragraph("- пункт списка")
+    doc.add_heading("Детали", level=2)
+    doc.add_paragraph("Текст <раздела> & детали")
+    doc.add_heading("Заключение", level=1)
+    doc.add_paragraph("Итог")
+    source = str(tmp_path / "report.docx")
+    doc.save(source)
+
+    index = HtmlParagraphIndex(convert_docx_to_html(source))
+
+    assert len(index) == 6
+    assert index.head.endswith('<div class="word-document-page">')
+    assert [(h["id"], h["level"], h["text"]) for h in index.headings] == [
+        (0, 1, "Введение"), (2, 2, "Детали"), (4, 1, "Заключение"),
+    ]
+    window = index.window(1, 4)
+    assert [p["id"] for p in window] == [1, 2, 3]
+    assert window[0]["list"] == "ul" and window[0]["html"].startswith("<li")
+    assert "&lt;раздела&gt;" in window[2]["html"]
+    # Раздел первого уровня включает вложенные подразделы
+    assert index.section_bounds(0) == (0, 4)
+    assert index.section_bounds(2) == (2, 4)
+    assert index.section_bounds(4) == (4, 6)
+    assert index.section_bounds(1) is None
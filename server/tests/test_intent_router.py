@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from models.models import Chat
+from services.chat_service import ChatService
+from services.intent_router import GREETING_ANSWER, Intent, IntentRouter
+from services.metrics import metrics
+
+
+# Тест маршрутизации: точные фразы, ключевые фразы в коротких сообщениях, длинные - в LLM
+def test_route_exact_keywords_and_misses(tmp_path):
+    router = IntentRouter()
+    assert router.route("  Привет!!! ").name == "greeting"
+    assert router.route("Что ты умеешь?").name == "capabilities"
+    assert router.route("ну привет, бот").name == "greeting"
+    assert router.route("подскажи, где мои отчеты?").name == "nav_reports"
+    assert router.route("привет, проанализируй загруженный документ и сделай выводы") is None
+    assert router.route("привет, напиши введение") is None
+    assert router.route("здравствуйте, удали таблицу") is None
+    assert router.route("Привет, как дела?").name == "greeting"
+    assert router.route("") is None
+
+    path = tmp_path / "intents.json"
+    path.write_text(json.dumps([
+        {"name": "greeting", "answer": "Здравствуйте!", "phrases": ["привет"]},
+        {"name": "pricing", "answer": "Система бесплатна.", "phrases": ["сколько стоит"], "keywords": ["цена"]},
+    ], ensure_ascii=False), encoding="utf-8")
+    router = IntentRouter(path=str(path))
+    assert router.route("привет").answer == "Здравствуйте!"
+    assert router.route("какая цена").name == "pricing"
+    assert router.route("что это за сайт").name == "about"
+
+    router.add_matcher(lambda text, words: Intent("thanks", "Пожалуйста!") if "спасибо" in words else None)
+    assert router.route("большое спасибо за помощь и отличные отчеты").name == "thanks"
+
+
+# Тест ответа в чате: распознанное намерение отвечается без вызова LLM
+@pytest.mark.asyncio
+async def test_chat_reply_skips_llm_for_intent(db_sessionmaker):
+    avoided = metrics.get("chat.llm_calls_avoided")
+    async with db_sessionmaker() as db:
+        chat = Chat(user_id=1, title="Намерения")
+        db.add(chat)
+        await db.commit()
+
+        service = ChatService()
+        await service.add_message(db, chat.id, "Привет", "user")
+        message = await service.generate_ai_response(db, chat.id, 1, current_message="Привет")
+        assert message.content == GREETING_ANSWER and message.role == "assistant"
+        message = await service.generate_ai_response(db, chat.id, 1)
+        assert message.content == GREETING_ANSWER
+    assert metrics.get("chat.llm_calls_avoided") == avoided + 2
@@ -0,0 +1,123 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import undefer
+
+from models.models import ChatMessage, Report, ReportJob
+from services.job_queue import JobQueue
+from document_generation.document_service import DocumentService
+from services.progress_service import progress_service
+from worker import ReportWorker
+
+PAYLOAD = {
+    "title": "Отчет",
+    "format": "docx",
+    "sections": [{"title": "Введение", "prompt": "Напиши введение", "depends_on": "none"}],
+}
+
+
+async def create_job(db, queue, user_id, priority=0):
+    report = Report(user_id=user_id, title="Отчет", format="docx", file_path="", sections=PAYLOAD["sections"])
+    db.add(report)
+    await db.flush()
+    # Как в /generate-report: отчет и задание в одной транзакции
+    job = await queue.enqueue(db, report.id, user_id, PAYLOAD, priority=priority, commit=False)
+    await db.commit()
+    return job
+
+
+# Тест порядка выдачи заданий: приоритет и лимит на пользователя
+@pytest.mark.asyncio
+async def test_claim_respects_priority_and_user_limit(db_sessionmaker):
+    queue = JobQueue(per_user_limit=1)
+    async with db_sessionmaker() as db:
+        first = await create_job(db, queue, user_id=1)
+        second = await create_job(db, queue, user_id=1)
+        urgent = await create_job(db, queue, user_id=2, priority=5)
+
+        assert (await queue.claim(db, "w1")).id == urgent.id
+        assert (await queue.claim(db, "w1")).id == first.id
+        # У пользователя 1 уже выполняется задание
+        assert await queue.claim(db, "w1") is None
+
+        await queue.complete(db, first.id, "w1", "reports/1.docx")
+        assert (await queue.claim(db, "w1")).id == second.id
+        assert (await db.get(Report, first.report_id)).status == "completed"
+
+
+# Тест возврата задания после истечения видимости и исчерпания попыток
+@pytest.mark.asyncio
+async def test_expired_job_is_reclaimed_and_retries_are_limited(db_sessionmaker):
+    queue = JobQueue(visibility_timeout=0.05, max_attempts=2, retry_delay=0)
+    async with db_sessionmaker() as db:
+        job = await create_job(db, queue, user_id=1)
+        job_id, report_id = job.id, job.report_id
+
+        await queue.claim(db, "dead-worker")
+        await asyncio.sleep(0.1)
+        reclaimed = await queue.claim(db, "w2")
+        assert reclaimed.id == job_id and reclaimed.attempts == 2
+        assert not await queue.heartbeat(db, job_id, "dead-worker")
+
+        await queue.fail(db, job_id, "w2", "ошибка")
+        failed = await db.get(ReportJob, job_id, populate_existing=True)
+        assert failed.status == "failed"
+        assert (await db.get(Report, report_id)).status == "error"
+
+
+# Тест обработки задания воркером
+@pytest.mark.asyncio
+async def test_worker_generates_report(db_sessionmaker, stub_llm, tmp_path):
+    queue = JobQueue()
+    worker = ReportWorker(
+        queue=queue,
+        session_factory=db_sessionmaker,
+        document_service=DocumentService(output_dir=str(tmp_path)),
+    )
+    async with db_sessionmaker() as db:
+        job = await create_job(db, queue, user_id=1)
+        claimed = await queue.claim(db, worker.worker_id)
+
+    await worker.process(claimed)
+
+    async with db_sessionmaker() as db:
+        done = await db.get(ReportJob, job.id)
+        report = await db.get(Report, job.report_id)
+        events = await progress_service.list_events(db, job.report_id)
+    assert done.status == "completed" and done.progress == 1.0
+    assert report.status == "completed" and report.file_path.endswith(".docx")
+
+    # События хода генерации сохраняются по порядку
+    assert [e.event for e in events] == [
+        "report_started", "section_started", "section_finished", "report_finished"
+    ]
+    assert events[2].section_title == "Введение" and events[2].tokens > 0
+
+
+# Тест отчета с чатом: создание только ставит задание, генерацию и HTML делает воркер
+@pytest.mark.asyncio
+async def test_report_with_chat_is_generated_by_worker(db_sessionmaker, stub_llm, tmp_path):
+    from services.report_chat_service import ReportChatService
+
+    queue = JobQueue()
+    worker = ReportWorker(
+        queue=queue,
+        session_factory=db_sessionmaker,
+        document_service=DocumentService(output_dir=str(tmp_path)),
+    )
+    async with db_sessionmaker() as db:
+        report, chat, job = await ReportChatService().create_report_with_chat(db, 1, dict(PAYLOAD))
+        assert report.status == "pending" and report.chat_id == chat.id
+        assert job.payload["chat_id"] == chat.id
+        claimed = await queue.claim(db, worker.worker_id)
+
+    with patch("services.docx_pool.docx_pool.max_workers", 0):
+        await worker.process(claimed)
+
+    async with db_sessionmaker() as db:
+        report = await db.get(Report, report.id, options=[undefer(Report.html_content)])
+        messages = (await db.execute(select(ChatMessage).where(ChatMessage.chat_id == chat.id))).scalars().all()
+    assert report.status == "completed" and "<html>" in report.html_content
+    assert [m.role for m in messages] == ["assistant"]
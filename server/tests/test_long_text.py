@@ -0,0 +1,48 @@
+import time
+
+import pytest
+
+import generation.generate_text_langchain as generation
+from generation.generate_text_langchain import agenerate_long_text, split_prompt
+
+SENTENCES = [f"Предложение номер {i} о продажах." for i in range(12)]
+
+
+# Тест разбиения промпта по границам предложений
+def test_split_prompt_respects_sentences():
+    chunks = split_prompt(" ".join(SENTENCES), chunk_size=80)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 80 for chunk in chunks)
+    assert all(chunk.endswith(".") for chunk in chunks)
+
+
+# Тест параллельной генерации с сохранением порядка
+@pytest.mark.asyncio
+async def test_long_text_is_concurrent_and_ordered(stub_llm):
+    app = stub_llm["app"]
+    old_latency = app.state.latency
+    app.state.latency = 0.3
+    try:
+        prompt = "\n\n".join(SENTENCES[:6])
+        started = time.perf_counter()
+        text = await agenerate_long_text(prompt, chunk_size=40, max_concurrency=6)
+        elapsed = time.perf_counter() - started
+    finally:
+        app.state.latency = old_latency
+
+    assert elapsed < 0.3 * 3
+    positions = [text.index(f"номер {i} ") for i in range(6)]
+    assert positions == sorted(positions)
+
+
+# Тест повтора неудачного запроса
+@pytest.mark.asyncio
+async def test_failed_chunk_is_retried(stub_llm, monkeypatch):
+    monkeypatch.setattr(generation, "LONG_TEXT_RETRY_DELAY", 0.01)
+    app = stub_llm["app"]
+    app.state.failures = 1
+    try:
+        text = await agenerate_long_text(SENTENCES[0], retries=1)
+    finally:
+        app.state.failures = 0
+    assert "номер 0" in text
@@ -0,0 +1,46 @@
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from database import run_migrations
+from models.models import Base
+
+# Частые выборки и индексы, которые должен выбрать планировщик
+QUERIES = [
+    ("SELECT * FROM chat_messages WHERE chat_id = 1 ORDER BY id", "ix_chat_messages_chat_id_id"),
+    ("SELECT id FROM chat_documents WHERE chat_id = 1 AND document_id = 2", "uq_chat_documents_chat_document"),
+    ("SELECT * FROM document_edits WHERE report_id = 1 ORDER BY timestamp", "ix_document_edits_report_id"),
+    ("SELECT id, title FROM reports WHERE user_id = 1 ORDER BY created_at DESC, id DESC LIMIT 50",
+     "ix_reports_user_created"),
+    ("SELECT id, title FROM reports WHERE user_id = 1 AND (title, id) < ('Отчет', 10) "
+     "ORDER BY title DESC, id DESC LIMIT 50", "ix_reports_user_title"),
+    ("SELECT id FROM reports WHERE chat_id = 1", "ix_reports_chat_id"),
+    ("SELECT * FROM documents WHERE user_id = 1 ORDER BY created_at DESC", "ix_documents_user_created"),
+    ("SELECT * FROM chats WHERE user_id = 1 ORDER BY updated_at DESC, id DESC LIMIT 50", "ix_chats_user_updated"),
+]
+
+
+# Тест миграций: схема совпадает с моделями, частые выборки идут по индексам
+@pytest.mark.asyncio
+async def test_migrations_match_models_and_index_hot_queries(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'migrated.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(run_migrations)
+        diff = await conn.run_sync(lambda c: compare_metadata(MigrationContext.configure(c), Base.metadata))
+        assert diff == []
+
+        for query, index in QUERIES:
+            plan = " ".join(row[-1] for row in await conn.execute(text(f"EXPLAIN QUERY PLAN {query}")))
+            assert index in plan, (query, plan)
+    await engine.dispose()
+
+    # База, созданная create_all до миграций, отмечается исходной ревизией и обновляется
+    legacy = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'legacy.db'}")
+    async with legacy.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(run_migrations)
+        version = (await conn.execute(text("SELECT version_num FROM alembic_version"))).scalar()
+        assert version == "0005_report_title_not_null"
+    await legacy.dispose()
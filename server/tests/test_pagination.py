@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select
+
+from models.models import Chat, ChatMessage, Report
+from services.chat_service import ChatService
+from services.pagination import paginate
+
+
+# Тест обхода всех страниц: одинаковые даты не теряют и не дублируют строки
+@pytest.mark.asyncio
+async def test_keyset_pages_cover_all_rows(db_sessionmaker):
+    base = datetime(2024, 1, 1)
+    async with db_sessionmaker() as db:
+        for i in range(25):
+            db.add(Report(user_id=1, title=f"{'Итог' if i % 5 == 0 else 'Отчет'} {i}", format="docx",
+                          sections=[], status="completed" if i % 2 else "error",
+                          created_at=base + timedelta(days=i // 3)))
+            db.add(Chat(user_id=1, title=f"Чат {i}", updated_at=base + timedelta(hours=i)))
+        db.add(Report(user_id=2, title="Чужой", format="docx", sections=[], created_at=base))
+        await db.commit()
+
+        stmt = select(Report.id, Report.created_at).where(Report.user_id == 1)
+        seen, cursor = [], None
+        while True:
+            page, cursor = await paginate(db, stmt, Report.created_at, Report.id, limit=7, cursor=cursor)
+            seen.extend(page)
+            if cursor is None:
+                break
+        assert len(seen) == 25 and len({row.id for row in seen}) == 25
+        assert seen == sorted(seen, key=lambda row: (row.created_at, row.id), reverse=True)
+
+        # Без limit - страница размера по умолчанию и курсор следующей
+        with patch("services.pagination.LIST_PAGE_SIZE", 10):
+            page, cursor = await paginate(db, stmt, Report.created_at, Report.id)
+        assert len(page) == 10 and cursor
+
+        # Отчеты без названия (пустая строка) не обрывают обход по названию
+        for i in range(5):
+            db.add(Report(user_id=3, title="" if i % 2 else f"Отчет {i}", format="docx", sections=[]))
+        db.add(Report(user_id=3, format="docx", sections=[]))
+        await db.commit()
+        by_title = select(Report.id, Report.title).where(Report.user_id == 3)
+        seen, cursor = [], None
+        while True:
+            page, cursor = await paginate(db, by_title, Report.title, Report.id, limit=1, cursor=cursor)
+            seen.extend(page)
+            if cursor is None:
+                break
+        assert len(seen) == 6 and [row.title for row in seen[-3:]] == ["", "", ""]
+
+        filtered = stmt.where(Report.title.startswith("Итог"), Report.status == "error")
+        page, cursor = await paginate(db, filtered, Report.title, Report.id, descending=False)
+        assert len(page) == 3 and cursor is None
+
+        with pytest.raises(ValueError):
+            await paginate(db, stmt, Report.title, Report.id, cursor=cursor or "bm90LWpzb24")
+
+        chats, cursor = await ChatService().get_user_chats(db, 1, limit=10)
+        assert [c.title for c in chats[:2]] == ["Чат 24", "Чат 23"] and cursor
+        chats, _ = await ChatService().get_user_chats(db, 1, limit=10, cursor=cursor,
+                                                      updated_to=base + timedelta(hours=12))
+        assert [c.title for c in chats] == [f"Чат {i}" for i in range(11, 1, -1)]
+
+
+# Тест истории чата: последние сообщения и страницы более ранних без загрузки всего чата
+@pytest.mark.asyncio
+async def test_chat_history_pages(db_sessionmaker):
+    service = ChatService()
+    async with db_sessionmaker() as db:
+        chat = Chat(user_id=1, title="История")
+        db.add(chat)
+        await db.flush()
+        assert not await service.has_messages(db, chat.id)
+        for i in range(20):
+            db.add(ChatMessage(chat_id=chat.id, role="user" if i % 2 == 0 else "assistant", content=f"m{i}"))
+        await db.commit()
+
+        recent = await service.get_recent_messages(db, chat.id, 8)
+        assert [m.content for m in recent] == [f"m{i}" for i in range(12, 20)]
+        assert await service.has_messages(db, chat.id)
+
+        seen, cursor = [], None
+        while True:
+            page, cursor = await service.get_messages_page(db, chat.id, limit=6, cursor=cursor)
+            seen = page + seen
+            if cursor is None:
+                break
+        assert [m.content for m in seen] == [f"m{i}" for i in range(20)]
+
+        # Без limit - только последние сообщения и курсор на более ранние
+        with patch("services.pagination.LIST_PAGE_SIZE", 5):
+            page, cursor = await service.get_messages_page(db, chat.id)
+        assert [m.content for m in page] == [f"m{i}" for i in range(15, 20)] and cursor
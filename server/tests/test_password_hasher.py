@@ -0,0 +1,24 @@
+import pytest
+from passlib.context import CryptContext
+
+from services.password_hasher import PasswordHasher
+
+
+# Тест перехеширования при входе после смены стоимости bcrypt
+@pytest.mark.asyncio
+async def test_verify_rehashes_when_rounds_change():
+    old = PasswordHasher(max_workers=2, context=CryptContext(schemes=["bcrypt"], bcrypt__rounds=4))
+    new = PasswordHasher(max_workers=2, context=CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=5))
+    try:
+        stored = await old.hash("секрет")
+        assert await new.verify_and_update("неверно", stored) == (False, None)
+
+        valid, rehashed = await new.verify_and_update("секрет", stored)
+        assert valid and rehashed and "$05$" in rehashed
+        assert await new.verify_and_update("секрет", rehashed) == (True, None)
+
+        # Пароль, сохраненный не хешем, просто не совпадает
+        assert await new.verify_and_update("секрет", "plain") == (False, None)
+    finally:
+        old.shutdown()
+        new.shutdown()
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+from docx import Document
+
+from document_generation.document_service import DocumentService
+
+SECTIONS = [
+    {"title": "Введение", "prompt": "Напиши введение", "depends_on": "none"},
+    {"title": "Методы", "prompt": "Опиши методы", "depends_on": "none"},
+    {"title": "Результаты", "prompt": "Опиши результаты", "depends_on": "none"},
+    {"title": "Заключение", "prompt": "Напиши заключение", "depends_on": "all"},
+]
+
+
+# Тест параллельной генерации независимых разделов
+@pytest.mark.asyncio
+async def test_independent_sections_are_generated_concurrently(stub_llm, tmp_path):
+    app = stub_llm["app"]
+    old_latency = app.state.latency
+    app.state.latency = 0.5
+    try:
+        service = DocumentService(output_dir=str(tmp_path), max_concurrency=3)
+        started = time.perf_counter()
+        file_path = await service.generate_report_async("Отчет", SECTIONS)
+        elapsed = time.perf_counter() - started
+    finally:
+        app.state.latency = old_latency
+
+    # Две волны запросов вместо четырех последовательных
+    assert elapsed < 1.5
+
+    headings = [p.text for p in Document(file_path).paragraphs if p.style.name.startswith("Heading")]
+    assert headings == [s["title"] for s in SECTIONS]
+
+
+# Тест порядка зависимостей и проверки циклов
+def test_dependencies_are_resolved_in_order():
+    service = DocumentService.__new__(DocumentService)
+    sections = [
+        {"title": "Итоги", "prompt": "", "depends_on": ["Анализ"]},
+        {"title": "Анализ", "prompt": "", "depends_on": "none"},
+        {"title": "Введение", "prompt": ""},
+    ]
+    dependencies = service._resolve_dependencies(sections)
+    assert dependencies == [{1}, set(), {0, 1}]
+    assert service._generation_order(dependencies) == [1, 0, 2]
+
+    sections[1]["depends_on"] = [0]
+    with pytest.raises(ValueError):
+        service._generation_order(service._resolve_dependencies(sections))
+
+
+# Тест сжатия контекста предыдущих разделов
+def test_context_is_compacted_within_budget():
+    from generation.context_compactor import ContextCompactor, ReportContextStats, estimate_tokens
+
+    compactor = ContextCompactor(token_budget=120, digest_tokens=40)
+    paragraph = "Первое предложение абзаца. " + "Подробности исследования и данные. " * 30
+    content = "## Подраздел\n\n" + "\n\n".join([paragraph] * 5)
+
+    digest = compactor.make_digest(content)
+    assert digest.startswith("Подраздел Первое предложение абзаца.")
+    assert estimate_tokens(digest) <= 40
+
+    entries = [(f"Раздел {i}", digest) for i in range(10)]
+    context = compactor.build_context(entries)
+    header, body = context.split("\n\n", 1)
+    assert header.startswith("Ранее также были разделы: Раздел 0")
+    # Строка с пропущенными разделами тоже в бюджете
+    assert estimate_tokens(context) <= 120
+    assert "Раздел 9" in body
+
+    stats = ReportContextStats()
+    stats.add("\n\n".join([content] * 10), context)
+    assert stats.saved_tokens > 0
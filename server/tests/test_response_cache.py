@@ -0,0 +1,51 @@
+import time
+
+import pytest
+
+from generation.response_cache import ResponseCache, make_cache_key
+from generation.generate_text_langchain import agenerate_text_with_params, generate_text_with_params
+
+
+# Тест вытеснения и истечения записей
+def test_lru_eviction_and_ttl():
+    cache = ResponseCache(max_entries=2, ttl=60, path="", enabled=True)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"  # "a" становится самым свежим
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+
+    cache.ttl = -1
+    cache.set("d", "4")
+    assert cache.get("d") is None
+
+
+# Тест второго уровня кеша в SQLite
+def test_disk_tier_survives_new_instance(tmp_path):
+    path = str(tmp_path / "llm_cache.sqlite")
+    key = make_cache_key("model", "system", "prompt", 0.7, 0.9, 100, 1)
+    ResponseCache(ttl=60, path=path, enabled=True).set(key, "ответ")
+
+    assert ResponseCache(ttl=60, path=path, enabled=True).get(key) == "ответ"
+    assert key != make_cache_key("model", "system", "prompt", 0.5, 0.9, 100, 1)
+
+
+# Тест использования кеша при генерации и его обхода
+@pytest.mark.asyncio
+async def test_generation_uses_cache(stub_llm):
+    stats = stub_llm["app"].state.stats
+    before = stats["chat_requests"]
+
+    first = await agenerate_text_with_params("Одинаковый промпт", temperature=0.5)
+    second = await agenerate_text_with_params("Одинаковый промпт", temperature=0.5)
+    assert first == second
+    assert stats["chat_requests"] - before == 1
+
+    await agenerate_text_with_params("Одинаковый промпт", temperature=0.5, use_cache=False)
+    await agenerate_text_with_params("Одинаковый промпт", temperature=0.6)
+    assert stats["chat_requests"] - before == 3
+
+    # Синхронный вызов использует тот же кеш
+    assert generate_text_with_params("Одинаковый промпт", temperature=0.5) == first
+    assert stats["chat_requests"] - before == 3
@@ -0,0 +1,56 @@
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from generation.generate_text_langchain import astream_text_with_params
+from routes.gigachat import router as gigachat_router
+from services.metrics import metrics
+
+
+def parse_sse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+# Тест потоковой генерации и метрики времени до первого токена
+@pytest.mark.asyncio
+async def test_stream_yields_chunks_and_records_ttft(stub_llm):
+    ttft_before = metrics.snapshot()["observations"].get("llm.time_to_first_token", {}).get("count", 0)
+
+    chunks = [chunk async for chunk in astream_text_with_params("Расскажи про отчеты")]
+    assert len(chunks) > 1
+    assert "Расскажи про отчеты" in "".join(chunks)
+
+    observations = metrics.snapshot()["observations"]
+    assert observations["llm.time_to_first_token"]["count"] == ttft_before + 1
+
+    # Повторный запрос отдается из кеша одним фрагментом
+    stats = stub_llm["app"].state.stats
+    stream_before = stats["stream_requests"]
+    cached = [chunk async for chunk in astream_text_with_params("Расскажи про отчеты")]
+    assert cached == ["".join(chunks)]
+    assert stats["stream_requests"] == stream_before
+
+
+# Тест SSE-эндпоинта /gigachat
+@pytest.mark.asyncio
+async def test_gigachat_stream_endpoint(stub_llm):
+    app = FastAPI()
+    app.include_router(gigachat_router, prefix="/api")
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post(
+            "/api/gigachat/generate-text-with-params/stream",
+            json={"prompt": "Потоковый ответ", "use_cache": False},
+        )
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(response.text)
+    assert events[-1][0] == "done"
+    text = "".join(data["content"] for event, data in events if event == "token")
+    assert "Потоковый ответ" in text
@@ -0,0 +1,84 @@
+import pytest
+from sqlalchemy import select, func, inspect
+
+from models.models import Report, HtmlBlob
+from services.version_store import VersionStore
+
+HTML = "<html><body>" + "<p>Текст отчета</p>" * 200 + "</body></html>"
+
+
+# Тест переноса истории из JSON-колонки и хранения одинакового HTML один раз
+@pytest.mark.asyncio
+async def test_versions_share_compressed_html(db_sessionmaker):
+    store = VersionStore()
+    async with db_sessionmaker() as db:
+        report = Report(
+            user_id=1, title="Отчет", format="docx", file_path="reports/r_v2.docx", sections=[],
+            html_content=HTML + "<!-- v2 -->", document_version=2,
+            version_history=[
+                {"version": 1, "timestamp": "2024-01-01T10:00:00", "description": "Версия 1",
+                 "file_path": "reports/r.docx", "html_content": HTML, "edit_description": "Создание"},
+            ],
+        )
+        db.add(report)
+        await db.commit()
+
+        assert await store.ensure_current_version(db, report, "Версия 2", "Правка")
+        await db.commit()
+        assert report.version_history is None
+
+        # Версия 3 с тем же HTML, что и версия 1 (например, восстановление)
+        await store.add_version(db, report.id, 3, "Версия 3", "Восстановление", "reports/r_v3.docx", HTML)
+        await db.commit()
+
+        versions = await store.list_versions(db, report.id)
+        assert [v.version for v in versions] == [1, 2, 3]
+        assert versions[0].html_hash == versions[2].html_hash
+        assert versions[0].created_at.year == 2024
+        assert (await db.execute(select(func.count()).select_from(HtmlBlob))).scalar() == 2
+
+        assert await store.get_html(db, versions[2].html_hash) == HTML
+        stats = await store.storage_stats(db, report.id)
+        assert stats["html_bytes"] > 3 * len(HTML)
+        assert stats["stored_bytes"] < len(HTML) / 10
+
+        # Повторный вызов ничего не записывает
+        assert not await store.ensure_current_version(db, report, "Версия 2", "Правка")
+
+
+# Тяжелые колонки отчета не загружаются по умолчанию и догружаются там, где нужны
+@pytest.mark.asyncio
+async def test_deferred_report_columns_are_loaded_on_demand(db_sessionmaker):
+    store = VersionStore()
+    async with db_sessionmaker() as db:
+        report = Report(
+            user_id=1, title="Отчет", format="docx", file_path="reports/r.docx", sections=[],
+            html_content=HTML, document_version=1,
+        )
+        db.add(report)
+        await db.commit()
+        report_id = report.id
+
+    async with db_sessionmaker() as db:
+        report = await db.get(Report, report_id)
+        assert {"html_content", "sections", "version_history"} <= inspect(report).unloaded
+
+        assert await store.ensure_current_version(db, report, "Версия 1", "Создание")
+        await db.commit()
+        version = await store.get_version(db, report_id, 1)
+        assert await store.get_html(db, version.html_hash) == HTML
+        assert "sections" in inspect(report).unloaded
+
+
+# Тест гонки: тот же HTML, записанный другой сессией между проверкой и вставкой, - не ошибка
+@pytest.mark.asyncio
+async def test_concurrent_put_html_is_deduplicated(db_sessionmaker):
+    store = VersionStore()
+    async with db_sessionmaker() as first, db_sessionmaker() as second:
+        key = await store.put_html(first, HTML)
+        await first.commit()
+
+        # Вторая сессия проверила наличие блоба до этой записи и теперь вставляет его
+        assert not await store._insert_blob(second, key, HTML)
+        await second.commit()
+        assert (await second.execute(select(func.count()).select_from(HtmlBlob))).scalar() == 1
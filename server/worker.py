@@ -0,0 +1,214 @@
+"""
+Воркер очереди генерации отчетов.
+
+Забирает задания из таблицы report_jobs (см. services/job_queue.py) и генерирует
+отчеты. Для отчетов с чатом (chat_id в задании) воркер также конвертирует
+документ в HTML для редактора и пишет в чат приветственное сообщение. Запускается отдельным процессом, пропускная способность растет с числом
+воркеров:
+    python worker.py --concurrency 2
+
+Настройки:
+    REPORT_WORKER_CONCURRENCY - сколько отчетов воркер генерирует одновременно (по умолчанию 2)
+    REPORT_WORKER_POLL_INTERVAL - пауза между опросами пустой очереди, секунды (по умолчанию 2)
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import time
+import uuid
+
+from database import SessionLocal, init_db
+from models.models import FormattingPreset
+from document_generation.document_service import DocumentService
+from generation.langChainGiga import client_manager
+from services.chat_service import ChatService
+from services.document_editor_service import convert_docx_to_html
+from services.docx_pool import docx_pool
+from services.job_queue import job_queue
+from services.metrics import metrics
+from services.progress_service import progress_service
+
+WORKER_CONCURRENCY = int(os.getenv("REPORT_WORKER_CONCURRENCY", "2"))
+POLL_INTERVAL = float(os.getenv("REPORT_WORKER_POLL_INTERVAL", "2"))
+
+
+class LostJobError(Exception):
+    """Задание забрал другой воркер (истекла видимость)"""
+
+
+class ReportWorker:
+    def __init__(self, concurrency=None, poll_interval=None, queue=None, session_factory=None,
+                 document_service=None):
+        self.concurrency = concurrency or WORKER_CONCURRENCY
+        self.poll_interval = POLL_INTERVAL if poll_interval is None else poll_interval
+        self.queue = queue or job_queue
+        self.session_factory = session_factory or SessionLocal
+        self.document_service = document_service or DocumentService()
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._stopping = asyncio.Event()
+
+    async def run(self):
+        """Запускает concurrency циклов обработки и ждет их завершения"""
+        print(f"Воркер {self.worker_id} запущен, слотов: {self.concurrency}")
+        await asyncio.gather(*(self._loop() for _ in range(self.concurrency)))
+        print(f"Воркер {self.worker_id} остановлен")
+
+    def stop(self):
+        """Новые задания не берутся, текущие дорабатываются"""
+        self._stopping.set()
+
+    async def _loop(self):
+        while not self._stopping.is_set():
+            try:
+                async with self.session_factory() as db:
+                    job = await self.queue.claim(db, self.worker_id)
+            except Exception as e:
+                print(f"Ошибка при получении задания из очереди: {str(e)}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self.process(job)
+
+    async def _record_event(self, job, event, **fields):
+        try:
+            async with self.session_factory() as db:
+                await progress_service.record(db, job.report_id, event, job_id=job.id, **fields)
+        except Exception as e:
+            # Потеря события прогресса не должна ронять генерацию
+            print(f"Не удалось сохранить событие {event} отчета {job.report_id}: {str(e)}")
+
+    async def _heartbeat(self, job_id, progress=None):
+        async with self.session_factory() as db:
+            if not await self.queue.heartbeat(db, job_id, self.worker_id, progress):
+                raise LostJobError(f"Задание {job_id} больше не принадлежит воркеру")
+
+    async def _keep_alive(self, job_id):
+        # Продлеваем владение заранее, с запасом в две трети таймаута
+        while True:
+            await asyncio.sleep(self.queue.visibility_timeout / 3)
+            try:
+                await self._heartbeat(job_id)
+            except LostJobError:
+                raise
+            except Exception as e:
+                # Разовый сбой БД не повод бросать задание: до истечения видимости есть запас
+                print(f"Не удалось продлить задание {job_id}: {str(e)}")
+
+    async def process(self, job):
+        """Генерирует отчет по заданию и сохраняет результат"""
+        print(f"Воркер {self.worker_id}: задание {job.id}, отчет {job.report_id}, попытка {job.attempts}")
+        await self._record_event(job, "report_started", progress=0.0, message=f"Попытка {job.attempts}")
+        started = time.perf_counter()
+        keep_alive = asyncio.ensure_future(self._keep_alive(job.id))
+        work = asyncio.ensure_future(self._generate(job))
+        try:
+            done, _ = await asyncio.wait({keep_alive, work}, return_when=asyncio.FIRST_COMPLETED)
+            if work not in done:
+                # Продление не удалось - результат уже никому не нужен
+                work.cancel()
+                keep_alive.result()
+            file_path, html_content = work.result()
+
+            async with self.session_factory() as db:
+                completed = await self.queue.complete(db, job.id, self.worker_id, file_path, html_content)
+            await self._record_event(job, "report_finished", progress=1.0,
+                                     elapsed=time.perf_counter() - started)
+            metrics.increment("report_jobs.completed")
+            if completed and job.payload.get("chat_id"):
+                await self._greet_in_chat(job)
+        except LostJobError as e:
+            print(str(e))
+            metrics.increment("report_jobs.lost")
+        except Exception as e:
+            print(f"Ошибка генерации отчета {job.report_id}: {str(e)}")
+            metrics.increment("report_jobs.failed_attempts")
+            async with self.session_factory() as db:
+                status = await self.queue.fail(db, job.id, self.worker_id, str(e))
+            if status:
+                event = "report_failed" if status == "failed" else "attempt_failed"
+                await self._record_event(job, event, message=str(e),
+                                         elapsed=time.perf_counter() - started)
+        finally:
+            keep_alive.cancel()
+            work.cancel()
+
+    async def _generate(self, job):
+        report_data = job.payload
+
+        # Получаем пресет форматирования, если он указан
+        formatting_styles = None
+        if report_data.get("formatting_preset_id"):
+            async with self.session_factory() as db:
+                preset = await db.get(FormattingPreset, report_data["formatting_preset_id"])
+                formatting_styles = preset.styles if preset else None
+
+        async def on_event(event):
+            await self._record_event(
+                job, event["event"],
+                section_index=event["section_index"],
+                section_title=event["section_title"],
+                tokens=event.get("tokens"),
+                elapsed=event["elapsed"],
+                progress=event["progress"],
+            )
+            if event["event"] == "section_finished":
+                await self._heartbeat(job.id, event["progress"])
+
+        file_path = await self.document_service.generate_report_async(
+            title=report_data["title"],
+            sections=report_data["sections"],
+            format=report_data.get("format", "docx"),
+            formatting_styles=formatting_styles,
+            on_event=on_event,
+        )
+
+        # Отчет с чатом сразу открывается в редакторе - HTML готовим здесь, а не в API
+        html_content = None
+        if report_data.get("chat_id"):
+            html_content = await docx_pool.run(convert_docx_to_html, file_path)
+        return file_path, html_content
+
+    async def _greet_in_chat(self, job):
+        try:
+            async with self.session_factory() as db:
+                await ChatService().add_message(
+                    db,
+                    job.payload["chat_id"],
+                    f"Отчет «{job.payload['title']}» создан! Я могу помочь вам с редактированием. "
+                    f"Вы можете выделить текст в документе и попросить меня внести изменения.",
+                    role="assistant",
+                )
+        except Exception as e:
+            print(f"Не удалось отправить сообщение в чат отчета {job.report_id}: {str(e)}")
+
+
+async def main(concurrency):
+    await init_db()
+    worker = ReportWorker(concurrency=concurrency)
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+
+    await client_manager.awarmup()
+    await docx_pool.warmup()
+    try:
+        await worker.run()
+    finally:
+        docx_pool.shutdown()
+        await client_manager.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY)
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency))